@@ -0,0 +1,361 @@
+"""Autopilota: guida un serpente verso il cibo con le stesse direzioni della tastiera.
+
+Il serpente segue un ciclo hamiltoniano del campo e prende le scorciatoie indicate dalla ricerca in ampiezza
+verso il cibo solo se non superano la coda lungo il ciclo, così la coda resta sempre raggiungibile.
+La ricerca ha un budget di tempo per tick ed è incrementale: se non termina entro il budget riprende al tick
+successivo, e nel frattempo il serpente segue il ciclo.
+"""
+import time
+from array import array
+
+import engine
+from engine import BLOCK_SIZE, SCOREBOARD_HEIGHT, can_turn
+from inputs import LatencyStats
+
+AUTOPILOT_BUDGET = 0.002  # Secondi di calcolo concessi a ogni decisione
+SEARCH_CHUNK = 64  # Celle esplorate tra un controllo del tempo e l'altro
+SAFETY_MARGIN = 3  # Celle libere lasciate tra la testa e la coda quando si prende una scorciatoia
+
+
+def build_moves(width, height):
+    """Restituisce, per ogni cella raggiungibile, le mosse possibili come coppie (direzione, cella di arrivo).
+
+    Le mosse sono calcolate con engine.next_position, quindi rispettano esattamente l'attraversamento dei bordi.
+    """
+    occupancy = engine.Occupancy(width, height, 0)
+    moves = [None] * (occupancy.cols * occupancy.rows)
+    start = occupancy.index(0, SCOREBOARD_HEIGHT)
+    queue = [start]
+    moves[start] = []
+    for cell in queue:
+        x, y = occupancy.position(cell)
+        for direction, (x_change, y_change) in engine.DIRECTIONS.items():
+            target = occupancy.index(*engine.next_position(width, height, x, y, x_change, y_change))
+            moves[cell].append((direction, target))
+            if moves[target] is None:
+                moves[target] = []
+                queue.append(target)
+    return moves
+
+
+def hamiltonian_cycle(cols, rows):
+    """Restituisce un ciclo hamiltoniano della griglia rows x cols come coppie (riga, colonna) in ordine di visita.
+
+    Prima riga da sinistra a destra, colonne a serpentina da destra a sinistra, ritorno lungo la prima colonna.
+    Con cols pari il ciclo non attraversa mai il bordo, altrimenti lo attraversa una volta, dall'ultima riga alla prima.
+    """
+    order = [(0, col) for col in range(cols)]
+    for i, col in enumerate(range(cols - 1, 0, -1)):
+        order += [(row, col) for row in (range(1, rows) if i % 2 == 0 else range(rows - 1, 0, -1))]
+    if cols % 2 == 0:
+        return order + [(row, 0) for row in range(rows - 1, 0, -1)]
+    return order + [(row, 0) for row in range(1, rows)]
+
+
+def resume(search, deadline):
+    """Fa avanzare una ricerca finché non termina o scade il tempo; restituisce (terminata, risultato)."""
+    try:
+        while True:
+            next(search)
+            if time.perf_counter() >= deadline:
+                return False, None
+    except StopIteration as stop:
+        return True, stop.value
+
+
+class Autopilot:
+    """Sceglie la direzione di un serpente a ogni tick, con un budget di tempo per ogni decisione."""
+
+    def __init__(self, state, player=0, budget=AUTOPILOT_BUDGET):
+        self.player = player
+        self.budget = budget
+        self.moves = build_moves(state.width, state.height)
+        self.sources = [[] for _ in self.moves]  # Celle da cui si arriva in ogni cella
+        for cell, moves in enumerate(self.moves):
+            for _, target in moves or ():
+                self.sources[target].append(cell)
+        self.order = self.build_cycle(state)
+        self.cycle_length = sum(1 for position in self.order if position >= 0)
+        self.cycle = array('i', [0]) * self.cycle_length  # Celle del ciclo in ordine di visita
+        for cell, position in enumerate(self.order):
+            if position >= 0:
+                self.cycle[position] = cell
+        # Posizione nel ciclo di ogni cella; per le celle fuori dal ciclo, quella della cella da cui vi si entra
+        self.anchor = array('i', self.order)
+        for cell, position in enumerate(self.order):
+            if position < 0:
+                self.anchor[cell] = max((self.order[source] for source in self.sources[cell]), default=-1)
+        self.timings = LatencyStats(label="Decisione autopilota")
+        self.target = None
+        self.field = None  # Distanze dal cibo, quando la ricerca è completa
+        self.search = None  # Ricerca delle distanze in corso
+
+    def build_cycle(self, state):
+        """Restituisce la posizione di ogni cella nel ciclo hamiltoniano (-1 per le celle fuori dal ciclo).
+
+        Il ciclo copre le righe da SCOREBOARD_HEIGHT in giù, comprese quelle parziali; la riga sopra si raggiunge
+        solo scendendo dal bordo inferiore, quindi le sue celle vengono inserite dove il ciclo passa da lì.
+        Si provano tutti gli orientamenti e si tiene quello valido che copre più celle.
+        """
+        first_row = -(-SCOREBOARD_HEIGHT // BLOCK_SIZE)
+        rows, cols, stride = state.occupancy.rows - first_row, state.occupancy.cols, state.occupancy.cols
+        best = None
+        for transpose in (False, True):
+            order = hamiltonian_cycle(rows, cols) if transpose else hamiltonian_cycle(cols, rows)
+            if transpose:
+                order = [(col, row) for row, col in order]
+            for flip_rows in (False, True):
+                for flip_cols in (False, True):
+                    cells = [(first_row + (rows - 1 - row if flip_rows else row)) * stride + (cols - 1 - col if flip_cols else col)
+                             for row, col in order]
+                    successors = self.link_cycle(cells)
+                    if successors is not None and (best is None or len(successors) > len(best)):
+                        best = successors
+        position = array('i', [-1]) * len(self.moves)
+        if best is not None:
+            cell = next(iter(best))
+            for i in range(len(best)):
+                position[cell] = i
+                cell = best[cell]
+        return position
+
+    def link_cycle(self, cells):
+        """Collega le celle del ciclo e vi inserisce le celle raggiungibili solo dal bordo; None se un passo non è una mossa valida."""
+        if len(cells) < 4:
+            return None
+        block = set(cells)
+        successors = {}
+        for cell, successor in zip(cells, cells[1:] + cells[:1]):
+            if self.moves[cell] is None:
+                return None
+            if self.direction(cell, successor) is not None:
+                successors[cell] = successor
+                continue
+            # Il passo può attraversare il bordo passando per una cella fuori dal blocco
+            bridge = next((target for _, target in self.moves[cell] if target not in block and target not in successors
+                           and self.turns(cell, target, successor)), None)
+            if bridge is None:
+                return None
+            successors[cell], successors[bridge] = bridge, successor
+        predecessors = {successor: cell for cell, successor in successors.items()}
+        for cell, successor in successors.items():
+            if not self.turns(predecessors[cell], cell, successor):
+                return None
+        for cell, moves in enumerate(self.moves):
+            if moves is None or cell in successors:
+                continue
+            for source in self.sources[cell]:
+                successor = successors.get(source)
+                if successor is not None and self.turns(predecessors[source], source, cell) and self.turns(source, cell, successor) \
+                        and self.turns(cell, successor, successors[successor]):
+                    successors[source], successors[cell] = cell, successor
+                    predecessors[cell], predecessors[successor] = source, cell
+                    break
+        return successors
+
+    def direction(self, cell, target):
+        """Restituisce la direzione che porta da cell a target (None se non sono adiacenti)."""
+        return next((direction for direction, after in self.moves[cell] if after == target), None)
+
+    def rejoins(self, cell, target):
+        """Controlla che da cell si possa saltare in target e da lì proseguire lungo il ciclo senza invertire la marcia."""
+        if self.order[target] < 0:
+            return False
+        return self.turns(cell, target, self.cycle[(self.order[target] + 1) % self.cycle_length])
+
+    def turns(self, first, second, third):
+        """Controlla che first -> second -> third siano due mosse consecutive valide (senza inversione)."""
+        direction = self.direction(first, second)
+        following = self.direction(second, third)
+        return direction is not None and following is not None and can_turn(direction, following)
+
+    def decide(self, state):
+        """Restituisce la direzione da prendere in questo tick (None per non cambiare) e ne registra il tempo di calcolo."""
+        start = time.perf_counter()
+        action = self.choose(state, start + self.budget)
+        self.timings.add((time.perf_counter() - start) * 1000)
+        return action
+
+    def choose(self, state, deadline):
+        """Sceglie la mossa senza superare la scadenza indicata."""
+        if state.food is None:
+            return None
+        snake = state.snakes[self.player]
+        total = state.occupancy.total
+        head = state.occupancy.index(snake.x, snake.y)
+        food = state.occupancy.index(*state.food)
+        field = self.food_field(state, food, deadline)
+        # La coda si libera nello stesso tick se il serpente non sta crescendo
+        tail = snake.body.tail() if snake.body and len(snake.body) >= snake.length else None
+        options = [(direction, target) for direction, target in self.moves[head]
+                   if can_turn(snake.direction, direction) and (not total[target] or (target == tail and total[target] == 1))]
+        if not options:
+            return None
+        direction = self.detour_move(state, snake, head, food, options)
+        if direction is None:
+            direction = self.cycle_move(snake, head, food, field, options)
+        if direction is None and field is not None:
+            direction = self.path_move(state, snake, head, field, deadline)
+        if direction is None:
+            direction = self.fallback(state, snake, options, deadline)
+        return direction
+
+    def food_field(self, state, food, deadline):
+        """Fa avanzare la ricerca delle distanze dal cibo; restituisce il campo se è completo, altrimenti None."""
+        if food != self.target:
+            self.target, self.field, self.search = food, None, None
+        if self.field is None:
+            if self.search is None:
+                self.search = self.distance_field(bytearray(state.occupancy.total), food)
+            done, field = resume(self.search, deadline)
+            if done:
+                self.field, self.search = field, None
+        return self.field
+
+    def distance_field(self, blocked, food):
+        """Ricerca in ampiezza a ritroso dal cibo: distanza di ogni cella libera dal cibo (-1 se irraggiungibile).
+
+        Non dipende dalla posizione della testa, quindi può proseguire nei tick successivi.
+        """
+        field = array('i', [-1]) * len(self.moves)
+        field[food] = 0
+        queue = [food]
+        for i, cell in enumerate(queue):
+            if i % SEARCH_CHUNK == 0:
+                yield
+            for source in self.sources[cell]:
+                if field[source] == -1 and not blocked[source]:
+                    field[source] = field[cell] + 1
+                    queue.append(source)
+        return field
+
+    def cycle_position(self, snake, head):
+        """Restituisce (posizione della testa nel ciclo, celle del ciclo prima della coda, crescita residua) o None."""
+        tail = snake.body.tail() if snake.body else head
+        position, tail_position = self.anchor[head], self.anchor[tail]
+        if self.cycle_length == 0 or position < 0 or tail_position < 0:
+            return None
+        return position, (tail_position - position) % self.cycle_length or self.cycle_length, max(0, snake.length - len(snake.body))
+
+    def cycle_move(self, snake, head, food, field, options):
+        """Segue il ciclo hamiltoniano, con le scorciatoie più vicine al cibo che non superano la coda."""
+        size, order = self.cycle_length, self.order
+        current = self.cycle_position(snake, head)
+        if current is None:
+            return None
+        position, ahead, growth = current
+        if order[head] < 0:
+            # Fuori dal ciclo (dopo aver mangiato oltre il bordo) si rientra nella prima cella libera davanti alla testa
+            gaps = [((order[target] - position) % size, direction) for direction, target in options if self.rejoins(head, target)]
+            return min(((gap, direction) for gap, direction in gaps if 0 < gap < ahead - growth), default=(0, None))[1]
+        available = ahead - snake.length - growth - SAFETY_MARGIN
+        if size - snake.length < size // 2:
+            available = 0  # Con più di metà campo occupato si segue soltanto il ciclo
+        available = min(available, (self.anchor[food] - position) % size)
+        best, best_key = None, None
+        for direction, target in options:
+            if order[target] < 0:
+                continue
+            gap = (order[target] - position) % size
+            if gap != 1 and not (0 < gap <= available and self.rejoins(head, target)):
+                continue
+            distance = field[target] if field is not None and field[target] >= 0 else size
+            key = (distance, -gap)
+            if best_key is None or key < best_key:
+                best, best_key = direction, key
+        return best
+
+    def detour_move(self, state, snake, head, food, options):
+        """Entra nel cibo fuori dal ciclo se dopo averlo mangiato si può rientrare nel ciclo prima della coda."""
+        if self.order[food] >= 0 or food not in [target for _, target in options]:
+            return None
+        current = self.cycle_position(snake, head)
+        if current is None:
+            return None
+        position, ahead, growth = current
+        for _, after in self.moves[food]:
+            if self.rejoins(food, after) and not state.occupancy.total[after] and self.turns(head, food, after) \
+                    and 0 < (self.order[after] - position) % self.cycle_length < ahead - growth - 1:
+                return self.direction(head, food)
+        return None
+
+    def path_move(self, state, snake, head, field, deadline):
+        """Segue il percorso più breve verso il cibo, se dopo averlo mangiato la testa può ancora seguire la coda."""
+        total = state.occupancy.total
+        best = None
+        for direction, target in self.moves[head]:
+            if can_turn(snake.direction, direction) and field[target] >= 0 and not total[target]:
+                if best is None or field[target] < field[best[1]]:
+                    best = direction, target
+        if best is None:
+            return None
+        path = [best[1]]
+        while field[path[-1]] > 0:
+            cell = next(target for _, target in self.moves[path[-1]] if field[target] == field[path[-1]] - 1)
+            if total[cell]:
+                self.field = None  # Il campo è stato calcolato su uno stato precedente: va ricalcolato
+                return None
+            path.append(cell)
+        return best[0] if self.safe_path(state, snake, path, deadline) else None
+
+    def safe_path(self, state, snake, path, deadline):
+        """Verifica entro la scadenza che, dopo aver percorso path e mangiato, la testa possa ancora seguire la coda."""
+        body = snake.body.indices()
+        final_body = (body + path)[-snake.length:]
+        blocked = bytearray(state.occupancy.total)
+        for cell in body:
+            blocked[cell] -= 1  # Restano solo gli altri serpenti
+        for cell in final_body:
+            blocked[cell] = 1
+        # Dopo aver mangiato il serpente è lungo un segmento in più
+        leave = self.leave_times(final_body, snake.length + 1 - len(final_body))
+        done, result = resume(self.escape(blocked, leave, final_body[-1]), deadline)
+        return done and result[0]
+
+    def leave_times(self, body, growth):
+        """Restituisce per ogni cella il tick in cui il segmento del corpo che la occupa si sposta (0 fuori dal corpo)."""
+        leave = array('i', [0]) * len(self.moves)
+        for i, cell in enumerate(body):
+            leave[cell] = growth + i + 1
+        return leave
+
+    def escape(self, blocked, leave, start):
+        """Ricerca in ampiezza da start che termina appena raggiunge un segmento del corpo già spostato al suo arrivo.
+
+        Se lo raggiunge il serpente può continuare a seguire la propria coda; restituisce (raggiunto, celle esplorate).
+        """
+        seen = bytearray(len(self.moves))
+        seen[start] = 1
+        frontier, ticks, explored = [start], 1, 0
+        while frontier:
+            ticks += 1
+            next_frontier = []
+            for cell in frontier:
+                explored += 1
+                if explored % SEARCH_CHUNK == 0:
+                    yield
+                for _, target in self.moves[cell]:
+                    if blocked[target]:
+                        if leave[target] and leave[target] <= ticks:
+                            return True, explored
+                    elif not seen[target]:
+                        seen[target] = 1
+                        next_frontier.append(target)
+            frontier = next_frontier
+        return False, explored
+
+    def fallback(self, state, snake, options, deadline):
+        """Mossa di riserva fuori dal ciclo: preferisce le celle da cui si può seguire la coda, poi lo spazio più ampio."""
+        total = state.occupancy.total
+        body = snake.body.indices()
+        leave = self.leave_times(body, snake.length - len(body))
+        best, best_score = None, None
+        for direction, target in options:
+            if leave[target]:
+                score = (True, 0)  # La coda si libera nello stesso tick
+            else:
+                done, result = resume(self.escape(total, leave, target), deadline)
+                score = result if done else (False, 0)
+            if best_score is None or score > best_score:
+                best, best_score = direction, score
+        return best
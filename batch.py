@@ -0,0 +1,332 @@
+"""Simulatore a lotti: fa avanzare migliaia di partite a giocatore singolo in parallelo con NumPy.
+
+Serve a raccogliere statistiche su moltissime partite per bilanciare i parametri di gioco (aumenti di velocità,
+probabilità del cibo speciale, effetti speciali). Le regole sono quelle di engine.step, applicate a tutte le
+partite insieme con operazioni sugli array.
+
+Invece del corpo segmento per segmento, ogni partita ha un piano con il numero della mossa in cui la testa è
+entrata per l'ultima volta in ogni cella: la cella è occupata se quella mossa è tra le ultime `body` mosse,
+dove `body` è il numero di segmenti sul campo (cresce di uno per mossa fino alla lunghezza del serpente).
+
+Uso da riga di comando:
+    python batch.py --games 4096 --steps 2000 --difficulty Extreme --policy greedy
+"""
+import argparse
+import time
+
+import numpy as np
+
+import engine
+from engine import BLOCK_SIZE
+from replay import ACTION_CODES
+
+# Codici delle azioni, gli stessi dei replay
+NONE = ACTION_CODES.index(None)
+STOP = ACTION_CODES.index(engine.STOP)
+DIRECTION_CODES = [ACTION_CODES.index(direction) for direction in engine.DIRECTIONS]
+
+NEVER = -(2 ** 30)  # Mossa di una cella mai visitata
+FOOD_ATTEMPTS = 8  # Estrazioni casuali per il cibo prima di cercare esattamente le celle libere
+# Ogni quanti punti compare il menu degli effetti speciali, come in check_for_special_effect_activation
+EFFECT_PERIODS = {"Relaxed": 15, "Balanced": 30, "Extreme": 60}
+
+
+def move_table(width, height):
+    """Restituisce la tabella (celle x codici azione) della cella raggiunta dalla testa con ogni direzione.
+
+    La colonna NONE è il serpente fermo; come tutte le mosse segue engine.next_position, che sposta anche
+    una testa ferma sotto la barra del punteggio.
+    """
+    occupancy = engine.Occupancy(width, height, 0)
+    cells = occupancy.cols * occupancy.rows
+    changes = {NONE: (0, 0)}
+    changes.update((code, engine.DIRECTIONS[ACTION_CODES[code]]) for code in DIRECTION_CODES)
+    table = np.zeros((cells, len(changes)), dtype=np.int32)
+    for cell in range(cells):
+        x, y = occupancy.position(cell)
+        for code, (x_change, y_change) in changes.items():
+            table[cell, code] = occupancy.index(*engine.next_position(width, height, x, y, x_change, y_change))
+    return table
+
+
+class BatchState:
+    """Stato di `games` partite indipendenti, uno slot per partita in ogni array."""
+
+    def __init__(self, games, width=800, height=600, difficulty="Balanced", seed=None, speed_increment=None,
+                 speed_threshold=None, special_food_chance=engine.SPECIAL_FOOD_CHANCE, effects=False):
+        self.games = games
+        self.width, self.height = width, height
+        self.difficulty = difficulty
+        self.rng = np.random.default_rng(seed)
+        occupancy = engine.Occupancy(width, height, 0)
+        self.cols, self.rows = occupancy.cols, occupancy.rows
+        self.start = occupancy.index(width // 2, height // 2)
+        self.food_cells = np.array(occupancy.free.cells, dtype=np.int32)  # Celle in cui può comparire il cibo
+        self.table = move_table(width, height)
+        self.opposite = np.full(len(ACTION_CODES), -1, dtype=np.int8)
+        for code in DIRECTION_CODES:
+            self.opposite[code] = ACTION_CODES.index(engine.OPPOSITE[ACTION_CODES[code]])
+
+        # Parametri da bilanciare: scalari o un valore per partita
+        increment, threshold = engine.SPEED_RULES.get(difficulty, engine.DEFAULT_SPEED_RULE)
+        self.speed_increment = np.broadcast_to(np.asarray(increment if speed_increment is None else speed_increment, dtype=np.float64), (games,))
+        self.speed_threshold = np.broadcast_to(np.asarray(threshold if speed_threshold is None else speed_threshold, dtype=np.float64), (games,))
+        self.special_food_chance = special_food_chance
+        self.effect_period = EFFECT_PERIODS.get(difficulty) if effects else None
+
+        self.head = np.zeros(games, dtype=np.int32)
+        self.direction = np.zeros(games, dtype=np.int8)  # NONE finché il serpente non ha mai girato
+        self.moving = np.zeros(games, dtype=bool)
+        self.length = np.zeros(games, dtype=np.int32)
+        self.body = np.zeros(games, dtype=np.int32)  # Segmenti sul campo, al massimo `length`
+        self.moves = np.zeros(games, dtype=np.int32)  # Mosse fatte, cioè segmenti aggiunti in testa
+        self.score = np.zeros(games)
+        self.speed = np.zeros(games)
+        self.last_updated_score = np.zeros(games)
+        self.food_points_multiplier = np.zeros(games)
+        self.special_food_points_multiplier = np.zeros(games)
+        self.food = np.zeros(games, dtype=np.int32)
+        self.special_food = np.zeros(games, dtype=np.int32)
+        self.special_food_timer = np.zeros(games, dtype=np.int32)
+        self.last_effect_score = np.zeros(games)
+        self.crashed = np.zeros(games, dtype=bool)
+        self.won = np.zeros(games, dtype=bool)
+        self.game_close = np.zeros(games, dtype=bool)
+        self.ticks = np.zeros(games, dtype=np.int32)
+        self.elapsed = np.zeros(games)  # Secondi di gioco, con un tick ogni 1 / velocità
+        self.visited = np.zeros((games, self.cols * self.rows), dtype=np.int32)
+        self.reset(np.arange(games))
+
+    def reset(self, games):
+        """Riporta allo stato iniziale le partite indicate (array di indici)."""
+        self.head[games] = self.start
+        self.direction[games] = NONE
+        self.moving[games] = False
+        self.length[games] = 1
+        self.body[games] = 0
+        self.moves[games] = 0
+        self.score[games] = 1
+        self.speed[games] = engine.initial_speed(self.difficulty)
+        self.last_updated_score[games] = 0
+        self.food_points_multiplier[games] = 1.0
+        self.special_food_points_multiplier[games] = 1.0
+        self.special_food[games] = -1
+        self.special_food_timer[games] = 0
+        self.last_effect_score[games] = 0
+        self.crashed[games] = False
+        self.won[games] = False
+        self.game_close[games] = False
+        self.ticks[games] = 0
+        self.elapsed[games] = 0
+        self.visited[games] = NEVER
+        self.food[games] = self.sample_food(games)
+
+    def occupied(self, games, cells):
+        """Indica se le celle sono occupate dal corpo del serpente della partita corrispondente."""
+        return self.moves[games] - self.visited[games, cells] < self.body[games]
+
+    def sample_food(self, games):
+        """Sceglie una cella libera a caso per ogni partita indicata (-1 se il campo è pieno)."""
+        cells = np.full(len(games), -1, dtype=np.int32)
+        pending = np.arange(len(games))
+        for _ in range(FOOD_ATTEMPTS):
+            if not len(pending):
+                return cells
+            candidates = self.food_cells[self.rng.integers(0, len(self.food_cells), len(pending))]
+            free = ~self.occupied(games[pending], candidates)
+            cells[pending[free]] = candidates[free]
+            pending = pending[~free]
+        if len(pending):
+            # Campo quasi pieno: estrazione esatta tra le celle libere
+            rows = games[pending]
+            free = self.moves[rows, None] - self.visited[rows][:, self.food_cells] >= self.body[rows, None]
+            counts = free.sum(axis=1)
+            choice = self.rng.integers(0, np.maximum(counts, 1))
+            picked = np.argmax(free.cumsum(axis=1) > choice[:, None], axis=1)
+            cells[pending] = np.where(counts > 0, self.food_cells[picked], -1)
+        return cells
+
+    def sample_special_food(self, count):
+        """Posizione del cibo speciale come in engine.update_special_food (anche fuori dal campo di gioco)."""
+        cols = np.rint(self.rng.integers(0, self.width - BLOCK_SIZE, count) / BLOCK_SIZE).astype(np.int32)
+        rows = np.rint(self.rng.integers(0, self.height - BLOCK_SIZE, count) / BLOCK_SIZE).astype(np.int32)
+        return rows * self.cols + cols
+
+    def step(self, actions):
+        """Avanza di un tick tutte le partite in corso, con un codice azione per partita (vedi ACTION_CODES)."""
+        games = np.flatnonzero(~self.game_close)
+        if not len(games):
+            return 0
+        actions = np.asarray(actions)[games]
+        turning = (actions != NONE) & (actions != STOP)
+        self.direction[games[turning]] = actions[turning]
+        self.moving[games[turning]] = True
+        self.moving[games[actions == STOP]] = False
+        self.elapsed[games] += 1 / self.speed[games]
+
+        # Aggiornamento della posizione
+        head = self.table[self.head[games], np.where(self.moving[games], self.direction[games], NONE)]
+        self.head[games] = head
+
+        # Il cibo speciale scade oppure compare con probabilità 1 / special_food_chance
+        active = self.special_food_timer[games] > 0
+        self.special_food_timer[games[active]] -= 1
+        waiting = games[~active]
+        appear = waiting[self.rng.integers(0, self.special_food_chance, len(waiting)) == 0]
+        self.special_food[appear] = self.sample_special_food(len(appear))
+        self.special_food_timer[appear] = engine.SPECIAL_FOOD_DURATION
+
+        # Collisione con il corpo: la testa entra in una cella visitata in una delle mosse rimaste sul campo
+        moves = self.moves[games] + 1
+        self.moves[games] = moves
+        body = np.minimum(self.body[games] + 1, self.length[games])
+        self.body[games] = body
+        crashed = games[moves - self.visited[games, head] < body]
+        self.visited[games, head] = moves
+        self.crashed[crashed] = True
+        self.game_close[crashed] = True
+
+        # Aggiornamento della velocità (con il punteggio prima del cibo, come in engine.step)
+        score, threshold = self.score[games], self.speed_threshold[games]
+        faster = games[np.floor_divide(score, threshold) > np.floor_divide(self.last_updated_score[games], threshold)]
+        self.speed[faster] += self.speed_increment[faster]
+        self.last_updated_score[faster] = self.score[faster]
+
+        # Cibo normale
+        eaten = games[head == self.food[games]]
+        if len(eaten):
+            self.food[eaten] = self.sample_food(eaten)
+            won = eaten[self.food[eaten] < 0]
+            self.won[won] = True
+            self.game_close[won] = True
+            self.length[eaten] += 1
+            self.score[eaten] = np.round(self.score[eaten] + self.food_points_multiplier[eaten], 1)
+
+        # Cibo speciale
+        special = games[(self.special_food_timer[games] > 0) & (head == self.special_food[games])]
+        self.special_food[special] = -1
+        self.special_food_timer[special] = 0
+        self.length[special] += 5
+        self.score[special] = np.round(self.score[special] + 5 * self.special_food_points_multiplier[special], 1)
+
+        self.ticks[games] += 1
+        if self.effect_period is not None:
+            self.choose_effects(games[~self.game_close[games]])
+        return len(games)
+
+    def choose_effects(self, games):
+        """Applica un effetto speciale a caso quando nel gioco comparirebbe il menu degli effetti."""
+        score = self.score[games]
+        remainder = np.floor(score) % self.effect_period
+        chosen = (score > self.last_effect_score[games] + 5) & (remainder < 5)
+        games = games[chosen]
+        self.last_effect_score[games] = score[chosen] - remainder[chosen]
+        effects = self.rng.integers(0, len(EFFECTS), len(games))
+        for index, effect in enumerate(EFFECTS):
+            effect(self, games[effects == index])
+
+    def finished(self):
+        """Restituisce gli indici delle partite terminate."""
+        return np.flatnonzero(self.game_close)
+
+
+# Effetti speciali applicati a più partite insieme, nello stesso ordine di engine.EFFECTS
+def decrease_speed(batch, games):
+    """Diminuisce la velocità del serpente di 5."""
+    batch.speed[games] = np.maximum(1, batch.speed[games] - 5)
+
+
+def increase_food_points(batch, games):
+    """Il cibo normale fornisce il 20% di punti in più."""
+    batch.food_points_multiplier[games] += 0.20
+
+
+def decrease_length(batch, games):
+    """Dimezza la lunghezza del serpente e rimuove i segmenti in coda."""
+    batch.length[games] = np.maximum(1, (batch.length[games] + 1) // 2)
+    batch.body[games] = np.minimum(batch.body[games], batch.length[games])
+
+
+def increase_special_food_points(batch, games):
+    """Il cibo speciale fornisce il 50% di punti in più."""
+    batch.special_food_points_multiplier[games] += 0.5
+
+
+EFFECTS = [decrease_speed, increase_food_points, decrease_length, increase_special_food_points]
+
+
+def random_policy(batch, turn_chance=0.1):
+    """Gira a caso (senza inversioni) con probabilità turn_chance per tick, e sempre alla prima mossa."""
+    choices = batch.rng.choice(DIRECTION_CODES, batch.games).astype(np.int8)
+    turn = (batch.rng.random(batch.games) < turn_chance) | (batch.direction == NONE)
+    turn &= choices != batch.opposite[batch.direction]
+    return np.where(turn, choices, NONE)
+
+
+def greedy_policy(batch):
+    """Va verso il cibo (distanza con l'attraversamento dei bordi) evitando il corpo e le inversioni quando possibile."""
+    codes = np.array(DIRECTION_CODES, dtype=np.int8)
+    games = np.arange(batch.games)[:, None]
+    targets = batch.table[batch.head[:, None], codes[None, :]]
+    # Una cella è sicura se alla prossima mossa non fa più parte del corpo
+    body = np.minimum(batch.body + 1, batch.length)[:, None]
+    unsafe = batch.moves[:, None] + 1 - batch.visited[games, targets] < body
+    reverse = codes[None, :] == batch.opposite[batch.direction][:, None]
+    food = np.maximum(batch.food, 0)[:, None]
+    cols = np.abs(targets % batch.cols - food % batch.cols)
+    rows = np.abs(targets // batch.cols - food // batch.cols)
+    distance = np.minimum(cols, batch.cols - cols) + np.minimum(rows, batch.rows - rows)
+    cost = distance + unsafe * 4 * batch.table.shape[0] + reverse * 8 * batch.table.shape[0] + batch.rng.random(targets.shape)
+    return codes[np.argmin(cost, axis=1)]
+
+
+POLICIES = {"random": random_policy, "greedy": greedy_policy}
+
+
+def run(batch, policy, steps):
+    """Fa avanzare il lotto per `steps` tick, ricominciando le partite terminate; restituisce (risultati, tick di gioco simulati)."""
+    results = {name: [] for name in ("score", "length", "ticks", "elapsed", "speed", "won", "crashed")}
+    game_steps = 0
+    for _ in range(steps):
+        game_steps += batch.step(policy(batch))
+        finished = batch.finished()
+        if len(finished):
+            for name, values in results.items():
+                values.append(getattr(batch, name)[finished].copy())
+            batch.reset(finished)
+    return {name: np.concatenate(values) if values else np.zeros(0) for name, values in results.items()}, game_steps
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simula molte partite di Snake in parallelo e ne riassume i risultati.")
+    parser.add_argument("--games", type=int, default=4096, help="partite simulate contemporaneamente (default 4096)")
+    parser.add_argument("--steps", type=int, default=2000, help="tick da simulare (default 2000)")
+    parser.add_argument("--difficulty", default="Balanced", choices=list(engine.INITIAL_SPEEDS))
+    parser.add_argument("--resolution", default="800x600", help="risoluzione del campo, es. 1024x768")
+    parser.add_argument("--policy", default="greedy", choices=list(POLICIES))
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--speed-increment", type=float, default=None, help="aumento di velocità (default: quello della difficoltà)")
+    parser.add_argument("--speed-threshold", type=float, default=None, help="punti tra due aumenti di velocità")
+    parser.add_argument("--special-food-chance", type=int, default=engine.SPECIAL_FOOD_CHANCE, help="il cibo speciale compare con probabilità 1/N per tick")
+    parser.add_argument("--effects", action="store_true", help="applica effetti speciali a caso quando il gioco mostrerebbe il menu")
+    args = parser.parse_args()
+
+    width, height = (int(value) for value in args.resolution.split("x"))
+    batch = BatchState(args.games, width, height, args.difficulty, seed=args.seed, speed_increment=args.speed_increment,
+                       speed_threshold=args.speed_threshold, special_food_chance=args.special_food_chance, effects=args.effects)
+    start = time.perf_counter()
+    results, game_steps = run(batch, POLICIES[args.policy], args.steps)
+    elapsed = time.perf_counter() - start
+
+    finished = len(results["score"])
+    print(f"{finished} partite terminate ({int(results['won'].sum())} vinte, {int(results['crashed'].sum())} schiantate)")
+    if finished:
+        for name in ("score", "length", "ticks", "elapsed", "speed"):
+            values = results[name]
+            p50, p95 = np.percentile(values, [50, 95])
+            print(f"{name:<8} media {values.mean():10.2f}  p50 {p50:10.2f}  p95 {p95:10.2f}  max {values.max():10.2f}")
+    print(f"{game_steps:,} tick di gioco in {elapsed:.2f} s ({game_steps / max(elapsed, 1e-9):,.0f} tick di gioco/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""Battaglia tra N serpenti (giocatori, IA o bot) su un campo condiviso, con le regole di engine generalizzate.
+
+A differenza del 1 vs 1 la partita non finisce al primo schianto: il serpente che si schianta viene eliminato e le
+sue celle tornano libere; vince l'ultimo rimasto (o chi ha il punteggio più alto se cadono tutti insieme). Nel campo
+ci sono più cibi contemporaneamente, in proporzione al numero di serpenti.
+
+Una sola griglia `owner` dice per ogni cella quale serpente la occupa (giocatore + 1, 0 se libera), quindi le
+collisioni di un tick si risolvono in O(N) con N serpenti: per ogni testa basta guardare la cella di arrivo, e le teste
+che arrivano nella stessa cella si contano in un dizionario. Il costo non dipende dalla lunghezza dei corpi.
+
+I controller (bot o giocatori) hanno la stessa interfaccia dei bot di tournament.py: decide(stato) restituisce la
+direzione da prendere (None per non cambiare).
+
+Uso da riga di comando (partita tra bot senza grafica, misura dei tick al secondo):
+    python battle.py --snakes 64 --size 200x200 --ticks 2000
+"""
+import argparse
+import math
+import random
+import time
+from array import array
+
+import engine
+
+FOOD_PER_SNAKE = 1  # Cibi presenti nel campo per ogni serpente all'inizio della partita
+INITIAL_BODY = 64  # Capacità iniziale del corpo: cresce quando serve, così N serpenti non occupano N campi interi
+
+
+class BattleState:
+    """Stato di una battaglia tra N serpenti, avanzato da step()."""
+
+    def __init__(self, cols, rows, players, difficulty="Balanced", rng=None, foods=None):
+        self.cols, self.rows = cols, rows
+        self.width, self.height = cols * engine.BLOCK_SIZE, rows * engine.BLOCK_SIZE
+        self.difficulty = difficulty
+        self.rng = rng if rng is not None else random.Random()
+        cells = cols * rows
+        # Un byte per cella basta fino a 255 serpenti
+        self.owner = bytearray(cells) if players < 0x100 else array('H', [0]) * cells
+        self.free = engine.FreeCells(range(cells), cells)
+        speed = engine.initial_speed(difficulty)
+        self.snakes = []
+        # Partenze distribuite su una griglia regolare, una per serpente
+        side = math.ceil(math.sqrt(players))
+        for player in range(players):
+            col = (player % side * 2 + 1) * cols // (side * 2)
+            row = (player // side * 2 + 1) * rows // (side * 2)
+            snake = engine.Snake(player, col * engine.BLOCK_SIZE, row * engine.BLOCK_SIZE, speed, cols, 0)
+            snake.body = engine.SnakeBody(cols, INITIAL_BODY, cells)
+            self.occupy(snake, row * cols + col)
+            self.snakes.append(snake)
+        self.alive = players
+        self.foods = set()
+        for _ in range(players * FOOD_PER_SNAKE if foods is None else foods):
+            self.spawn_food()
+        self.game_close = False
+        self.winner = None  # Giocatore vincitore a fine partita (None se nessuno)
+        self.tick = 0
+
+    def position(self, cell):
+        """Restituisce le coordinate in pixel della cella."""
+        return (cell % self.cols) * engine.BLOCK_SIZE, (cell // self.cols) * engine.BLOCK_SIZE
+
+    def neighbour(self, cell, direction):
+        """Restituisce la cella adiacente nella direzione indicata, con l'attraversamento dei bordi."""
+        x_change, y_change = engine.DIRECTIONS[direction]
+        col = (cell % self.cols + x_change // engine.BLOCK_SIZE) % self.cols
+        row = (cell // self.cols + y_change // engine.BLOCK_SIZE) % self.rows
+        return row * self.cols + col
+
+    def occupy(self, snake, cell):
+        """Aggiunge la testa del serpente nella cella."""
+        snake.body.push(cell)
+        self.owner[cell] = snake.player + 1
+        self.free.remove(cell)
+
+    def release(self, cell):
+        """Libera la cella."""
+        self.owner[cell] = 0
+        self.free.add(cell)
+
+    def spawn_food(self):
+        """Aggiunge un cibo in una cella libera; i tentativi sono limitati, quindi in un campo pieno può non comparire."""
+        for _ in range(8):
+            cell = self.free.sample(self.rng)
+            if cell is None:
+                return
+            if cell not in self.foods:
+                self.foods.add(cell)
+                return
+
+    def eliminate(self, snake):
+        """Il serpente si è schiantato: esce dalla partita e libera tutte le sue celle."""
+        snake.crashed = True
+        while snake.body:
+            self.release(snake.body.pop())
+        self.alive -= 1
+
+
+def step(state, actions=(), movers=None):
+    """Avanza la battaglia di un tick applicando le azioni dei giocatori (una per serpente).
+
+    movers indica quali serpenti si muovono in questo tick (tutti se None). Le code si spostano prima delle teste,
+    quindi si può entrare nella cella lasciata libera da una coda nello stesso tick; due o più teste nella stessa
+    cella si schiantano tutte.
+    """
+    snakes, owner = state.snakes, state.owner
+    if movers is None:
+        movers = [True] * len(snakes)
+    moving = []
+    for snake, action, moves in zip(snakes, actions, movers):
+        if not moves or snake.crashed:
+            continue
+        engine.apply_action(snake, action)
+        if snake.x_change or snake.y_change:
+            moving.append((snake, state.neighbour(snake.body.head(), snake.direction)))
+    for snake, _ in moving:
+        if len(snake.body) >= snake.length:
+            state.release(snake.body.pop())
+    targets = {}
+    for _, cell in moving:
+        targets[cell] = targets.get(cell, 0) + 1
+    # Gli schianti si decidono tutti sulla griglia prima che le teste si muovano e i corpi si liberino solo dopo,
+    # così il risultato non dipende dall'ordine dei giocatori
+    crashed = [snake for snake, cell in moving if owner[cell] or targets[cell] > 1]
+    for snake, cell in moving:
+        snake.prev_x, snake.prev_y = snake.x, snake.y
+        snake.x, snake.y = state.position(cell)
+        if owner[cell] or targets[cell] > 1:
+            continue
+        state.occupy(snake, cell)
+        if cell in state.foods:
+            state.foods.discard(cell)
+            state.spawn_food()
+            snake.length += 1
+            snake.score = round(snake.score + snake.food_points_multiplier, 1)
+            snake.speed, snake.last_updated_score = engine.update_speed(snake.score, state.difficulty, snake.speed, snake.last_updated_score)
+    for snake in crashed:
+        state.eliminate(snake)
+    if state.alive <= (1 if len(snakes) > 1 else 0):
+        state.game_close = True
+        survivors = [snake for snake in snakes if not snake.crashed]
+        if survivors:
+            state.winner = survivors[0].player
+        elif crashed:
+            # Gli ultimi sono caduti insieme: vince chi ha il punteggio più alto, nessuno in caso di parità
+            best = max(snake.score for snake in crashed)
+            leaders = [snake for snake in crashed if snake.score == best]
+            state.winner = leaders[0].player if len(leaders) == 1 else None
+    state.tick += 1
+    return state
+
+
+class BattleBot:
+    """Bot economico: va verso il cibo più vicino evitando le celle occupate e quelle accanto alle altre teste."""
+
+    def __init__(self, state, player, rng):
+        self.player = player
+        self.rng = rng
+        self.target = None
+
+    def distance(self, state, cell, target):
+        """Distanza sulla griglia tra due celle, con l'attraversamento dei bordi."""
+        cols = abs(cell % state.cols - target % state.cols)
+        rows = abs(cell // state.cols - target // state.cols)
+        return min(cols, state.cols - cols) + min(rows, state.rows - rows)
+
+    def danger(self, state, cell):
+        """Conta le teste di altri serpenti accanto alla cella (potrebbero entrarci nello stesso tick)."""
+        count = 0
+        for direction in engine.DIRECTIONS:
+            near = state.neighbour(cell, direction)
+            player = state.owner[near] - 1
+            if player >= 0 and player != self.player and state.snakes[player].body.head() == near:
+                count += 1
+        return count
+
+    def decide(self, state):
+        snake = state.snakes[self.player]
+        if snake.crashed:
+            return None
+        head = snake.body.head()
+        if self.target not in state.foods:
+            self.target = min(state.foods, key=lambda food: self.distance(state, head, food), default=None)
+        best, best_key = None, None
+        for direction in engine.DIRECTIONS:
+            if snake.direction is not None and not engine.can_turn(snake.direction, direction):
+                continue
+            cell = state.neighbour(head, direction)
+            if state.owner[cell]:
+                continue
+            # Una cella senza uscite libere è un vicolo cieco
+            exits = sum(not state.owner[state.neighbour(cell, near)] for near in engine.DIRECTIONS)
+            distance = 0 if self.target is None else self.distance(state, cell, self.target)
+            key = (self.danger(state, cell), exits == 0, distance, self.rng.random())
+            if best_key is None or key < best_key:
+                best, best_key = direction, key
+        return best
+
+
+def run(state, controllers, max_ticks=None):
+    """Gioca la partita tick per tick (tutti i serpenti si muovono a ogni tick); restituisce i tick giocati."""
+    start = state.tick
+    while not state.game_close and (max_ticks is None or state.tick - start < max_ticks):
+        actions = [None if snake.crashed else controller.decide(state) for controller, snake in zip(controllers, state.snakes)]
+        step(state, actions)
+    return state.tick - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Battaglia tra N bot di Snake senza grafica, con la misura dei tick al secondo.")
+    parser.add_argument("--snakes", type=int, default=64, help="serpenti in gara (default 64)")
+    parser.add_argument("--size", default="200x200", help="dimensioni del campo in celle (default 200x200)")
+    parser.add_argument("--ticks", type=int, default=2000, help="tick massimi della partita (default 2000)")
+    parser.add_argument("--difficulty", default="Balanced", choices=list(engine.INITIAL_SPEEDS))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    cols, rows = (int(value) for value in args.size.split("x"))
+    state = BattleState(cols, rows, args.snakes, args.difficulty, rng=random.Random(args.seed))
+    controllers = [BattleBot(state, player, random.Random(args.seed * args.snakes + player)) for player in range(args.snakes)]
+    start = time.perf_counter()
+    ticks = run(state, controllers, args.ticks)
+    elapsed = time.perf_counter() - start
+    longest = max(state.snakes, key=lambda snake: snake.length)
+    print(f"{args.snakes} serpenti su {cols}x{rows}: {ticks} tick in {elapsed:.2f} s ({ticks / elapsed:,.0f} tick/s), "
+          f"{state.alive} ancora in gara, il più lungo è il giocatore {longest.player + 1} ({longest.length} segmenti)")
+    if state.game_close:
+        print("Vincitore: " + ("nessuno" if state.winner is None else f"giocatore {state.winner + 1}"))
+
+
+if __name__ == "__main__":
+    main()
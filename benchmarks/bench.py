@@ -0,0 +1,254 @@
+"""Benchmark dei punti critici del gioco (motore, disegno, record), eseguibili senza finestra.
+
+Uso:
+    python benchmarks/bench.py                  # esegue e confronta con baseline.json
+    python benchmarks/bench.py --save-baseline  # salva i risultati come nuova baseline
+    python benchmarks/bench.py -k draw          # esegue solo i benchmark che contengono "draw"
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+# Driver SDL fittizi: nessuna finestra e nessun audio
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import engine  # noqa: E402
+import snake  # noqa: E402
+
+snake.init_display()
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+MIN_TIME = 0.2  # Secondi minimi di misura per ogni ripetizione
+REPEATS = 3
+
+
+def measure(func, min_time=MIN_TIME, repeats=REPEATS):
+    """Esegue func ripetutamente e restituisce le operazioni al secondo (migliore ripetizione)."""
+    best = 0.0
+    for _ in range(repeats):
+        count = 0
+        start = time.perf_counter()
+        elapsed = 0.0
+        while elapsed < min_time:
+            func()
+            count += 1
+            elapsed = time.perf_counter() - start
+        best = max(best, count / elapsed)
+    return best
+
+
+def filled_state(fill_ratio, seed=0):
+    """Crea una partita 800x600 con la frazione indicata di celle occupate dal serpente."""
+    state = engine.GameState(800, 600, "Balanced", rng=random.Random(seed))
+    free = list(state.occupancy.free.cells)
+    random.Random(seed).shuffle(free)
+    for cell in free[:int(len(free) * fill_ratio)]:
+        state.occupancy.add(0, cell)
+    return state
+
+
+def long_snake_state(length):
+    """Crea una partita con un serpente lungo `length` che percorre il campo riga per riga."""
+    state = engine.GameState(800, 600, "Balanced", rng=random.Random(0))
+    state.snakes[0].length = length
+    for move in range(length):
+        engine.step(state, [serpentine_action(move)])
+    return state
+
+
+def serpentine_action(move):
+    """Direzione della mossa `move` lungo un percorso che copre una riga intera prima di scendere."""
+    return "DOWN" if move % 40 == 39 else "RIGHT"
+
+
+def bench_generate_food(fill_ratio):
+    state = filled_state(fill_ratio)
+    return lambda: engine.generate_food(state)
+
+
+def bench_step(length, steps=200, repeats=10):
+    """Misura engine.step() (movimento e collisioni) con un serpente lungo `length`."""
+    best = 0.0
+    for _ in range(repeats):
+        state = long_snake_state(length)
+        start = time.perf_counter()
+        for move in range(length, length + steps):
+            engine.step(state, [serpentine_action(move)])
+        best = max(best, steps / (time.perf_counter() - start))
+    return best
+
+
+def bench_our_snake(length):
+    body = [[(i % 40) * engine.BLOCK_SIZE, 40 + (i // 40 % 28) * engine.BLOCK_SIZE] for i in range(length)]
+    return lambda: snake.our_snake(engine.BLOCK_SIZE, body, player=1)
+
+
+def bench_arena_frame(cells, length=2000):
+    """Disegna un frame della modalità Arena (sfondo, cibo e serpente visibili) su un campo di cells x cells celle."""
+    state = engine.GameState(cells * engine.BLOCK_SIZE, cells * engine.BLOCK_SIZE, "Balanced", rng=random.Random(0))
+    state.snakes[0].length = length
+    for move in range(length):
+        engine.step(state, [serpentine_action(move)])
+    camera = snake.Camera(state.width, state.height)
+    camera.follow(state.snakes[0].x, state.snakes[0].y)
+
+    def frame():
+        snake.draw_arena_background(camera)
+        snake.draw_food(state, camera)
+        snake.draw_food_marker(state, camera)
+        snake.draw_arena_snake(state, 0, camera, 0.5)
+    return frame
+
+
+def bench_text(changing):
+    counter = iter(range(10 ** 9))
+    if changing:
+        return lambda: snake.draw_text_with_options(f"Score: {next(counter) / 10:.1f}", snake.font_style, 15, 15, snake.WHITE, snake.BLACK)
+    return lambda: snake.draw_text_with_options("Score: 12.0", snake.font_style, 15, 15, snake.WHITE, snake.BLACK)
+
+
+MENUS = {
+    "Snake Game": dict(options=["Play", "High Score", "Mode", "Resolution", "Quit"]),
+    "Select Game Mode": dict(options=["Single", "1vs1", "AutoPilot", "Arena", "Battle", "Back"]),
+    "High Score": dict(options=["Back"], all_high_scores={
+        "Relaxed": [{"score": 9, "game_id": "a"}, {"score": 4, "game_id": "b"}],
+        "Balanced": [{"score": 113.0, "game_id": "c"}],
+        "Extreme": [],
+    }),
+    "Change Mode": dict(options=["Relaxed", "Balanced", "Extreme", "Back"]),
+    "Change Resolution": dict(options=["800 x 600", "1024 x 768", "1280 x 720", "1920 x 1080", "Fullscreen", "Back"],
+                              resolutions=[(800, 600), (1024, 768), (1280, 720), (1920, 1080), 'fullscreen'], is_fullscreen=False),
+    "Pause Menu": dict(options=["Resume", "Restart", "Main Menu"], score=12.0, high_score=113.0),
+    "Game Over": dict(options=["Play Again", "Main Menu"], score=12.0, high_score=113.0),
+}
+
+
+def bench_menu(title):
+    kwargs = dict(MENUS[title])
+    options = kwargs.pop("options")
+    return lambda: snake.draw_menu(title, options, 0, **kwargs)
+
+
+def bench_update_records():
+    records = {"Relaxed": [], "Balanced": [{"score": 113.0, "game_id": "a"}, {"score": 97.0, "game_id": "b"}], "Extreme": []}
+    scores = iter(range(10 ** 9))
+    return lambda: snake.update_records(records, "Balanced", next(scores) % 200 / 2, "game")
+
+
+def bench_write_records():
+    records = snake.read_records()
+    return lambda: snake.write_records(records)
+
+
+def bench_batch_step(games, steps=50):
+    """Misura batch.BatchState.step(): restituisce i tick di gioco al secondo (partite x tick)."""
+    import batch  # Richiede NumPy
+    state = batch.BatchState(games, seed=0)
+    start = time.perf_counter()
+    for _ in range(steps):
+        state.step(batch.greedy_policy(state))
+    return games * steps / (time.perf_counter() - start)
+
+
+def bench_battle_step(snakes, ticks=200):
+    """Misura battle.step() con le decisioni dei bot: restituisce i tick della battaglia al secondo."""
+    import battle
+    state = battle.BattleState(200, 200, snakes, rng=random.Random(0))
+    bots = [battle.BattleBot(state, player, random.Random(player)) for player in range(snakes)]
+    start = time.perf_counter()
+    played = battle.run(state, bots, ticks)
+    return played / (time.perf_counter() - start)
+
+
+def bench_startup(runs=3):
+    """Avvia il gioco fino al primo frame del menu: restituisce gli avvii al secondo (il migliore su runs)."""
+    best = None
+    with tempfile.TemporaryDirectory() as folder:
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, os.path.join(ROOT, "snake.py"), "--startup-time"], cwd=folder, check=True,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+    return 1 / best
+
+
+def collect():
+    """Restituisce l'elenco (nome, funzione che misura le operazioni al secondo) dei benchmark."""
+    benchmarks = []
+    for ratio in (0.1, 0.5, 0.9, 0.99):
+        benchmarks.append((f"generate_food fill={ratio}", lambda ratio=ratio: measure(bench_generate_food(ratio))))
+    for length in (10, 100, 500, 900):
+        benchmarks.append((f"step length={length}", lambda length=length: bench_step(length)))
+    for games in (1, 1024):
+        benchmarks.append((f"batch step games={games}", lambda games=games: bench_batch_step(games)))
+    for snakes in (2, 64):
+        benchmarks.append((f"battle step snakes={snakes}", lambda snakes=snakes: bench_battle_step(snakes)))
+    benchmarks.append(("draw_background", lambda: measure(snake.draw_background)))
+    for length in (10, 100, 500):
+        benchmarks.append((f"our_snake length={length}", lambda length=length: measure(bench_our_snake(length))))
+    for cells in (100, 1000):
+        benchmarks.append((f"arena frame cells={cells}", lambda cells=cells: measure(bench_arena_frame(cells))))
+    benchmarks.append(("draw_text_with_options static", lambda: measure(bench_text(False))))
+    benchmarks.append(("draw_text_with_options changing", lambda: measure(bench_text(True))))
+    for title in MENUS:
+        benchmarks.append((f"draw_menu {title}", lambda title=title: measure(bench_menu(title))))
+    benchmarks.append(("update_records", lambda: measure(bench_update_records())))
+    benchmarks.append(("write_records", lambda: measure(bench_write_records())))
+    benchmarks.append(("startup to first menu frame", bench_startup))
+    return benchmarks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dei punti critici di Snake.")
+    parser.add_argument("-k", dest="keyword", default="", help="esegue solo i benchmark il cui nome contiene questa parola")
+    parser.add_argument("--save-baseline", action="store_true", help="salva i risultati in baseline.json")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="calo massimo accettato rispetto alla baseline (default 0.25)")
+    args = parser.parse_args()
+
+    # I record vengono scritti in una cartella temporanea, mai su record.txt
+    with tempfile.TemporaryDirectory() as folder:
+        snake.RECORDS_FILE = os.path.join(folder, "record.txt")
+        results = {}
+        for name, run in collect():
+            if args.keyword in name:
+                results[name] = run()
+
+    baseline = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as file:
+            baseline = json.load(file)
+
+    regressions = []
+    print(f"{'benchmark':<40} {'ops/s':>14} {'baseline':>14} {'ratio':>7}")
+    for name, ops in results.items():
+        reference = baseline.get(name)
+        if reference:
+            ratio = ops / reference
+            flag = " REGRESSION" if ratio < 1 - args.tolerance else ""
+            if flag:
+                regressions.append(name)
+            print(f"{name:<40} {ops:>14,.1f} {reference:>14,.1f} {ratio:>7.2f}{flag}")
+        else:
+            print(f"{name:<40} {ops:>14,.1f} {'-':>14} {'-':>7}")
+
+    if args.save_baseline:
+        baseline.update({name: round(ops, 1) for name, ops in results.items()})
+        with open(BASELINE_PATH, "w") as file:
+            json.dump(baseline, file, indent=4)
+        print(f"Baseline salvata in {BASELINE_PATH}")
+    elif regressions:
+        print(f"{len(regressions)} benchmark più lenti della baseline oltre la tolleranza del {args.tolerance:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,397 @@
+"""Motore di gioco headless: contiene le regole dello Snake senza dipendere da pygame."""
+import math
+import random
+from array import array
+
+# Dimensioni della griglia di gioco
+BLOCK_SIZE = 20
+SCOREBOARD_HEIGHT = 50
+
+# Direzioni di movimento e relativo spostamento in pixel
+DIRECTIONS = {
+    "LEFT": (-BLOCK_SIZE, 0),
+    "RIGHT": (BLOCK_SIZE, 0),
+    "UP": (0, -BLOCK_SIZE),
+    "DOWN": (0, BLOCK_SIZE),
+}
+OPPOSITE = {"LEFT": "RIGHT", "RIGHT": "LEFT", "UP": "DOWN", "DOWN": "UP"}
+STOP = "STOP"  # Azione che ferma il serpente (tasti opposti premuti insieme)
+
+# Parametri del cibo speciale
+SPECIAL_FOOD_CHANCE = 100
+SPECIAL_FOOD_DURATION = 100
+
+INITIAL_SPEEDS = {"Relaxed": 8, "Balanced": 13, "Extreme": 20}
+# Aumento di velocità e ogni quanti punti applicarlo, per difficoltà
+SPEED_RULES = {"Relaxed": (0.5, 10), "Balanced": (0.5, 5), "Extreme": (1, 5)}
+DEFAULT_SPEED_RULE = (0.05, 10)
+
+
+def initial_speed(difficulty):
+    """Restituisce la velocità iniziale per la difficoltà indicata."""
+    return INITIAL_SPEEDS.get(difficulty, 5)
+
+
+def update_speed(score, CURRENT_DIFFICULTY, current_speed, last_updated_score):
+    """Aggiorna la velocità del gioco in base al punteggio e alla difficoltà corrente."""
+    speed_increment, threshold = SPEED_RULES.get(CURRENT_DIFFICULTY, DEFAULT_SPEED_RULE)
+    if score // threshold > last_updated_score // threshold:
+        last_updated_score = score
+        return current_speed + speed_increment, last_updated_score
+    return current_speed, last_updated_score
+
+
+def can_turn(direction, new_direction):
+    """Controlla se il serpente può girare nella nuova direzione (niente inversioni)."""
+    return direction != OPPOSITE[new_direction]
+
+
+class SnakeBody:
+    """Corpo del serpente come buffer circolare preallocato di indici di cella (dalla coda alla testa)."""
+
+    def __init__(self, cols, capacity, cells=None):
+        self.cols = cols
+        # 'H' (2 byte) basta finché gli indici di cella (cells, di solito pari alla capacità) stanno in 16 bit
+        self.cells = array('H' if (cells or capacity) <= 0x10000 else 'I', [0]) * capacity
+        self.start = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        """Restituisce le coordinate in pixel dei segmenti, dalla coda alla testa."""
+        cells, cols, capacity = self.cells, self.cols, len(self.cells)
+        for i in range(self.start, self.start + self.count):
+            cell = cells[i % capacity]
+            yield (cell % cols) * BLOCK_SIZE, (cell // cols) * BLOCK_SIZE
+
+    def push(self, cell):
+        """Aggiunge un segmento in testa."""
+        if self.count == len(self.cells):
+            self.grow()
+        self.cells[(self.start + self.count) % len(self.cells)] = cell
+        self.count += 1
+
+    def pop(self):
+        """Rimuove il segmento in coda e ne restituisce la cella."""
+        cell = self.cells[self.start]
+        self.start = (self.start + 1) % len(self.cells)
+        self.count -= 1
+        return cell
+
+    def head(self):
+        """Restituisce la cella della testa."""
+        return self.cells[(self.start + self.count - 1) % len(self.cells)]
+
+    def tail(self):
+        """Restituisce la cella della coda."""
+        return self.cells[self.start]
+
+    def indices(self):
+        """Restituisce gli indici di cella dei segmenti, dalla coda alla testa."""
+        cells, capacity = self.cells, len(self.cells)
+        return [cells[i % capacity] for i in range(self.start, self.start + self.count)]
+
+    def tail_indices(self, count):
+        """Restituisce gli indici di cella dei primi count segmenti a partire dalla coda."""
+        cells, capacity = self.cells, len(self.cells)
+        return [cells[i % capacity] for i in range(self.start, self.start + min(count, self.count))]
+
+    def grow(self):
+        """Raddoppia la capacità del buffer (serve solo se il corpo supera il numero di celle del campo)."""
+        cells = array(self.cells.typecode, (self.cells[(self.start + i) % len(self.cells)] for i in range(self.count)))
+        cells.extend(cells)
+        self.cells, self.start = cells, 0
+
+
+class Snake:
+    """Stato di un singolo serpente: posizione, corpo, punteggio e velocità."""
+
+    def __init__(self, player, x, y, speed, cols, cells):
+        self.player = player
+        self.x, self.y = x, y
+        self.prev_x, self.prev_y = x, y
+        self.x_change, self.y_change = 0, 0
+        self.direction = None
+        self.body = SnakeBody(cols, cells + 1)
+        self.length = 1
+        self.score = 1
+        self.speed = speed
+        self.last_updated_score = 0
+        self.food_points_multiplier = 1.0
+        self.special_food_points_multiplier = 1.0
+        self.crashed = False
+
+
+class FreeCells:
+    """Insieme delle celle libere con campionamento uniforme in O(1) (array con rimozione per scambio)."""
+
+    def __init__(self, cells, size):
+        self.cells = array('i', cells)
+        self.position = array('i', [-1]) * size
+        self.allowed = bytearray(size)  # Celle in cui può comparire il cibo
+        for pos, cell in enumerate(self.cells):
+            self.position[cell] = pos
+            self.allowed[cell] = 1
+
+    def __len__(self):
+        return len(self.cells)
+
+    def add(self, cell):
+        """Segna la cella come libera."""
+        if self.allowed[cell] and self.position[cell] == -1:
+            self.position[cell] = len(self.cells)
+            self.cells.append(cell)
+
+    def remove(self, cell):
+        """Segna la cella come occupata, spostando l'ultima cella libera al suo posto."""
+        pos = self.position[cell]
+        if pos == -1:
+            return
+        last = self.cells.pop()
+        if last != cell:
+            self.cells[pos] = last
+            self.position[last] = pos
+        self.position[cell] = -1
+
+    def sample(self, rng):
+        """Restituisce una cella libera scelta uniformemente, oppure None se non ce ne sono."""
+        if not self.cells:
+            return None
+        return self.cells[rng.randrange(len(self.cells))]
+
+
+class Occupancy:
+    """Griglia di occupazione: per ogni giocatore, quanti segmenti del serpente stanno in ogni cella."""
+
+    def __init__(self, width, height, players):
+        # Se la risoluzione non è multipla di BLOCK_SIZE, l'ultima riga e l'ultima colonna sono parziali
+        self.cols = -(-width // BLOCK_SIZE)
+        self.rows = -(-height // BLOCK_SIZE)
+        self.grids = [bytearray(self.cols * self.rows) for _ in range(players)]
+        self.total = bytearray(self.cols * self.rows)
+        # Il cibo può comparire solo nelle celle intere sotto la barra del punteggio
+        self.free = FreeCells((row * self.cols + col for row in range(SCOREBOARD_HEIGHT // BLOCK_SIZE, height // BLOCK_SIZE)
+                               for col in range(width // BLOCK_SIZE)), self.cols * self.rows)
+
+    def index(self, x, y):
+        """Restituisce l'indice della cella che contiene il punto (x, y)."""
+        return (y // BLOCK_SIZE) * self.cols + x // BLOCK_SIZE
+
+    def position(self, cell):
+        """Restituisce le coordinate in pixel della cella."""
+        return (cell % self.cols) * BLOCK_SIZE, (cell // self.cols) * BLOCK_SIZE
+
+    def add(self, player, cell):
+        """Registra un segmento del giocatore nella cella."""
+        self.grids[player][cell] += 1
+        if not self.total[cell]:
+            self.free.remove(cell)
+        self.total[cell] += 1
+
+    def remove(self, player, cell):
+        """Rimuove un segmento del giocatore dalla cella."""
+        self.grids[player][cell] -= 1
+        self.total[cell] -= 1
+        if not self.total[cell]:
+            self.free.add(cell)
+
+    def count(self, player, cell):
+        """Restituisce quanti segmenti del giocatore occupano la cella."""
+        return self.grids[player][cell]
+
+    def occupant(self, x, y):
+        """Restituisce il giocatore che occupa la cella (x, y), oppure None se è libera."""
+        cell = self.index(x, y)
+        if not self.total[cell]:
+            return None
+        for player, grid in enumerate(self.grids):
+            if grid[cell]:
+                return player
+        return None
+
+
+class GameState:
+    """Stato completo di una partita, avanzato da step()."""
+
+    def __init__(self, width, height, difficulty="Balanced", players=1, rng=None):
+        self.width, self.height = width, height
+        self.difficulty = difficulty
+        self.rng = rng if rng is not None else random.Random()
+        speed = initial_speed(difficulty)
+        if players == 1:
+            starts = [(width // 2, height // 2)]
+        else:
+            starts = [(width // 4, height // 2), (3 * width // 4, height // 2)]
+        self.occupancy = Occupancy(width, height, len(starts))
+        cols, cells = self.occupancy.cols, self.occupancy.cols * self.occupancy.rows
+        self.snakes = [Snake(player, x, y, speed, cols, cells) for player, (x, y) in enumerate(starts)]
+        self.food = generate_food(self)
+        self.special_food = None
+        self.special_food_timer = 0
+        self.game_close = False
+        self.won = False
+        self.tick = 0
+
+
+class TickScheduler:
+    """Passo fisso con accumulatore: ogni serpente avanza con il proprio intervallo, pari a 1 / velocità."""
+
+    def __init__(self, players):
+        self.accumulators = [0.0] * players
+
+    def advance(self, dt, snakes):
+        """Aggiunge dt secondi e restituisce, un tick alla volta, quali serpenti devono muoversi."""
+        self.accumulators = [acc + dt for acc in self.accumulators]
+        while True:
+            movers = [acc >= 1 / snake.speed for acc, snake in zip(self.accumulators, snakes)]
+            if not any(movers):
+                return
+            for i, moves in enumerate(movers):
+                if moves:
+                    self.accumulators[i] -= 1 / snakes[i].speed
+            yield movers
+
+    def alpha(self, i, snake):
+        """Frazione dell'intervallo del serpente già trascorsa, per interpolare il disegno."""
+        return min(1.0, self.accumulators[i] * snake.speed)
+
+
+def generate_food(state):
+    """Genera una posizione casuale per il cibo tra le celle libere (None se il campo è pieno)."""
+    cell = state.occupancy.free.sample(state.rng)
+    if cell is None:
+        return None
+    return state.occupancy.position(cell)
+
+
+def next_position(width, height, x, y, x_change, y_change):
+    """Calcola la prossima posizione della testa, con l'attraversamento dei bordi."""
+    x += x_change
+    y += y_change
+    if x < 0:
+        x = width - BLOCK_SIZE
+    elif x >= width:
+        x = 0
+    if y < SCOREBOARD_HEIGHT:
+        y = height - BLOCK_SIZE
+    elif y >= height:
+        y = SCOREBOARD_HEIGHT
+    x = (x // BLOCK_SIZE) * BLOCK_SIZE
+    y = (y // BLOCK_SIZE) * BLOCK_SIZE
+    return x, y
+
+
+def apply_action(snake, action):
+    """Applica l'azione di un giocatore: None (nessun cambio), una direzione o STOP."""
+    if action is None:
+        return
+    if action == STOP:
+        snake.x_change, snake.y_change = 0, 0
+    else:
+        snake.x_change, snake.y_change = DIRECTIONS[action]
+        snake.direction = action
+
+
+def update_special_food(state):
+    """Fa scadere o compare il cibo speciale (probabilità 1/100 per tick)."""
+    if state.special_food_timer > 0:
+        state.special_food_timer -= 1
+    elif state.special_food_timer == 0 and state.rng.randint(1, SPECIAL_FOOD_CHANCE) == 1:
+        special_foodx = round(state.rng.randrange(0, state.width - BLOCK_SIZE) / BLOCK_SIZE) * BLOCK_SIZE
+        special_foody = round(state.rng.randrange(0, state.height - BLOCK_SIZE) / BLOCK_SIZE) * BLOCK_SIZE
+        state.special_food = (special_foodx, special_foody)
+        state.special_food_timer = SPECIAL_FOOD_DURATION
+
+
+def step(state, actions=(), movers=None):
+    """Avanza la partita di un tick applicando le azioni dei giocatori (una per serpente).
+
+    movers indica quali serpenti si muovono in questo tick (tutti se None).
+    """
+    if movers is None:
+        movers = [True] * len(state.snakes)
+    moving = [snake for snake, moves in zip(state.snakes, movers) if moves]
+    for snake, action, moves in zip(state.snakes, actions, movers):
+        if moves:
+            apply_action(snake, action)
+
+    # Aggiornamento della posizione dei serpenti
+    for snake in moving:
+        snake.prev_x, snake.prev_y = snake.x, snake.y
+        snake.x, snake.y = next_position(state.width, state.height, snake.x, snake.y, snake.x_change, snake.y_change)
+
+    update_special_food(state)
+
+    # Aggiornamento dei corpi e controllo delle collisioni
+    occupancy = state.occupancy
+    heads = []
+    for snake, moves in zip(state.snakes, movers):
+        if moves:
+            head = occupancy.index(snake.x, snake.y)
+            snake.body.push(head)
+            occupancy.add(snake.player, head)
+            if len(snake.body) > snake.length:
+                occupancy.remove(snake.player, snake.body.pop())
+            heads.append((snake, head))
+    # Con tutti i corpi aggiornati basta la griglia condivisa: una testa in una cella con altri segmenti (del proprio
+    # corpo, di un altro serpente o un'altra testa) è una collisione, in O(N) per tick
+    for snake, head in heads:
+        if occupancy.total[head] > 1:
+            snake.crashed = True
+    if any(snake.crashed for snake in state.snakes):
+        state.game_close = True
+
+    # Aggiornamento della velocità
+    for snake in moving:
+        snake.speed, snake.last_updated_score = update_speed(snake.score, state.difficulty, snake.speed, snake.last_updated_score)
+
+    # Controllo collisione con il cibo
+    for snake in moving:
+        if (snake.x, snake.y) == state.food:
+            state.food = generate_food(state)
+            if state.food is None:
+                # Il serpente ha riempito tutto il campo: la partita è vinta
+                state.won = True
+                state.game_close = True
+            snake.length += 1
+            snake.score += 1 * snake.food_points_multiplier
+            snake.score = round(snake.score, 1)
+    for snake in moving:
+        if state.special_food_timer > 0 and (snake.x, snake.y) == state.special_food:
+            state.special_food = None
+            state.special_food_timer = 0
+            snake.length += 5
+            snake.score += 5 * snake.special_food_points_multiplier
+            snake.score = round(snake.score, 1)
+
+    state.tick += 1
+    return state
+
+
+# Effetti speciali applicabili a un serpente
+def decrease_speed(state, snake):
+    """Diminuisce la velocità del serpente di 5."""
+    snake.speed = max(1, snake.speed - 5)
+
+
+def increase_food_points(state, snake):
+    """Il cibo normale fornisce il 20% di punti in più."""
+    snake.food_points_multiplier += 0.20
+
+
+def decrease_length(state, snake):
+    """Dimezza la lunghezza del serpente e rimuove i segmenti in coda."""
+    snake.length = max(1, math.ceil(snake.length / 2))
+    while len(snake.body) > snake.length:
+        state.occupancy.remove(snake.player, snake.body.pop())
+
+
+def increase_special_food_points(state, snake):
+    """Il cibo speciale fornisce il 50% di punti in più."""
+    snake.special_food_points_multiplier += 0.5
+
+
+# Stesso ordine degli effetti speciali mostrati nel menu del gioco
+EFFECTS = [decrease_speed, increase_food_points, decrease_length, increase_special_food_points]
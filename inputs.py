@@ -0,0 +1,83 @@
+"""Coda degli input dei giocatori e misura della latenza tra pressione del tasto e mossa applicata."""
+import math
+from collections import deque
+
+from engine import STOP, can_turn
+
+INPUT_BUFFER_SIZE = 3
+LATENCY_SAMPLES = 1000
+
+
+class LatencyStats:
+    """Raccoglie le latenze (in ms) tra la pressione di un tasto e l'applicazione della svolta."""
+
+    def __init__(self, size=LATENCY_SAMPLES, label="Latenza input"):
+        self.samples = deque(maxlen=size)
+        self.label = label
+
+    def add(self, latency):
+        """Registra una nuova latenza."""
+        self.samples.append(latency)
+
+    def percentiles(self, points=(50, 95, 99)):
+        """Restituisce i percentili richiesti (metodo nearest-rank), oppure None se non ci sono campioni."""
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return {p: ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)] for p in points}
+
+    def report(self):
+        """Restituisce un riepilogo leggibile delle latenze misurate."""
+        values = self.percentiles()
+        if values is None:
+            return f"{self.label}: nessun campione"
+        return f"{self.label}: " + ", ".join(f"p{p} {round(ms, 3)} ms" for p, ms in values.items()) + f" ({len(self.samples)} campioni)"
+
+
+class InputBuffer:
+    """Coda circolare di svolte già validate, ognuna con il timestamp dell'evento che l'ha generata."""
+
+    def __init__(self, direction=None, size=INPUT_BUFFER_SIZE, stats=None):
+        self.actions = [None] * size
+        self.times = [0] * size
+        self.head = 0
+        self.count = 0
+        self.direction = direction  # Direzione dopo l'ultima svolta accodata
+        self.stopped = False
+        self.stats = stats
+
+    def __len__(self):
+        return self.count
+
+    def push(self, action, timestamp):
+        """Accoda una svolta (o STOP) se è valida rispetto all'ultima accodata; restituisce True se accettata."""
+        if self.count == len(self.actions):
+            return False
+        if action == STOP:
+            if self.stopped:
+                return False
+            self.stopped = True
+        else:
+            if not can_turn(self.direction, action):
+                return False
+            # Ripetere la direzione attuale serve solo a ripartire dopo uno STOP
+            if action == self.direction and not self.stopped:
+                return False
+            self.direction = action
+            self.stopped = False
+        tail = (self.head + self.count) % len(self.actions)
+        self.actions[tail] = action
+        self.times[tail] = timestamp
+        self.count += 1
+        return True
+
+    def pop(self, now):
+        """Restituisce la prossima svolta da applicare (None se la coda è vuota) e ne registra la latenza."""
+        if not self.count:
+            return None
+        action = self.actions[self.head]
+        if self.stats is not None:
+            self.stats.add(now - self.times[self.head])
+        self.head = (self.head + 1) % len(self.actions)
+        self.count -= 1
+        return action
@@ -0,0 +1,365 @@
+"""Partite 1 vs 1 in rete: server autorevole asyncio e client con predizione e riconciliazione.
+
+Il server simula la partita e a ogni tick invia ai client solo le azioni dei giocatori e un riepilogo compresso
+dello stato (vedi protocol.py). I client ricalcolano la partita confermata dal seme e, per non aspettare la
+conferma del server, mostrano uno stato previsto: quello confermato più le mosse già dovute secondo il tempo
+trascorso, con gli input propri non ancora confermati. A ogni tick confermato la previsione viene rifatta.
+
+Uso da riga di comando:
+    python netplay.py server --port 5555            # attende i due giocatori
+    python snake.py --connect 127.0.0.1:5555        # client con la finestra di gioco
+    python netplay.py bot --port 5555 --bot greedy  # client senza finestra guidato da un bot
+    python netplay.py selftest                      # server e due client bot in processi separati
+"""
+import argparse
+import asyncio
+import copy
+import json
+import queue
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+
+import engine
+import protocol
+import replay
+from inputs import InputBuffer, LatencyStats
+
+DEFAULT_PORT = 5555
+SERVER_FPS = 60  # Frequenza del ciclo del server, come RENDER_FPS nel gioco
+MAX_FRAME_TIME = 0.1
+PING_INTERVAL = 0.5  # Secondi tra due misure del ritardo
+MAX_PREDICTION = 0.25  # Secondi massimi di gioco previsti oltre l'ultimo tick confermato
+
+
+def set_nodelay(writer):
+    """Disattiva l'algoritmo di Nagle: i messaggi sono piccoli e vanno spediti subito."""
+    sock = writer.get_extra_info("socket")
+    if sock is not None:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+class RemotePlayer:
+    """Giocatore collegato al server: coda delle svolte e ultimo input applicato alla partita."""
+
+    def __init__(self, writer, values):
+        self.writer = writer
+        self.input_buffer = InputBuffer()  # Scarta le inversioni come la tastiera
+        self.queued = deque()  # Numeri degli input accettati e non ancora applicati
+        self.latest = 0  # Ultimo input ricevuto
+        self.ack = 0  # Tutti gli input fino a questo sono stati applicati o scartati
+        self.values = values  # Ultimo riepilogo inviato, base della prossima differenza
+
+    def receive(self, seq, action):
+        """Accoda un input ricevuto dal client."""
+        self.latest = seq
+        if self.input_buffer.push(action, seq):
+            self.queued.append(seq)
+        elif not self.queued:
+            self.ack = seq
+
+    def pop(self):
+        """Restituisce la svolta da applicare in questo tick (None se non ce ne sono)."""
+        action = self.input_buffer.pop(0)
+        if action is not None:
+            seq = self.queued.popleft()
+            self.ack = seq if self.queued else self.latest
+        return action
+
+
+class NetServer:
+    """Server autorevole: simula la partita e la trasmette ai giocatori collegati."""
+
+    def __init__(self, width=800, height=600, difficulty="Balanced", seed=None, players=2):
+        self.seed = random.randrange(2 ** 63) if seed is None else seed
+        self.state = engine.GameState(width, height, difficulty, players=players, rng=random.Random(self.seed))
+        self.players = [None] * players
+        self.ready = asyncio.Event()
+        self.stopped = False
+        self.handlers = set()  # Connessioni aperte, attese alla fine della partita
+
+    async def handle(self, reader, writer):
+        """Gestisce la connessione di un giocatore, dalla presentazione alla disconnessione."""
+        set_nodelay(writer)
+        if None not in self.players or self.ready.is_set():
+            writer.close()
+            return
+        player = self.players.index(None)
+        self.handlers.add(asyncio.current_task())
+        remote = self.players[player] = RemotePlayer(writer, protocol.summary(self.state))
+        state = self.state
+        writer.write(protocol.encode_hello(player, self.seed, state.difficulty, state.width, state.height, len(state.snakes)))
+        if None not in self.players:
+            self.ready.set()
+        try:
+            while True:
+                kind, payload = await protocol.read_frame(reader)
+                if kind == protocol.INPUT:
+                    remote.receive(*protocol.decode_input(payload))
+                elif kind == protocol.PING:
+                    writer.write(protocol.frame(protocol.PONG, payload))
+                elif kind == protocol.RESYNC:
+                    writer.write(protocol.encode_keyframe(self.state))
+                    remote.values = protocol.summary(self.state)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            # Senza uno dei giocatori la partita non può continuare
+            self.stopped = True
+            self.ready.set()
+
+    def broadcast(self, symbol):
+        """Invia a ogni giocatore le azioni del tick e la differenza del riepilogo rispetto al tick precedente."""
+        values = protocol.summary(self.state)
+        for remote in self.players:
+            if remote is not None:
+                remote.writer.write(protocol.encode_tick(self.state.tick, symbol, remote.ack, remote.values, values))
+                remote.values = values
+
+    async def run(self, max_seconds=None):
+        """Attende i giocatori e simula la partita fino alla fine (o per max_seconds); restituisce i tick al secondo."""
+        await self.ready.wait()
+        state = self.state
+        scheduler = engine.TickScheduler(len(state.snakes))
+        loop = asyncio.get_running_loop()
+        start = last = loop.time()
+        while not state.game_close and not self.stopped:
+            await asyncio.sleep(1 / SERVER_FPS)
+            now = loop.time()
+            dt, last = min(now - last, MAX_FRAME_TIME), now
+            for movers in scheduler.advance(dt, state.snakes):
+                actions = [remote.pop() if moves else None for remote, moves in zip(self.players, movers)]
+                engine.step(state, actions, movers)
+                self.broadcast(replay.encode_step(actions, movers))
+                if state.game_close:
+                    break
+            await asyncio.gather(*(remote.writer.drain() for remote in self.players if remote is not None), return_exceptions=True)
+            if max_seconds is not None and now - start >= max_seconds:
+                break
+        for remote in self.players:
+            if remote is not None:
+                remote.writer.close()
+        await asyncio.gather(*self.handlers, return_exceptions=True)
+        return state.tick / max(loop.time() - start, 1e-9)
+
+
+class NetClient:
+    """Client di rete: la connessione gira in un thread asyncio, la partita avanza con update() dal ciclo di gioco.
+
+    Lo stesso client segue anche le partite trasmesse da spectator.py: senza HELLO resta senza giocatore e parte dal
+    primo KEYFRAME.
+    """
+
+    def __init__(self, host, port):
+        self.inbox = queue.SimpleQueue()  # Messaggi (tipo, contenuto, istante di arrivo) ricevuti dal thread di rete
+        self.loop = asyncio.new_event_loop()
+        self.writer = None
+        self.hello = None
+        self.player = None
+        self.confirmed = None  # Stato confermato dal server
+        self.predicted = None  # Stato da mostrare: confermato più le mosse previste
+        self.values = None  # Ultimo riepilogo ricevuto
+        self.pending = deque()  # Input (numero, azione, istante di invio) non ancora applicati dal server
+        self.seq = 0
+        self.since_tick = 0.0  # Secondi dall'ultimo tick confermato
+        self.rtt = None  # Ultimo ritardo di andata e ritorno misurato (secondi)
+        self.pings = {}
+        self.next_ping = 0.0
+        self.resyncing = False
+        self.desyncs = 0
+        self.closed = False
+        self.input_latency = LatencyStats(label="Conferma input")
+        self.thread = threading.Thread(target=self.loop.run_until_complete, args=(self.connection(host, port),), daemon=True)
+        self.thread.start()
+
+    async def connection(self, host, port):
+        """Riceve i messaggi del server e li passa al ciclo di gioco."""
+        try:
+            reader, self.writer = await asyncio.open_connection(host, port)
+            set_nodelay(self.writer)
+            while True:
+                kind, payload = await protocol.read_frame(reader)
+                self.inbox.put((kind, payload, time.perf_counter()))
+        except (OSError, asyncio.IncompleteReadError):
+            self.inbox.put((None, None, time.perf_counter()))
+
+    def send(self, data):
+        """Invia un messaggio al server dal thread del gioco."""
+        if self.writer is not None and not self.closed:
+            self.loop.call_soon_threadsafe(self.writer.write, data)
+
+    def push(self, action):
+        """Invia una svolta del giocatore locale; la previsione la applica subito."""
+        self.seq += 1
+        self.pending.append((self.seq, action, time.perf_counter()))
+        self.send(protocol.encode_input(self.seq, action))
+
+    def update(self, dt):
+        """Applica i messaggi ricevuti e ricalcola lo stato previsto; restituisce False se la connessione è chiusa."""
+        self.since_tick += dt
+        while True:
+            try:
+                kind, payload, received = self.inbox.get_nowait()
+            except queue.Empty:
+                break
+            if kind is None:
+                self.closed = True
+            elif kind == protocol.HELLO:
+                self.hello = protocol.decode_hello(payload)
+                self.player = self.hello["player"]
+                self.confirmed = engine.GameState(self.hello["width"], self.hello["height"], self.hello["difficulty"],
+                                                  players=self.hello["players"], rng=random.Random(self.hello["seed"]))
+                self.values = protocol.summary(self.confirmed)
+            elif kind == protocol.TICK:
+                self.apply_tick(payload, received)
+            elif kind == protocol.KEYFRAME:
+                self.confirmed = protocol.decode_keyframe(payload)
+                self.values = protocol.summary(self.confirmed)
+                self.resyncing = False
+            elif kind == protocol.PONG:
+                sent = self.pings.pop(replay.read_varint(payload, 0)[0], None)
+                if sent is not None:
+                    self.rtt = received - sent
+        now = time.perf_counter()
+        if self.confirmed is not None and now >= self.next_ping:
+            self.next_ping = now + PING_INTERVAL
+            # Il PING porta anche l'ultimo tick confermato, con cui il server degli spettatori misura il ritardo
+            ping = bytearray()
+            replay.write_varint(ping, self.seq)
+            replay.write_varint(ping, self.confirmed.tick)
+            self.pings[self.seq] = now
+            self.send(protocol.frame(protocol.PING, ping))
+        if self.confirmed is not None:
+            # Uno spettatore (senza giocatore) non ha input da prevedere
+            self.predicted = self.confirmed if self.player is None else self.predict()
+        return not self.closed
+
+    def apply_tick(self, payload, received):
+        """Avanza lo stato confermato con le azioni del tick e controlla che coincida con il riepilogo del server."""
+        tick, symbol, ack, self.values = protocol.decode_tick(payload, self.values)
+        actions, movers = replay.decode_step(symbol, len(self.confirmed.snakes))
+        engine.step(self.confirmed, actions, movers)
+        if (self.confirmed.tick != tick or protocol.summary(self.confirmed) != self.values) and not self.resyncing:
+            self.desyncs += 1
+            self.resyncing = True
+            self.send(protocol.frame(protocol.RESYNC))
+        while self.pending and self.pending[0][0] <= ack:
+            self.input_latency.add((received - self.pending.popleft()[2]) * 1000)
+        self.since_tick = 0.0
+
+    def lead(self):
+        """Secondi di gioco da prevedere: il tempo dall'ultimo tick più metà del ritardo di andata e ritorno."""
+        return min(MAX_PREDICTION, self.since_tick + (self.rtt or 0) / 2)
+
+    def predict(self):
+        """Stato previsto: lo stato confermato avanzato delle mosse già dovute, con gli input non confermati."""
+        state = copy.deepcopy(self.confirmed)
+        if state.game_close:
+            return state
+        input_buffer = InputBuffer(direction=state.snakes[self.player].direction)
+        for _, action, _ in self.pending:
+            input_buffer.push(action, 0)
+        lead = self.lead()
+        moves = [int(lead * snake.speed) for snake in state.snakes]
+        for move in range(max(moves)):
+            movers = [move < count for count in moves]
+            actions = [input_buffer.pop(0) if player == self.player and moving else None for player, moving in enumerate(movers)]
+            engine.step(state, actions, movers)
+            if state.game_close:
+                break
+        return state
+
+    def alpha(self, player):
+        """Frazione della mossa in corso del giocatore, per interpolare il disegno come TickScheduler.alpha."""
+        speed = self.predicted.snakes[player].speed
+        return min(1.0, self.lead() * speed - int(self.lead() * speed))
+
+    def close(self):
+        """Chiude la connessione."""
+        if self.writer is not None and not self.closed:
+            self.loop.call_soon_threadsafe(self.writer.close)
+        self.closed = True
+
+
+def run_bot(host, port, bot_name, seed=0):
+    """Client senza finestra guidato da un bot di tournament.py; restituisce le statistiche della partita."""
+    import tournament
+    client = NetClient(host, port)
+    bot = None
+    last = time.perf_counter()
+    while client.update(time.perf_counter() - last):
+        last = time.perf_counter()
+        state = client.predicted
+        if state is not None and not state.game_close:
+            if bot is None:
+                bot = tournament.load_bot(bot_name)(state, client.player, random.Random(seed))
+            action = bot.decide(state)
+            sent = client.pending[-1][1] if client.pending else None
+            if action is not None and action != state.snakes[client.player].direction and action != sent:
+                client.push(action)
+        time.sleep(1 / SERVER_FPS)
+    values = protocol.summary(client.confirmed) if client.confirmed is not None else None
+    return {"player": client.player, "tick": client.confirmed.tick if client.confirmed else 0, "summary": values,
+            "desyncs": client.desyncs, "input_latency": client.input_latency.percentiles(),
+            "rtt_ms": None if client.rtt is None else round(client.rtt * 1000, 3)}
+
+
+async def selftest(bots=("greedy", "random"), seconds=10, difficulty="Extreme", seed=1):
+    """Avvia il server e due client bot in processi separati e controlla che restino sincronizzati."""
+    server = NetServer(difficulty=difficulty, seed=seed)
+    listener = await asyncio.start_server(server.handle, "127.0.0.1", 0)
+    port = listener.sockets[0].getsockname()[1]
+    processes = [await asyncio.create_subprocess_exec(sys.executable, __file__, "bot", "--port", str(port), "--bot", bot,
+                                                      "--seed", str(seed + i), stdout=subprocess.PIPE)
+                 for i, bot in enumerate(bots)]
+    tick_rate = await server.run(max_seconds=seconds)
+    listener.close()
+    reports = [json.loads((await process.communicate())[0]) for process in processes]
+    expected = protocol.summary(server.state)
+    print(f"Server: {server.state.tick} tick ({tick_rate:.1f} tick/s), partita finita: {server.state.game_close}")
+    ok = True
+    for report in reports:
+        synced = report["tick"] == server.state.tick and report["summary"] == expected
+        ok &= synced and not report["desyncs"]
+        print(f"Giocatore {report['player'] + 1}: tick {report['tick']}, sincronizzato: {synced}, desync: {report['desyncs']}, "
+              f"ritardo {report['rtt_ms']} ms, conferma input {report['input_latency']}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Snake 1 vs 1 in rete.")
+    parser.add_argument("mode", choices=["server", "bot", "selftest"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--difficulty", default="Balanced", choices=list(engine.INITIAL_SPEEDS))
+    parser.add_argument("--resolution", default="800x600", help="risoluzione del campo, es. 1024x768")
+    parser.add_argument("--bot", default="greedy", help="bot del client senza finestra (vedi tournament.py)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--seconds", type=float, default=10, help="durata massima del selftest")
+    args = parser.parse_args()
+
+    if args.mode == "bot":
+        print(json.dumps(run_bot(args.host, args.port, args.bot, args.seed or 0)))
+    elif args.mode == "selftest":
+        ok = asyncio.run(selftest(seconds=args.seconds, seed=args.seed or 1))
+        sys.exit(0 if ok else 1)
+    else:
+        width, height = (int(value) for value in args.resolution.split("x"))
+
+        async def serve():
+            server = NetServer(width, height, args.difficulty, args.seed)
+            listener = await asyncio.start_server(server.handle, args.host, args.port)
+            print(f"In attesa di due giocatori su {args.host}:{args.port}")
+            await server.run()
+            listener.close()
+            print(f"Partita finita dopo {server.state.tick} tick: " + ", ".join(
+                f"giocatore {snake.player + 1} {snake.score}" for snake in server.state.snakes))
+        asyncio.run(serve())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Profiler per frame: misura il tempo di ogni fase del ciclo di gioco e può salvarlo su file."""
+import csv
+import json
+import time
+from collections import deque
+
+PROFILE_HISTORY = 120
+
+
+class FrameProfiler:
+    """Cronometra le fasi di ogni frame con dei giri (lap) consecutivi."""
+
+    def __init__(self, phases, history=PROFILE_HISTORY, dump_path=None):
+        self.phases = list(phases)
+        self.history = deque(maxlen=history)
+        self.current = {}
+        self.frame = 0
+        self.frame_start = self.last = time.perf_counter()
+        self.dump_file = None
+        self.dump_writer = None
+        if dump_path:
+            self.open_dump(dump_path)
+
+    def open_dump(self, path):
+        """Apre il file su cui scrivere i tempi di ogni frame (CSV se termina con .csv, altrimenti JSONL)."""
+        self.dump_file = open(path, "w", newline="")
+        if path.endswith(".csv"):
+            self.dump_writer = csv.writer(self.dump_file)
+            self.dump_writer.writerow(["frame", "frame_ms"] + self.phases)
+
+    def begin_frame(self):
+        """Inizia la misura di un nuovo frame."""
+        self.current = {}
+        self.frame_start = self.last = time.perf_counter()
+
+    def lap(self, phase):
+        """Attribuisce alla fase il tempo trascorso dall'ultimo giro."""
+        now = time.perf_counter()
+        self.current[phase] = self.current.get(phase, 0.0) + (now - self.last) * 1000
+        self.last = now
+
+    def end_frame(self):
+        """Chiude il frame, lo aggiunge allo storico e lo salva su file se richiesto."""
+        frame_ms = (time.perf_counter() - self.frame_start) * 1000
+        self.history.append((frame_ms, self.current))
+        self.frame += 1
+        if self.dump_writer is not None:
+            self.dump_writer.writerow([self.frame, round(frame_ms, 3)] + [round(self.current.get(p, 0.0), 3) for p in self.phases])
+        elif self.dump_file is not None:
+            self.dump_file.write(json.dumps({"frame": self.frame, "frame_ms": round(frame_ms, 3), "phases": {p: round(ms, 3) for p, ms in self.current.items()}}) + "\n")
+        return frame_ms
+
+    def frame_times(self):
+        """Restituisce i tempi dei frame nello storico (in ms)."""
+        return [frame_ms for frame_ms, _ in self.history]
+
+    def averages(self):
+        """Restituisce il tempo medio (in ms) di ogni fase sullo storico."""
+        if not self.history:
+            return {p: 0.0 for p in self.phases}
+        return {p: sum(phases.get(p, 0.0) for _, phases in self.history) / len(self.history) for p in self.phases}
+
+    def close(self):
+        """Chiude il file dei tempi, se aperto."""
+        if self.dump_file is not None:
+            self.dump_file.close()
+            self.dump_file = self.dump_writer = None
@@ -0,0 +1,210 @@
+"""Protocollo di rete delle partite online: messaggi brevi con i campi in varint, come nei replay.
+
+Ogni messaggio è preceduto dalla sua lunghezza (varint) e inizia con un byte che ne indica il tipo:
+- HELLO (server -> client): giocatore assegnato e parametri della partita (seme, difficoltà, risoluzione);
+- INPUT (client -> server): numero progressivo dell'input e codice dell'azione (vedi replay.ACTION_CODES);
+- TICK (server -> client): tick, azioni e movimenti di tutti i giocatori (un simbolo dei replay), ultimo input
+  del destinatario già applicato e riepilogo dello stato come differenza rispetto al TICK precedente;
+- KEYFRAME (server -> client): stato completo della partita, per chi entra in ritardo o perde la sincronia;
+- RESYNC (client -> server): richiesta di un KEYFRAME;
+- PING (client -> server) e PONG (server -> client): misura del ritardo di andata e ritorno.
+
+Lo stato è deterministico dato il seme e le azioni, quindi i client lo ricalcolano da sé: il riepilogo serve
+solo a verificare che siano rimasti sincronizzati.
+"""
+import random
+import struct
+from array import array
+
+import engine
+from replay import ACTION_CODES, read_varint, write_varint
+
+HELLO, INPUT, TICK, KEYFRAME, RESYNC, PING, PONG = range(1, 8)
+FLOATS = struct.Struct("<5d")  # Punteggio, velocità, ultimo punteggio di aumento e moltiplicatori, senza arrotondamenti
+
+
+def frame(kind, payload=b""):
+    """Restituisce il messaggio pronto da inviare: lunghezza, tipo e contenuto."""
+    buffer = bytearray()
+    write_varint(buffer, len(payload) + 1)
+    buffer.append(kind)
+    buffer += payload
+    return bytes(buffer)
+
+
+async def read_frame(reader):
+    """Legge un messaggio da uno stream asyncio; restituisce (tipo, contenuto)."""
+    length = shift = 0
+    while True:
+        byte = (await reader.readexactly(1))[0]
+        length |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            break
+        shift += 7
+    data = await reader.readexactly(length)
+    return data[0], data[1:]
+
+
+def read_varints(data, count, pos=0):
+    """Legge count varint consecutivi; restituisce (valori, nuova posizione)."""
+    values = []
+    for _ in range(count):
+        value, pos = read_varint(data, pos)
+        values.append(value)
+    return values, pos
+
+
+def encode_hello(player, seed, difficulty, width, height, players=2):
+    buffer = bytearray()
+    for value in (player, seed, width, height, players):
+        write_varint(buffer, value)
+    buffer += difficulty.encode("utf-8")
+    return frame(HELLO, buffer)
+
+
+def decode_hello(payload):
+    """Restituisce il dizionario con giocatore, seme, risoluzione, giocatori e difficoltà."""
+    (player, seed, width, height, players), pos = read_varints(payload, 5)
+    return {"player": player, "seed": seed, "width": width, "height": height, "players": players,
+            "difficulty": payload[pos:].decode("utf-8")}
+
+
+def encode_input(seq, action):
+    buffer = bytearray()
+    write_varint(buffer, seq)
+    write_varint(buffer, ACTION_CODES.index(action))
+    return frame(INPUT, buffer)
+
+
+def decode_input(payload):
+    """Restituisce (numero progressivo, azione)."""
+    (seq, code), _ = read_varints(payload, 2)
+    return seq, ACTION_CODES[code]
+
+
+def cell(state, position):
+    """Indice di cella della posizione, +1 così che None (nessuna posizione) valga 0."""
+    return 0 if position is None else state.occupancy.index(*position) + 1
+
+
+def summary(state):
+    """Riepilogo dello stato come lista di interi non negativi: teste, lunghezze, punteggi, cibo e fine partita."""
+    values = []
+    for snake in state.snakes:
+        values += [state.occupancy.index(snake.x, snake.y), snake.length, round(snake.score * 10), snake.crashed]
+    special = state.special_food if state.special_food_timer > 0 else None
+    return values + [cell(state, state.food), cell(state, special), state.won, state.game_close]
+
+
+def encode_delta(buffer, previous, current):
+    """Aggiunge al buffer i soli valori cambiati: una maschera di bit seguita dai nuovi valori."""
+    mask = 0
+    for i, (old, new) in enumerate(zip(previous, current)):
+        if old != new:
+            mask |= 1 << i
+    write_varint(buffer, mask)
+    for i, value in enumerate(current):
+        if mask >> i & 1:
+            write_varint(buffer, int(value))
+
+
+def decode_delta(data, pos, previous):
+    """Applica a previous la differenza letta da data; restituisce (valori, nuova posizione)."""
+    mask, pos = read_varint(data, pos)
+    values = list(previous)
+    for i in range(len(values)):
+        if mask >> i & 1:
+            values[i], pos = read_varint(data, pos)
+    return values, pos
+
+
+def encode_tick(tick, symbol, ack, previous, current):
+    buffer = bytearray()
+    for value in (tick, symbol, ack):
+        write_varint(buffer, value)
+    encode_delta(buffer, previous, current)
+    return frame(TICK, buffer)
+
+
+def decode_tick(payload, previous):
+    """Restituisce (tick, simbolo delle azioni, ultimo input applicato, riepilogo dello stato)."""
+    (tick, symbol, ack), pos = read_varints(payload, 3)
+    values, _ = decode_delta(payload, pos, previous)
+    return tick, symbol, ack, values
+
+
+def encode_keyframe(state):
+    """Codifica lo stato completo della partita, compreso il generatore casuale."""
+    buffer = bytearray()
+    for value in (state.width, state.height, len(state.snakes), state.tick, state.game_close | state.won << 1,
+                  cell(state, state.food), cell(state, state.special_food), state.special_food_timer):
+        write_varint(buffer, value)
+    difficulty = state.difficulty.encode("utf-8")
+    write_varint(buffer, len(difficulty))
+    buffer += difficulty
+    for snake in state.snakes:
+        moving = bool(snake.x_change or snake.y_change)
+        for value in (snake.x, snake.y, snake.prev_x, snake.prev_y, ACTION_CODES.index(snake.direction), moving,
+                      snake.length, snake.crashed, len(snake.body)):
+            write_varint(buffer, value)
+        buffer += FLOATS.pack(snake.score, snake.speed, snake.last_updated_score, snake.food_points_multiplier,
+                              snake.special_food_points_multiplier)
+        for body_cell in snake.body.indices():
+            write_varint(buffer, body_cell)
+    # L'ordine delle celle libere decide dove compare il cibo a parità di generatore casuale
+    free = state.occupancy.free.cells
+    write_varint(buffer, len(free))
+    for free_cell in free:
+        write_varint(buffer, free_cell)
+    version, internal, gauss = state.rng.getstate()
+    write_varint(buffer, version)
+    write_varint(buffer, len(internal))
+    for value in internal:
+        write_varint(buffer, value)
+    buffer.append(gauss is not None)
+    if gauss is not None:
+        buffer += struct.pack("<d", gauss)
+    return frame(KEYFRAME, buffer)
+
+
+def decode_keyframe(payload):
+    """Ricostruisce un engine.GameState da un keyframe."""
+    (width, height, players, tick, flags, food, special_food, special_food_timer, size), pos = read_varints(payload, 9)
+    difficulty = payload[pos:pos + size].decode("utf-8")
+    pos += size
+    state = engine.GameState(width, height, difficulty, players=players, rng=random.Random())
+    occupancy = state.occupancy = engine.Occupancy(width, height, players)
+    cols, cells = occupancy.cols, occupancy.cols * occupancy.rows
+    state.snakes = []
+    for player in range(players):
+        (x, y, prev_x, prev_y, direction, moving, length, crashed, count), pos = read_varints(payload, 9, pos)
+        snake = engine.Snake(player, x, y, 0, cols, cells)
+        snake.prev_x, snake.prev_y = prev_x, prev_y
+        snake.direction = ACTION_CODES[direction]
+        if moving:
+            snake.x_change, snake.y_change = engine.DIRECTIONS[snake.direction]
+        snake.length, snake.crashed = length, bool(crashed)
+        (snake.score, snake.speed, snake.last_updated_score, snake.food_points_multiplier,
+         snake.special_food_points_multiplier) = FLOATS.unpack_from(payload, pos)
+        pos += FLOATS.size
+        body, pos = read_varints(payload, count, pos)
+        for body_cell in body:
+            snake.body.push(body_cell)
+            occupancy.add(player, body_cell)
+        state.snakes.append(snake)
+    (size,), pos = read_varints(payload, 1, pos)
+    free, pos = read_varints(payload, size, pos)
+    occupancy.free.cells = array("i", free)
+    occupancy.free.position = array("i", [-1]) * len(occupancy.total)
+    for free_pos, free_cell in enumerate(free):
+        occupancy.free.position[free_cell] = free_pos
+    (version, size), pos = read_varints(payload, 2, pos)
+    internal, pos = read_varints(payload, size, pos)
+    gauss = struct.unpack_from("<d", payload, pos + 1)[0] if payload[pos] else None
+    state.rng.setstate((version, tuple(internal), gauss))
+    state.tick = tick
+    state.game_close, state.won = bool(flags & 1), bool(flags & 2)
+    state.food = None if not food else occupancy.position(food - 1)
+    state.special_food = None if not special_food else occupancy.position(special_food - 1)
+    state.special_food_timer = special_food_timer
+    return state
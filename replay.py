@@ -0,0 +1,205 @@
+"""Registrazione e riproduzione deterministica delle partite.
+
+Un replay contiene il seme del generatore casuale, la difficoltà, la risoluzione e, per ogni tick,
+le azioni dei giocatori codificate in pochi bit e compresse con run-length su varint.
+
+Uso da riga di comando (riproduzione headless alla massima velocità):
+    python replay.py replays/<partita>.snkr
+"""
+import random
+import sys
+import time
+
+import engine
+
+MAGIC = b"SNKR"
+VERSION = 2  # La versione 2 controlla le collisioni tra serpenti in modo simmetrico (teste contro corpi e teste)
+REPLAY_EXTENSION = ".snkr"
+
+# Codici delle azioni: l'indice nella lista è il codice salvato nel file
+ACTION_CODES = [None, "LEFT", "RIGHT", "UP", "DOWN", engine.STOP]
+PLAYER_STATES = 2 * len(ACTION_CODES)  # azione x (si muove / resta fermo)
+
+
+def write_varint(buffer, value):
+    """Aggiunge al buffer un intero non negativo in formato varint (7 bit per byte)."""
+    while value >= 0x80:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def read_varint(data, pos):
+    """Legge un varint da data a partire da pos; restituisce (valore, nuova posizione)."""
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def encode_step(actions, movers):
+    """Codifica le azioni e i movimenti di tutti i giocatori in un unico simbolo."""
+    symbol = 0
+    for player in reversed(range(len(movers))):
+        code = ACTION_CODES.index(actions[player]) * 2 + (1 if movers[player] else 0)
+        symbol = symbol * PLAYER_STATES + code
+    return symbol
+
+
+def decode_step(symbol, players):
+    """Decodifica un simbolo nelle azioni e nei movimenti dei giocatori."""
+    actions, movers = [], []
+    for _ in range(players):
+        symbol, code = divmod(symbol, PLAYER_STATES)
+        actions.append(ACTION_CODES[code // 2])
+        movers.append(bool(code % 2))
+    return actions, movers
+
+
+class Replay:
+    """Intestazione della partita e sequenza compressa di simboli (simbolo, ripetizioni)."""
+
+    def __init__(self, seed, difficulty, width, height, players, runs=None):
+        self.seed = seed
+        self.difficulty = difficulty
+        self.width, self.height = width, height
+        self.players = players
+        self.runs = runs if runs is not None else []
+
+    @property
+    def effect_base(self):
+        """Primo simbolo riservato agli effetti speciali (dopo tutti i simboli dei tick)."""
+        return PLAYER_STATES ** self.players
+
+    def new_state(self):
+        """Crea lo stato iniziale della partita, identico a quello registrato."""
+        return engine.GameState(self.width, self.height, self.difficulty, players=self.players, rng=random.Random(self.seed))
+
+    def events(self):
+        """Restituisce gli eventi in ordine: ("step", azioni, movimenti) oppure ("effect", giocatore, effetto)."""
+        for symbol, run in self.runs:
+            if symbol >= self.effect_base:
+                player, effect = divmod(symbol - self.effect_base, len(engine.EFFECTS))
+                for _ in range(run):
+                    yield "effect", player, effect
+            else:
+                actions, movers = decode_step(symbol, self.players)
+                for _ in range(run):
+                    yield "step", actions, movers
+
+    def to_bytes(self):
+        """Serializza il replay nel formato binario."""
+        buffer = bytearray(MAGIC)
+        buffer.append(VERSION)
+        write_varint(buffer, self.seed)
+        difficulty = self.difficulty.encode("utf-8")
+        write_varint(buffer, len(difficulty))
+        buffer += difficulty
+        for value in (self.width, self.height, self.players):
+            write_varint(buffer, value)
+        for symbol, run in self.runs:
+            write_varint(buffer, symbol)
+            write_varint(buffer, run)
+        return bytes(buffer)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Ricostruisce un replay dal formato binario."""
+        if data[:4] != MAGIC or data[4] not in (1, VERSION):
+            raise ValueError("File di replay non valido")
+        pos = 5
+        seed, pos = read_varint(data, pos)
+        size, pos = read_varint(data, pos)
+        difficulty = data[pos:pos + size].decode("utf-8")
+        pos += size
+        width, pos = read_varint(data, pos)
+        height, pos = read_varint(data, pos)
+        players, pos = read_varint(data, pos)
+        if data[4] == 1 and players > 1:
+            # Le regole a un giocatore non sono cambiate, quelle tra più serpenti sì
+            raise ValueError("Replay a più giocatori registrato con le vecchie regole delle collisioni")
+        runs = []
+        while pos < len(data):
+            symbol, pos = read_varint(data, pos)
+            run, pos = read_varint(data, pos)
+            runs.append((symbol, run))
+        return cls(seed, difficulty, width, height, players, runs)
+
+
+class ReplayRecorder:
+    """Registra una partita tick per tick, accorpando i simboli ripetuti."""
+
+    def __init__(self, seed, difficulty, width, height, players=1):
+        self.replay = Replay(seed, difficulty, width, height, players)
+        self.symbol = None
+        self.run = 0
+
+    def add(self, symbol):
+        """Aggiunge un simbolo, allungando la ripetizione corrente se è uguale al precedente."""
+        if symbol == self.symbol:
+            self.run += 1
+            return
+        if self.run:
+            self.replay.runs.append((self.symbol, self.run))
+        self.symbol, self.run = symbol, 1
+
+    def record_step(self, actions, movers):
+        """Registra un tick di simulazione."""
+        self.add(encode_step(actions, movers))
+
+    def record_effect(self, player, effect):
+        """Registra l'effetto speciale scelto da un giocatore (indice in engine.EFFECTS)."""
+        self.add(self.replay.effect_base + player * len(engine.EFFECTS) + effect)
+
+    def finish(self):
+        """Chiude la ripetizione in corso e restituisce il replay completo."""
+        if self.run:
+            self.replay.runs.append((self.symbol, self.run))
+            self.symbol, self.run = None, 0
+        return self.replay
+
+    def save(self, path):
+        """Salva il replay su file."""
+        with open(path, "wb") as file:
+            file.write(self.finish().to_bytes())
+
+
+def load(path):
+    """Legge un replay da file."""
+    with open(path, "rb") as file:
+        return Replay.from_bytes(file.read())
+
+
+def apply_event(state, event):
+    """Applica allo stato un evento del replay."""
+    kind, first, second = event
+    if kind == "step":
+        engine.step(state, first, second)
+    else:
+        engine.EFFECTS[second](state, state.snakes[first])
+
+
+def simulate(replay):
+    """Riproduce il replay senza grafica alla massima velocità e restituisce lo stato finale."""
+    state = replay.new_state()
+    for event in replay.events():
+        apply_event(state, event)
+    return state
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print(__doc__)
+        sys.exit(1)
+    replay = load(sys.argv[1])
+    start = time.perf_counter()
+    state = simulate(replay)
+    elapsed = time.perf_counter() - start
+    print(f"Difficoltà: {replay.difficulty}, risoluzione: {replay.width}x{replay.height}, seme: {replay.seed}")
+    for player, snake in enumerate(state.snakes, start=1):
+        print(f"Giocatore {player}: punteggio {snake.score}, lunghezza {snake.length}, schiantato: {snake.crashed}")
+    print(f"{state.tick} tick riprodotti in {elapsed * 1000:.1f} ms ({state.tick / max(elapsed, 1e-9):,.0f} tick/s)")
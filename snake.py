@@ -1,11 +1,23 @@
-import pygame
 import time
+START_TIME = time.perf_counter()  # Per misurare il tempo fino al primo frame del menu (--startup-time)
+import pygame
 import random
 import os
 import json
 import math
 import uuid
-pygame.init()
+import argparse
+import copy
+import threading
+from collections import OrderedDict
+from functools import partial
+import engine
+from inputs import InputBuffer, LatencyStats
+from profiler import FrameProfiler
+import replay
+import ai
+import battle
+from engine import BLOCK_SIZE, SCOREBOARD_HEIGHT
 
 # Definizione dei colori utilizzati nel gioco
 WHITE = (255, 255, 255)
@@ -23,67 +35,143 @@ ORANGE = (243, 112, 33)
 # Dimensioni della finestra di gioco
 WIDTH, HEIGHT = 800, 600
 GAME_HEIGHT = HEIGHT 
-SCOREBOARD_HEIGHT = 50 
 
-# Creazione della finestra di gioco
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("Snake Game")
-clock = pygame.time.Clock()
+# Finestra di gioco, creata da init_display() all'avvio di main()
+screen = None
+clock = None
 
 # Variabili utili al gioco
-BLOCK_SIZE = 20
 SPEED, SPEED1, SPEED2 = 10, 10, 10
-global_records = 0
+global_records = None  # Letti dal file alla prima richiesta (vedi get_records)
 last_score = 0
 CURRENT_DIFFICULTY = "Balanced"
 Length_of_snake = 1
 current_game_id = None
-last_input_time = 0
-input_delay = 10
+input_latency = LatencyStats()
 game_mode = "single"
-
-# Font utilizzati nel gioco
-font_style = pygame.font.SysFont("bahnschrift", 30)
-font_style_small = pygame.font.SysFont('Arial', 15)
-title_font = pygame.font.SysFont("bahnschrift", 55)
+game_state = None
+RECORDS_FILE = "record.txt"
+REPLAYS_DIR = "replays"
+replay_recorder = None
+spectators = None  # Server degli spettatori (spectator.SpectatorServer) se la partita viene trasmessa
+background_surface = None
+text_cache = OrderedDict()
+TEXT_CACHE_SIZE = 256
+snake_sprites = {}
+DIRTY_RENDERING = True  # Aggiorna solo le aree dello schermo cambiate durante la partita
+MAX_DIRTY_RECTS = 512
+ARENA_CELLS = (1000, 1000)  # Colonne e righe del campo della modalità Arena, indipendente dalla finestra
+CHUNK_CELLS = 16  # Lato in celle dei blocchi di sfondo della modalità Arena
+CHUNK_CACHE_SIZE = 32
+BATTLE_CELLS = (120, 90)  # Colonne e righe del campo della modalità Battle
+BATTLE_BOTS = 15  # Serpenti guidati dal computer nella modalità Battle
+# Colori dei serpenti oltre il secondo (modalità Battle), ripetuti ciclicamente
+BATTLE_COLORS = [(0, 128, 255), (255, 200, 0), (200, 0, 255), (0, 230, 230), (255, 120, 0), (255, 0, 150), (150, 255, 0), (255, 255, 255)]
+chunk_cache = OrderedDict()
+RENDER_FPS = 60  # Frequenza di disegno e di lettura dell'input, indipendente dalla velocità del serpente
+MAX_FRAME_TIME = 0.1  # Secondi massimi simulati per frame (evita raffiche di mosse dopo una pausa)
+PROFILE_PHASES = ["input", "ai", "update", "records", "background", "food", "snake", "score_bar", "hud", "display"]
+frame_profiler = FrameProfiler(PROFILE_PHASES, dump_path=os.environ.get("SNAKE_PROFILE"))  # es. SNAKE_PROFILE=frames.csv
+show_profiler = False  # Pannello delle prestazioni, si attiva con F3
+startup_probe = False  # Con --startup-time stampa il tempo fino al primo frame del menu ed esce
+
+# Font utilizzati nel gioco, creati da init_display(). Se esiste FONT_FILE (o il file indicato da SNAKE_FONT) si usa
+# quello per tutti i testi e si evita la ricerca tra i font di sistema, spesso la parte più lenta dell'avvio
+FONT_FILE = os.environ.get("SNAKE_FONT") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "fonts", "snake.ttf")
+font_cache = {}
+font_style = font_style_small = title_font = large_font_style = large_font_style_small = None
+
+def get_font(name, size):
+    """Restituisce il font richiesto, creandolo una sola volta."""
+    key = (name, size)
+    font = font_cache.get(key)
+    if font is None:
+        if os.path.isfile(FONT_FILE):
+            font = pygame.font.Font(FONT_FILE, size)
+        else:
+            font = pygame.font.SysFont(name, size)
+        font_cache[key] = font
+    return font
+
+def init_display():
+    """Inizializza pygame, apre la finestra di gioco e prepara i font."""
+    global screen, clock, font_style, font_style_small, title_font, large_font_style, large_font_style_small
+    pygame.init()
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    pygame.display.set_caption("Snake Game")
+    clock = pygame.time.Clock()
+    font_style = get_font("bahnschrift", 30)
+    font_style_small = get_font("Arial", 15)
+    title_font = get_font("bahnschrift", 55)
+    large_font_style = get_font("Arial", 40)
+    large_font_style_small = get_font("Arial", 30)
 
 # Funzioni di disegno
-def draw_background():
-    """Disegna lo sfondo del gioco con un gradiente di grigio."""
-    for y in range(HEIGHT):
+def render_background(width, height):
+    """Crea una superficie con lo sfondo del gioco: un gradiente di grigio."""
+    surface = pygame.Surface((width, height)).convert()
+    for y in range(height):
         color = tuple(
-            DARK_GREY[i] + (GREY[i] - DARK_GREY[i]) * y // HEIGHT for i in range(3)
+            DARK_GREY[i] + (GREY[i] - DARK_GREY[i]) * y // height for i in range(3)
         )
-        pygame.draw.line(screen, color, (0, y), (WIDTH, y))
+        pygame.draw.line(surface, color, (0, y), (width, y))
+    return surface
 
-def draw_text_with_options(text, font, x, y, text_color, outline_color=None, bg_color=None, border_radius=0):
-    """Disegna il testo con opzioni per contorno e sfondo."""
-    text_surface = font.render(text, True, text_color)
-    text_width, text_height = text_surface.get_size()
-    
+def draw_background():
+    """Disegna lo sfondo del gioco, rigenerandolo solo quando cambia la risoluzione."""
+    global background_surface
+    if background_surface is None or background_surface.get_size() != (WIDTH, HEIGHT):
+        background_surface = render_background(WIDTH, HEIGHT)
+    screen.blit(background_surface, (0, 0))
+
+def render_text(text, font, text_color, outline_color=None):
+    """Restituisce la superficie del testo già composta con il contorno, usando una cache LRU."""
+    key = (text, font, text_color, outline_color)
+    surface = text_cache.get(key)
+    if surface is not None:
+        text_cache.move_to_end(key)
+        return surface
+
+    surface = font.render(text, True, text_color)
     if outline_color:
+        text_surface = surface
+        outline_surface = font.render(text, True, outline_color)
+        surface = pygame.Surface((text_surface.get_width() + 4, text_surface.get_height() + 4), pygame.SRCALPHA)
         for dx, dy in [(-2, 0), (2, 0), (0, -2), (0, 2), (-2, -2), (-2, 2), (2, -2), (2, 2)]:
-            outline_surface = font.render(text, True, outline_color)
-            screen.blit(outline_surface, (x + dx, y + dy))
-    
+            surface.blit(outline_surface, (2 + dx, 2 + dy))
+        surface.blit(text_surface, (2, 2))
+
+    text_cache[key] = surface
+    if len(text_cache) > TEXT_CACHE_SIZE:
+        text_cache.popitem(last=False)
+    return surface
+
+def draw_text_with_options(text, font, x, y, text_color, outline_color=None, bg_color=None, border_radius=0):
+    """Disegna il testo con opzioni per contorno e sfondo."""
     if bg_color:
+        # Lo sfondo copre il contorno, quindi basta il testo semplice
+        text_width, text_height = font.size(text)
         pygame.draw.rect(screen, bg_color, [x - 15, y - 7.5, text_width + 30, text_height + 15], border_radius=border_radius)
         pygame.draw.rect(screen, BLACK, [x - 15, y - 7.5, text_width + 30, text_height + 15], border_radius=border_radius, width=3)
-    
-    screen.blit(text_surface, (x, y))
+        screen.blit(render_text(text, font, text_color), (x, y))
+    elif outline_color:
+        screen.blit(render_text(text, font, text_color, outline_color), (x - 2, y - 2))
+    else:
+        screen.blit(render_text(text, font, text_color), (x, y))
 
 def draw_menu(title, options, selected_option, score=None, high_score=None, resolutions=None, is_fullscreen=None, all_high_scores=None):
     """Disegna un menu con il titolo e le opzioni fornite, evidenziando l'opzione selezionata."""
+    game_renderer.invalidate()
     if title != "Choice a New Ability":
         draw_background()
     option_offset = 0
 
-    if title in ["Pause Menu", "Game Over"] and score is not None and high_score is not None:
+    if title in ["Pause Menu", "Game Over", "You Win"] and score is not None and high_score is not None:
         #draw_score_bar(score, high_score, CURRENT_DIFFICULTY)
         draw_score_bar(score, None, SPEED, None, Length_of_snake, None, high_score, CURRENT_DIFFICULTY)
 
 
-    title_x = (WIDTH - title_font.render(title, True, GREEN).get_width()) // 2
+    title_x = (WIDTH - title_font.size(title)[0]) // 2
     title_y = HEIGHT // 5
     border_radius_value = 100
     draw_text_with_options(title, title_font, title_x, title_y, WHITE, BLACK, DARK_GREY, border_radius=border_radius_value)
@@ -97,9 +185,9 @@ def draw_menu(title, options, selected_option, score=None, high_score=None, reso
         else:
             current_index = resolutions.index(current_resolution) if current_resolution in resolutions else 4
 
-    elif title == "Game Over":
+    elif title in ["Game Over", "You Win"]:
         score_text = f"Your Score: {score}"
-        score_width = font_style.render(score_text, True, GREEN).get_width()
+        score_width = font_style.size(score_text)[0]
         draw_text_with_options(
             score_text,
             font_style,
@@ -110,7 +198,7 @@ def draw_menu(title, options, selected_option, score=None, high_score=None, reso
         )
         
         high_score_text = f"High Score: {high_score}"
-        high_score_width = font_style.render(high_score_text, True, GREEN).get_width()
+        high_score_width = font_style.size(high_score_text)[0]
         draw_text_with_options(
             high_score_text,
             font_style,
@@ -126,8 +214,6 @@ def draw_menu(title, options, selected_option, score=None, high_score=None, reso
         start_x = (WIDTH - (3 * column_width)) // 2
         y_start = HEIGHT // 3
         record_color = (255, 255, 255)
-        large_font_style = pygame.font.SysFont('Arial', 40)
-        large_font_style_small = pygame.font.SysFont('Arial', 30) 
         for idx, (mode, scores) in enumerate(all_high_scores.items()):
             column_x = start_x + idx * column_width
             mode_title_text = f"{mode}"
@@ -152,38 +238,35 @@ def draw_menu(title, options, selected_option, score=None, high_score=None, reso
 
     for i, option in enumerate(options):
         color = WHITE if i != selected_option else BLACK
-        option_text = font_style.render(option, True, color)
-        option_x = WIDTH // 2 - option_text.get_width() // 2
+        option_width, option_height = font_style.size(option)
+        option_x = WIDTH // 2 - option_width // 2
         if title == "Choice a New Ability":
             option_offset = 50
         option_y = HEIGHT // 3 + i * 50 + option_offset
 
         if title == "Choice a New Ability":
             pygame.draw.rect(screen, BLACK, 
-                 [option_x - 8, option_y - 8, option_text.get_width() + 16, option_text.get_height() + 16], 
+                 [option_x - 8, option_y - 8, option_width + 16, option_height + 16], 
                  border_radius=100)
-        for dx, dy in [(-2, 0), (2, 0), (0, -2), (0, 2), (-2, -2), (-2, 2), (2, -2), (2, 2)]:
-            outline_text = font_style.render(option, True, BLACK)
-            screen.blit(outline_text, (option_x + dx, option_y + dy))
-        screen.blit(option_text, (option_x, option_y))
 
         if i == selected_option:
             border_color = BLACK
             bg_color = WHITE
             pygame.draw.rect(screen, border_color, 
-                             [option_x - 8, option_y - 8, option_text.get_width() + 16, option_text.get_height() + 16],
+                             [option_x - 8, option_y - 8, option_width + 16, option_height + 16],
                              border_radius=20)
             pygame.draw.rect(screen, bg_color, 
-                             [option_x - 5, option_y - 5, option_text.get_width() + 10, option_text.get_height() + 10],
+                             [option_x - 5, option_y - 5, option_width + 10, option_height + 10],
                              border_radius=15)
-
-        screen.blit(option_text, (option_x, option_y))
+            screen.blit(render_text(option, font_style, color), (option_x, option_y))
+        else:
+            screen.blit(render_text(option, font_style, color, BLACK), (option_x - 2, option_y - 2))
 
         if title == "Change Mode":
             if CURRENT_DIFFICULTY == option:
                 indicator_radius = 6
                 indicator_x = option_x - 30
-                indicator_y = option_y + option_text.get_height() // 2 
+                indicator_y = option_y + option_height // 2 
                 pygame.draw.circle(screen, BLACK, (indicator_x, indicator_y), indicator_radius + 3)
                 pygame.draw.circle(screen, GREEN, (indicator_x, indicator_y), indicator_radius)
 
@@ -191,7 +274,7 @@ def draw_menu(title, options, selected_option, score=None, high_score=None, reso
             if i == current_index:
                 indicator_radius = 6
                 indicator_x = option_x - 30
-                indicator_y = option_y + option_text.get_height() // 2
+                indicator_y = option_y + option_height // 2
                 pygame.draw.circle(screen, BLACK, (indicator_x, indicator_y), indicator_radius + 3)
                 pygame.draw.circle(screen, GREEN, (indicator_x, indicator_y), indicator_radius)
 
@@ -199,7 +282,7 @@ def draw_menu(title, options, selected_option, score=None, high_score=None, reso
 def draw_score_bar(score1, score2, SPEED1, SPEED2, Length_of_snake1, Length_of_snake2, high_score, current_difficulty):
     """Disegna la barra del punteggio in alto nella finestra di gioco."""
     bar_height = 60
-    pygame.draw.rect(screen, (50, 50, 50), [0, 0, WIDTH, bar_height])
+    bar_rect = pygame.draw.rect(screen, (50, 50, 50), [0, 0, WIDTH, bar_height])
     
     draw_text_with_options(f"Score: {score1:.1f}", font_style, 15, 15, (255, 255, 255), (0, 0, 0))
     if score2 == None:
@@ -242,151 +325,168 @@ def draw_score_bar(score1, score2, SPEED1, SPEED2, Length_of_snake1, Length_of_s
             length2_text = f"Length: {Length_of_snake2}"
             length2_x = speed2_x + font_style_small.size(speed2_text)[0] + 20
             draw_text_with_options(length2_text, font_style_small, length2_x, speed2_y, (255, 255, 255), (0, 0, 0))
+    return bar_rect
+
+def segment_color(player, i):
+    """Restituisce il colore del segmento i-esimo (dalla coda) del serpente del giocatore."""
+    shade = max(0, 255 - i * 5)
+    if player > 2:
+        return tuple(value * shade // 255 for value in BATTLE_COLORS[(player - 3) % len(BATTLE_COLORS)])
+    return (shade, 0, 0) if player == 2 else (0, shade, 0)
+
+def get_snake_sprites(block_size, player):
+    """Restituisce gli sprite dei segmenti del giocatore, generandoli alla prima richiesta."""
+    key = (block_size, player)
+    sprites = snake_sprites.get(key)
+    if sprites is None:
+        sprites = []
+        # Oltre il 51° segmento il colore del gradiente resta costante
+        for i in range(52):
+            sprite = pygame.Surface((block_size + 4, block_size + 4), pygame.SRCALPHA)
+            pygame.draw.rect(sprite, (0, 0, 0), [0, 0, block_size + 4, block_size + 4], border_radius=5)
+            pygame.draw.rect(sprite, segment_color(player, i), [2, 2, block_size, block_size], border_radius=5)
+            sprites.append(sprite)
+        snake_sprites[key] = sprites
+    return sprites
+
+def our_snake(block_size, snake_list, player, return_rects=False):
+    """Disegna il serpente sullo schermo con un'unica chiamata di blit (restituisce le aree se richiesto)."""
+    sprites = get_snake_sprites(block_size, player)
+    last = len(sprites) - 1
+    return screen.blits([(sprites[min(i, last)], (x[0] - 2, x[1] - 2)) for i, x in enumerate(snake_list)], return_rects)
+
+class DirtyRenderer:
+    """Tiene traccia delle aree dello schermo cambiate a ogni frame e aggiorna solo quelle."""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.previous = []
+        self.current = []
+        self.full_redraw = True
+        self.size = None
+
+    def invalidate(self):
+        """Forza un ridisegno completo al prossimo frame (es. dopo un menu)."""
+        self.full_redraw = True
+
+    def begin(self, camera=None):
+        """Ripristina lo sfondo dove si era disegnato al frame precedente (tutto, se la vista segue una telecamera)."""
+        if screen.get_size() != self.size:
+            self.size = screen.get_size()
+            self.full_redraw = True
+        if camera is not None:
+            # La vista si sposta a ogni frame: si ridisegnano i blocchi di sfondo visibili e si aggiorna tutta la finestra
+            draw_arena_background(camera)
+            self.full_redraw = True
+        elif self.full_redraw or not self.enabled:
+            draw_background()
+        else:
+            for rect in self.previous:
+                screen.blit(background_surface, rect, rect)
+        self.current = []
+
+    def mark(self, rects):
+        """Registra le aree disegnate nel frame corrente."""
+        self.current.extend(rects)
+
+    def end(self):
+        """Aggiorna lo schermo: solo le aree cambiate, oppure tutto se necessario."""
+        dirty = self.previous + self.current
+        if self.full_redraw or not self.enabled or len(dirty) > MAX_DIRTY_RECTS:
+            pygame.display.update()
+        else:
+            pygame.display.update(dirty)
+        self.previous = self.current
+        self.full_redraw = False
 
-def our_snake(block_size, snake_list, player):
-    """Disegna il serpente sullo schermo."""
-    if player == 2:
-        for i, x in enumerate(snake_list):
-            color = ( max(0, 255 - i * 5), 0, 0)
-            pygame.draw.rect(screen, (0, 0, 0), [x[0] - 2, x[1] - 2, block_size + 4, block_size + 4], border_radius=5)
-            pygame.draw.rect(screen, color, [x[0], x[1], block_size, block_size], border_radius=5)
-    else:    
-        for i, x in enumerate(snake_list):
-            color = (0, max(0, 255 - i * 5), 0)
-            pygame.draw.rect(screen, (0, 0, 0), [x[0] - 2, x[1] - 2, block_size + 4, block_size + 4], border_radius=5)
-            pygame.draw.rect(screen, color, [x[0], x[1], block_size, block_size], border_radius=5)
+game_renderer = DirtyRenderer(DIRTY_RENDERING)
 
 #Funzioni di Gioco
-def generate_food(snake_List):
-    """Genera una posizione casuale per il cibo che non collida con il serpente."""
-    while True:
-        food_x = round(random.randrange(0, WIDTH - BLOCK_SIZE) / BLOCK_SIZE) * BLOCK_SIZE
-        food_y = round(random.randrange(SCOREBOARD_HEIGHT, HEIGHT - BLOCK_SIZE) / BLOCK_SIZE) * BLOCK_SIZE
-        if is_valid_food_position(food_x, food_y, snake_List): 
-            return food_x, food_y
-
-def is_valid_food_position(x, y, snake_list):
-    """Controlla se la posizione del cibo è valida (non collida con il serpente)."""
-    for segment in snake_list:
-        if segment == [x, y]:
-            return False
-    return True
-
-def update_speed(score, CURRENT_DIFFICULTY, current_speed, last_updated_score):
-    """Aggiorna la velocità del gioco in base al punteggio e alla difficoltà corrente."""
-    if CURRENT_DIFFICULTY == "Relaxed":
-        speed_increment = 0.5
-        threshold = 10
-    elif CURRENT_DIFFICULTY == "Balanced":
-        speed_increment = 0.5
-        threshold = 5
-    elif CURRENT_DIFFICULTY == "Extreme":
-        speed_increment = 1
-        threshold = 5
-    else:
-        speed_increment = 0.05
-        threshold = 10
-    if score // threshold > last_updated_score // threshold:
-        last_updated_score = score
-        return current_speed + speed_increment, last_updated_score
-    return current_speed, last_updated_score
-
 def check_for_special_effect_activation(score,foodx,foody, player):
-    """Controlla se attivare il menu degli effetti speciali in base al punteggio."""
+    """Controlla se attivare il menu degli effetti speciali in base al punteggio.
+
+    Restituisce RESUME per continuare la partita oppure None se il giocatore ha chiuso la finestra dal menu.
+    """
     global last_score1, last_score2
     if player == 1 and score > last_score1 + 5:
         if CURRENT_DIFFICULTY == "Relaxed":
             remainder = math.floor(score) % 15
             if remainder in {0, 1, 2, 3, 4}:
                 last_score1 = score - remainder
-                show_special_effect_menu(score,foodx,foody, mode_high_score)
+                return show_special_effect_menu(score,foodx,foody, mode_high_score)
         elif CURRENT_DIFFICULTY == "Balanced":
             remainder = math.floor(score) % 30
             if remainder in {0, 1, 2, 3, 4}:
                 last_score1 = score - remainder
-                show_special_effect_menu(score,foodx,foody, mode_high_score)
+                return show_special_effect_menu(score,foodx,foody, mode_high_score)
         elif CURRENT_DIFFICULTY == "Extreme":
             remainder = math.floor(score) % 60
             if remainder in {0, 1, 2, 3, 4}:
                 last_score1 = score - remainder
-                show_special_effect_menu(score,foodx,foody, mode_high_score)
+                return show_special_effect_menu(score,foodx,foody, mode_high_score)
     if player == 2 and score > last_score2 + 5:
         if CURRENT_DIFFICULTY == "Relaxed":
             remainder = math.floor(score) % 15
             if remainder in {0, 1, 2, 3, 4}:
                 last_score2 = score - remainder
-                show_special_effect_menu(score,foodx,foody, mode_high_score)
+                return show_special_effect_menu(score,foodx,foody, mode_high_score)
         elif CURRENT_DIFFICULTY == "Balanced":
             remainder = math.floor(score) % 30
             if remainder in {0, 1, 2, 3, 4}:
                 last_score2 = score - remainder
-                show_special_effect_menu(score,foodx,foody, mode_high_score)
+                return show_special_effect_menu(score,foodx,foody, mode_high_score)
         elif CURRENT_DIFFICULTY == "Extreme":
             remainder = math.floor(score) % 60
             if remainder in {0, 1, 2, 3, 4}:
                 last_score2 = score - remainder
-                show_special_effect_menu(score,foodx,foody, mode_high_score)
-
-def snake_input(event, direction, x1_change, y1_change,score, mode_high_score,player=None,game_mode=None):
-    """Gestisce l'input dell'utente per il movimento del serpente."""
-    global last_input_time
-    current_time = pygame.time.get_ticks()
-
-    if current_time - last_input_time < input_delay:
-        return direction, x1_change, y1_change
+                return show_special_effect_menu(score,foodx,foody, mode_high_score)
+    return RESUME
 
+def snake_input(event, input_buffer):
+    """Gestisce l'input dell'utente e accoda la nuova direzione del serpente con il suo timestamp."""
+    new_direction = None
     if event.type == pygame.KEYDOWN:
-        last_input_time = current_time
         if event.key == pygame.K_LEFT or event.key == pygame.K_a:
-            if direction != "RIGHT":
-                x1_change = -BLOCK_SIZE
-                y1_change = 0
-                direction = "LEFT"
+            new_direction = "LEFT"
         elif event.key == pygame.K_RIGHT or event.key == pygame.K_d:
-            if direction != "LEFT":
-                x1_change = BLOCK_SIZE
-                y1_change = 0
-                direction = "RIGHT"
+            new_direction = "RIGHT"
         elif event.key == pygame.K_UP or event.key == pygame.K_w:
-            if direction != "DOWN":
-                y1_change = -BLOCK_SIZE
-                x1_change = 0
-                direction = "UP"
+            new_direction = "UP"
         elif event.key == pygame.K_DOWN or event.key == pygame.K_s:
-            if direction != "UP":
-                y1_change = BLOCK_SIZE
-                x1_change = 0
-                direction = "DOWN"
-        elif event.key == pygame.K_ESCAPE:
-            pauseMenu(score, mode_high_score,game_mode)
-    return direction, x1_change, y1_change
+            new_direction = "DOWN"
+    if new_direction:
+        return input_buffer.push(new_direction, pygame.time.get_ticks())
+    return False
+
+def opposite_keys_pressed(keys):
+    """Controlla se sono premuti due tasti opposti (il serpente si ferma)."""
+    if (keys[pygame.K_LEFT] or keys[pygame.K_a]) and (keys[pygame.K_RIGHT] or keys[pygame.K_d]):
+        return True
+    return (keys[pygame.K_UP] or keys[pygame.K_w]) and (keys[pygame.K_DOWN] or keys[pygame.K_s])
 
 # Funzioni per gli effetti speciali
 def decrease_speed():
     """Diminuisce la velocità del gioco di 5."""
     global SPEED
-    SPEED = max(1, SPEED - 5)  # Assicurati che la velocità non scenda sotto 1
+    engine.decrease_speed(game_state, game_state.snakes[0])
+    SPEED = game_state.snakes[0].speed
     print("Velocità diminuita di 5.")
 
 def increase_food_points():
     """Il cibo normale fornisce il 20% di punti in più."""
-    global food_points_multiplier
-    food_points_multiplier += 0.20  # Moltiplicatore per il punteggio del cibo normale
+    engine.increase_food_points(game_state, game_state.snakes[0])
     print("Il cibo normale fornisce il 20% di punti in più.")
 
 def decrease_length():
     """Dimezza la lunghezza del serpente e aggiorna la lista del serpente visivamente."""
-    global Length_of_snake, snake_List  # Dichiarare Length_of_snake e snake_List come globali
-    Length_of_snake = max(1, math.ceil(Length_of_snake / 2))  # Assicurati che la lunghezza non scenda sotto 1
-    # Rimuovi gli ultimi segmenti dalla lista del serpente
-    while len(snake_List) > Length_of_snake:
-        snake_List.pop(0)  # Rimuove l'ultimo segmento
+    global Length_of_snake
+    engine.decrease_length(game_state, game_state.snakes[0])
+    Length_of_snake = game_state.snakes[0].length
     print("Lunghezza del serpente dimezzata.")
 
 def increase_special_food_points():
     """Il cibo speciale fornisce il 50% di punti in più."""
-    global special_food_points_multiplier
-    special_food_points_multiplier += 0.5  # Moltiplicatore per il punteggio del cibo speciale
+    engine.increase_special_food_points(game_state, game_state.snakes[0])
     print("Il cibo speciale fornisce il 50% di punti in più.")
 
 # Definizione degli effetti speciali
@@ -400,8 +500,9 @@ special_effects = [
 # Funzioni di Gestione dei Record
 def read_records():
     """Legge i record dal file 'record.txt' e restituisce un dizionario con i punteggi."""
+    record_writer.flush()
     try:
-        with open("record.txt", "r") as file:
+        with open(RECORDS_FILE, "r") as file:
             records = json.load(file)
             return records
     except FileNotFoundError:
@@ -412,9 +513,60 @@ def read_records():
         }
 
 def write_records(records):
-    """Scrive i record nel file 'record.txt'."""
-    with open("record.txt", "w") as file:
+    """Scrive i record nel file 'record.txt' su un file temporaneo e poi lo rinomina, così non resta mai a metà."""
+    temp_path = RECORDS_FILE + ".tmp"
+    with open(temp_path, "w") as file:
         json.dump(records, file, indent=4)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, RECORDS_FILE)
+
+class RecordWriter(threading.Thread):
+    """Scrive i record su disco in background, senza bloccare il ciclo di gioco."""
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.condition = threading.Condition()
+        self.pending = None
+        self.writing = False
+
+    def schedule(self, records):
+        """Richiede la scrittura di una copia dei record (sostituisce quella ancora in attesa)."""
+        with self.condition:
+            self.pending = copy.deepcopy(records)
+            self.condition.notify_all()
+        # Il thread parte solo alla prima scrittura, non all'import del modulo
+        if self.ident is None:
+            self.start()
+
+    def flush(self):
+        """Attende che tutte le scritture richieste siano state completate."""
+        with self.condition:
+            self.condition.wait_for(lambda: self.pending is None and not self.writing)
+
+    def run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.pending is not None)
+                records, self.pending = self.pending, None
+                self.writing = True
+            try:
+                write_records(records)
+            except OSError as error:
+                print(f"Impossibile salvare i record: {error}")
+            finally:
+                with self.condition:
+                    self.writing = False
+                    self.condition.notify_all()
+
+record_writer = RecordWriter()
+
+def get_records():
+    """Restituisce i record, leggendoli dal file solo alla prima richiesta."""
+    global global_records
+    if global_records is None:
+        global_records = read_records()
+    return global_records
 
 def update_records(records, mode, score, game_id):
     """Aggiorna i record con il nuovo punteggio per la modalità specificata"""
@@ -433,6 +585,15 @@ def update_records(records, mode, score, game_id):
     
     return records
 
+def quit_game():
+    """Salva i record in sospeso e chiude il gioco."""
+    record_writer.flush()
+    frame_profiler.close()
+    if spectators is not None:
+        spectators.close()
+    pygame.quit()
+    quit()
+
 # Menu e Navigazione
 def handle_menu_input(options, selected_option, event):
     """Gestisce l'input dell'utente per i menu."""
@@ -455,113 +616,103 @@ def handle_menu_input(options, selected_option, event):
                 return i, True
     return selected_option, False
 
-def gameMenu():
-    """Mostra il menu principale del gioco e gestisce la navigazione tra le opzioni."""
-    menu = True
-    selected_option = 0
-    options = ["Play", "High Score", "Mode", "Resolution", "Quit"]
-    while menu:
-        draw_menu("Snake Game", options, selected_option, score=None, high_score=None, resolutions=None, is_fullscreen=None, all_high_scores=None)
-        pygame.display.update()
+MENU_WAIT_MS = 500  # Attesa massima di un evento nei menu: il ciclo si risveglia comunque per i segnali (Ctrl+C)
+# Eventi dopo cui la finestra va ridisegnata anche senza cambi di selezione
+MENU_REDRAW_EVENTS = {pygame.VIDEOEXPOSE, pygame.VIDEORESIZE, pygame.WINDOWEXPOSED, pygame.WINDOWRESTORED, pygame.WINDOWSIZECHANGED}
 
-        # Gestisci input utente
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                quit()
-            
-            selected_option, confirmed = handle_menu_input(options, selected_option, event)
-            if confirmed:
-                if selected_option == 0:
-                    selectGameMode()
-                elif selected_option == 1:
-                    showHighScore()
-                elif selected_option == 2:
-                    changeDifficulty()
-                elif selected_option == 3:
-                    changeResolution()
-                elif selected_option == 4:
-                    pygame.quit()
-                    quit()
+def run_menu(title, options, selected_option=0, **draw_options):
+    """Mostra un menu e ne attende la scelta; restituisce l'indice dell'opzione confermata (None se si chiude la finestra).
+
+    Il ciclo dorme in pygame.event.wait() e ridisegna solo quando cambia la selezione o la finestra, quindi un menu
+    aperto non occupa la CPU.
+    """
+    redraw = True
+    while True:
+        if redraw:
+            draw_menu(title, options, selected_option, **draw_options)
+            pygame.display.update()
+            redraw = False
+            if startup_probe:
+                print(f"Primo frame del menu dopo {(time.perf_counter() - START_TIME) * 1000:.1f} ms")
+                return None
+        event = pygame.event.wait(MENU_WAIT_MS)
+        if event.type == pygame.QUIT:
+            return None
+        if event.type in MENU_REDRAW_EVENTS:
+            redraw = True
+        option, confirmed = handle_menu_input(options, selected_option, event)
+        if confirmed:
+            return option
+        if option != selected_option:
+            selected_option, redraw = option, True
+
+# Scene del gioco: menu principale, scelta della modalità, partita e fine partita. Ogni scena gestisce la propria
+# schermata e restituisce la scena successiva (una funzione senza argomenti, ad esempio un partial) oppure None per
+# chiudere il gioco. Le scene non si chiamano mai tra loro: le esegue una dopo l'altra run_scenes(), quindi lo stack e
+# la memoria restano costanti anche dopo migliaia di partite. I menu di pausa e degli effetti speciali si aprono sopra
+# la partita e tornano a essa. Il gioco si chiude solo da run_scenes(): chi vede chiudere la finestra restituisce None.
+RESUME = "RESUME"  # Scelta del menu di pausa che riprende la partita in corso
+
+def run_scenes(scene):
+    """Ciclo principale del gioco: esegue una scena alla volta finché una di esse non chiude il gioco."""
+    while scene is not None:
+        scene = scene()
+    quit_game()
+
+def playGame(mode):
+    """Scena di gioco: inizia una nuova partita nella modalità indicata."""
+    global game_mode
+    game_mode = mode
+    if mode == "1vs1":
+        return gameLoop1vs1()
+    if mode == "battle":
+        return gameLoopBattle()
+    return gameLoop()  # Modalità singola, con l'autopilota o nell'Arena
+
+def gameMenu(selected_option=0):
+    """Mostra il menu principale del gioco; restituisce la scena dell'opzione scelta."""
+    options = ["Play", "High Score", "Mode", "Resolution", "Quit"]
+    scenes = [selectGameMode, showHighScore, changeDifficulty, changeResolution]
+    selected_option = run_menu("Snake Game", options, selected_option)
+    if selected_option is None or selected_option >= len(scenes):
+        return None
+    return scenes[selected_option]
 
 def selectGameMode():
     """Mostra il menu per selezionare la modalità di gioco."""
-    mode_menu = True
-    selected_option = 0
-    options = ["Single", "1vs1", "Back"]
-    while mode_menu:
-        draw_menu("Select Game Mode", options, selected_option)
-        pygame.display.update()
-
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                quit()
-
-            selected_option, confirmed = handle_menu_input(options, selected_option, event)
-            if confirmed:
-                if selected_option == 0:
-                    menu = False
-                    gameLoop()  # Modalità singola
-                elif selected_option == 1:
-                    mode_menu = False
-                    gameLoop1vs1()  # Modalità 1 vs 1
-                elif selected_option == 2:
-                    mode_menu = False
+    # Singola, 1 vs 1, guidata dall'autopilota, campo grande con la vista che segue il serpente, contro molti bot
+    modes = ["single", "1vs1", "autopilot", "arena", "battle"]
+    options = ["Single", "1vs1", "AutoPilot", "Arena", "Battle", "Back"]
+    selected_option = run_menu("Select Game Mode", options)
+    if selected_option is None:
+        return None
+    if selected_option < len(modes):
+        return partial(playGame, modes[selected_option])
+    return gameMenu
 
 def showHighScore():
-    """Mostra il menu dei punteggi più alti e gestisce la navigazione."""
-    high_score_menu = True
-    selected_option = 0
-    options = ["Back"]
-    all_high_scores = read_records()
-    while high_score_menu:
-        draw_menu("High Score", options, selected_option, score=None, high_score=None, resolutions=None, is_fullscreen=None, all_high_scores=all_high_scores)
-        pygame.display.update()
-
-        # Gestisci input utente
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                quit()
-
-            selected_option, confirmed = handle_menu_input(options, selected_option, event)
-            if confirmed:
-                if selected_option == 0:
-                    high_score_menu = False
+    """Mostra il menu dei punteggi più alti e torna al menu principale."""
+    if run_menu("High Score", ["Back"], all_high_scores=get_records()) is None:
+        return None
+    return partial(gameMenu, 1)
 
 def changeDifficulty():
     """Mostra il menu per cambiare la difficoltà e gestisce la selezione."""
-    difficulty_menu = True
-    selected_option = 0
-    options = ["Relaxed", "Balanced", "Extreme", "Back"]
     global SPEED, CURRENT_DIFFICULTY
-    while difficulty_menu:
-        draw_menu("Change Mode", options, selected_option, score=None, high_score=None, resolutions=None, is_fullscreen=None, all_high_scores=None)
-        pygame.display.update()
-        
-        # Gestisci input utente
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                quit()
-
-            selected_option, confirmed = handle_menu_input(options, selected_option, event)
-            if confirmed:
-                if selected_option == 0:
-                    SPEED = 8
-                    CURRENT_DIFFICULTY = "Relaxed"
-                    difficulty_menu = False
-                elif selected_option == 1:
-                    SPEED = 13
-                    CURRENT_DIFFICULTY = "Balanced"
-                    difficulty_menu = False
-                elif selected_option == 2:
-                    SPEED = 20
-                    CURRENT_DIFFICULTY = "Extreme"
-                    difficulty_menu = False
-                elif selected_option == 3:
-                    difficulty_menu = False
+    options = ["Relaxed", "Balanced", "Extreme", "Back"]
+    selected_option = run_menu("Change Mode", options)
+    if selected_option is None:
+        return None
+    if selected_option == 0:
+        SPEED = 8
+        CURRENT_DIFFICULTY = "Relaxed"
+    elif selected_option == 1:
+        SPEED = 13
+        CURRENT_DIFFICULTY = "Balanced"
+    elif selected_option == 2:
+        SPEED = 20
+        CURRENT_DIFFICULTY = "Extreme"
+    return partial(gameMenu, 2)
 
 def changeResolution():
     """Mostra il menu per cambiare la risoluzione e gestisce la selezione."""
@@ -577,30 +728,22 @@ def changeResolution():
     selected_option = 0 
     is_fullscreen = False
     while True:
-        draw_menu("Change Resolution", options, selected_option, score=None, high_score=None, resolutions=resolutions, is_fullscreen=is_fullscreen, all_high_scores=None)
-        pygame.display.update()
-
-        # Gestisci input utente
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                return False
-
-            selected_option, confirmed = handle_menu_input(options, selected_option, event)
-            if confirmed:
-                if selected_option == 5:
-                    return
-                elif selected_option == 4:
-                    screen = pygame.display.set_mode((0, 0), pygame.FULLSCREEN)
-                    WIDTH, HEIGHT = screen.get_size()
-                    is_fullscreen = True 
-                else:
-                    is_fullscreen = False
-                    WIDTH, HEIGHT = resolutions[selected_option]  
-                    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+        selected_option = run_menu("Change Resolution", options, selected_option, resolutions=resolutions, is_fullscreen=is_fullscreen)
+        if selected_option is None:
+            return None
+        if selected_option == 5:
+            return partial(gameMenu, 3)
+        elif selected_option == 4:
+            screen = pygame.display.set_mode((0, 0), pygame.FULLSCREEN)
+            WIDTH, HEIGHT = screen.get_size()
+            is_fullscreen = True 
+        else:
+            is_fullscreen = False
+            WIDTH, HEIGHT = resolutions[selected_option]  
+            screen = pygame.display.set_mode((WIDTH, HEIGHT))
 
 def show_special_effect_menu(score,foodx,foody,player):
-    """Mostra il menu per scegliere un effetto speciale."""
-    selected_option = 0
+    """Mostra il menu per scegliere un effetto speciale; restituisce RESUME, o None se si chiude la finestra."""
     options = random.sample(special_effects, 3)
     option_texts = [opt[0] for opt in options]
 
@@ -614,383 +757,679 @@ def show_special_effect_menu(score,foodx,foody,player):
     draw_score_bar(score, None, SPEED, None, Length_of_snake, None, mode_high_score, CURRENT_DIFFICULTY)
 
 
-    while True:
-        draw_menu("Choice a New Ability", option_texts, selected_option, score=None, high_score=None, resolutions=None, is_fullscreen=None, all_high_scores=None)
-        pygame.display.update()
-
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                quit()
-
-            selected_option, confirmed = handle_menu_input([opt[0] for opt in options], selected_option, event)
-            if confirmed:
-                print(f"Effetto scelto per il Giocatore {player}: {options[selected_option][0]}")
-                options[selected_option][1]()
-                return
+    # Il menu si disegna sopra la situazione attuale, senza sfondo
+    selected_option = run_menu("Choice a New Ability", option_texts)
+    if selected_option is None:
+        return None
+    print(f"Effetto scelto per il Giocatore {player}: {options[selected_option][0]}")
+    options[selected_option][1]()
+    if replay_recorder is not None:
+        replay_recorder.record_effect(0, special_effects.index(options[selected_option]))
+    # L'effetto cambia lo stato fuori da engine.step: gli spettatori ricevono un nuovo KEYFRAME
+    if spectators is not None:
+        spectators.refresh()
+    return RESUME
 
 def pauseMenu(score, current_high_score,game_mode):
-    """Mostra il menu di pausa e gestisce la navigazione tra le opzioni."""
-    paused = True
-    selected_option = 0
+    """Mostra il menu di pausa; restituisce RESUME per riprendere la partita oppure la scena successiva."""
     options = ["Resume", "Restart", "Main Menu"]
-    while paused:
-        draw_menu("Pause Menu", options, selected_option, score, current_high_score, resolutions=None, is_fullscreen=None, all_high_scores=None)
-        pygame.display.update()
-        
-        # Gestisci input utente
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                return False
-
-            selected_option, confirmed = handle_menu_input(options, selected_option, event)
-            if confirmed:
-                if selected_option == 0:
-                    paused = False
-                elif selected_option == 1:
-                    if game_mode == "single":
-                        gameLoop()  # Riavvia la partita in modalità singola
-                    elif game_mode == "1vs1":
-                        gameLoop1vs1()  # Riavvia la partita in modalità 1 vs 1
-                elif selected_option == 2:
-                    gameMenu()                
-    return True
-
-def gameOverMenu(score, mode_high_score):
-    """Mostra il menu di fine gioco e gestisce la navigazione tra le opzioni."""
-    game_close = True
-    selected_option = 0
+    selected_option = run_menu("Pause Menu", options, score=score, high_score=current_high_score)
+    if selected_option is None:
+        return None
+    if selected_option == 1:
+        return partial(playGame, game_mode)  # Riavvia la partita nella stessa modalità
+    if selected_option == 2:
+        return gameMenu
+    return RESUME
+
+def gameOverMenu(score, mode_high_score, title="Game Over"):
+    """Mostra il menu di fine gioco; restituisce la scena successiva (nuova partita o menu principale)."""
     options = ["Play Again", "Main Menu"]
-    score_font = pygame.font.SysFont("bahnschrift", 30)
-    records = read_records()
+    records = get_records()
     mode_high_score = max((rec["score"] for rec in records[CURRENT_DIFFICULTY]), default=0)
-    while game_close:
-        draw_menu("Game Over", options, selected_option, score, mode_high_score, resolutions=None, is_fullscreen=None, all_high_scores=None)
-        pygame.display.update()
+    selected_option = run_menu(title, options, score=score, high_score=mode_high_score)
+    if selected_option is None:
+        return None
+    if selected_option == 0:
+        return partial(playGame, game_mode)
+    return gameMenu
 
-        # Gestisci input utente
+#Funzione Principale
+def toggle_profiler(event):
+    """Mostra o nasconde il pannello delle prestazioni con il tasto F3."""
+    global show_profiler
+    if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+        show_profiler = not show_profiler
+
+def draw_profiler_hud(profiler):
+    """Disegna il pannello delle prestazioni (FPS, grafico dei tempi di frame, ms per fase) e ne restituisce l'area."""
+    panel_width, graph_height = 220, 40
+    panel_height = 40 + graph_height + 18 * len(profiler.phases)
+    panel_x, panel_y = WIDTH - panel_width - 10, 70
+    panel = pygame.Surface((panel_width, panel_height), pygame.SRCALPHA)
+    panel.fill((0, 0, 0, 170))
+    panel_rect = screen.blit(panel, (panel_x, panel_y))
+
+    # Il testo cambia a ogni frame, quindi non passa dalla cache dei testi
+    screen.blit(font_style_small.render(f"FPS: {clock.get_fps():.0f}", True, WHITE), (panel_x + 10, panel_y + 8))
+
+    # Grafico dei tempi di frame, con la linea del budget di un frame
+    frame_times = profiler.frame_times()
+    graph_x, graph_y = panel_x + 10, panel_y + 30
+    budget = 1000 / RENDER_FPS
+    scale = graph_height / max(2 * budget, max(frame_times, default=0))
+    budget_y = graph_y + graph_height - budget * scale
+    pygame.draw.line(screen, YELLOW, (graph_x, budget_y), (graph_x + panel_width - 20, budget_y))
+    if len(frame_times) > 1:
+        step = (panel_width - 20) / (profiler.history.maxlen - 1)
+        points = [(graph_x + i * step, graph_y + graph_height - ms * scale) for i, ms in enumerate(frame_times)]
+        pygame.draw.lines(screen, GREEN, False, points)
+
+    text_y = graph_y + graph_height + 6
+    for phase, ms in profiler.averages().items():
+        screen.blit(font_style_small.render(f"{phase}: {ms:.2f} ms", True, WHITE), (panel_x + 10, text_y))
+        text_y += 18
+    return panel_rect
+
+def interpolated_head(snake, alpha):
+    """Restituisce la posizione della testa interpolata tra la cella precedente e quella attuale."""
+    dx, dy = snake.x - snake.prev_x, snake.y - snake.prev_y
+    # Nessuna interpolazione quando il serpente attraversa un bordo o è fermo
+    if abs(dx) > BLOCK_SIZE or abs(dy) > BLOCK_SIZE or (dx == 0 and dy == 0):
+        return snake.x, snake.y
+    return round(snake.prev_x + dx * alpha), round(snake.prev_y + dy * alpha)
+
+def interpolated_body(snake, alpha):
+    """Restituisce il corpo del serpente con la testa interpolata tra la cella precedente e quella attuale."""
+    body = list(snake.body)
+    if body:
+        body[-1] = interpolated_head(snake, alpha)
+    return body
+
+def draw_food(state, camera=None):
+    """Disegna il cibo normale e, se attivo, il cibo speciale; restituisce le aree disegnate."""
+    rects = []
+    offset_x, offset_y = (camera.x, camera.y) if camera is not None else (0, 0)
+    if state.food is not None:
+        foodx, foody = state.food[0] - offset_x, state.food[1] - offset_y
+        rects.append(pygame.draw.circle(screen, BLACK, (foodx + BLOCK_SIZE // 2, foody + BLOCK_SIZE // 2), BLOCK_SIZE // 2))
+        pygame.draw.circle(screen, WHITE, (foodx + BLOCK_SIZE // 2, foody + BLOCK_SIZE // 2), BLOCK_SIZE // 2 - 2)
+    if state.special_food_timer > 0:
+        special_foodx, special_foody = state.special_food[0] - offset_x, state.special_food[1] - offset_y
+        rects.append(pygame.draw.circle(screen, BLACK, (special_foodx + BLOCK_SIZE // 2, special_foody + BLOCK_SIZE // 2), BLOCK_SIZE // 2))
+        pygame.draw.circle(screen, DARK_GREY, (special_foodx + BLOCK_SIZE // 2, special_foody + BLOCK_SIZE // 2), BLOCK_SIZE // 2 -2)
+    return rects
+
+class Camera:
+    """Vista della finestra su un campo più grande: segue la testa del serpente senza uscire dal campo."""
+
+    def __init__(self, world_width, world_height):
+        self.world_width, self.world_height = world_width, world_height
+        self.x = self.y = 0
+
+    def follow(self, x, y):
+        """Centra la vista sul punto (x, y) del campo."""
+        self.x = min(max(0, round(x + BLOCK_SIZE / 2 - WIDTH / 2)), max(0, self.world_width - WIDTH))
+        self.y = min(max(0, round(y + BLOCK_SIZE / 2 - HEIGHT / 2)), max(0, self.world_height - HEIGHT))
+
+    def visible_cells(self, cols, rows):
+        """Restituisce le colonne e le righe (inizio incluso, fine esclusa) che compaiono nella finestra.
+
+        Si include una cella in più per lato: gli sprite dei segmenti sporgono di 2 pixel oltre la propria cella.
+        """
+        return (max(0, self.x // BLOCK_SIZE - 1), min(cols, (self.x + WIDTH) // BLOCK_SIZE + 2),
+                max(0, self.y // BLOCK_SIZE - 1), min(rows, (self.y + HEIGHT) // BLOCK_SIZE + 2))
+
+def render_chunk(row, world_height):
+    """Crea lo sfondo di un blocco della riga di blocchi indicata: il gradiente di grigio esteso a tutto il campo."""
+    size = CHUNK_CELLS * BLOCK_SIZE
+    surface = pygame.Surface((size, size)).convert()
+    for y in range(size):
+        world_y = row * size + y
+        color = tuple(DARK_GREY[i] + (GREY[i] - DARK_GREY[i]) * world_y // world_height for i in range(3))
+        pygame.draw.line(surface, color, (0, y), (size, y))
+    return surface
+
+def draw_arena_background(camera):
+    """Disegna solo i blocchi di sfondo che intersecano la finestra."""
+    size = CHUNK_CELLS * BLOCK_SIZE
+    blits = []
+    for row in range(camera.y // size, (camera.y + HEIGHT - 1) // size + 1):
+        # Il gradiente dipende solo dall'altezza, quindi i blocchi di una stessa riga condividono la superficie
+        key = (row, camera.world_height)
+        chunk = chunk_cache.get(key)
+        if chunk is None:
+            chunk = chunk_cache[key] = render_chunk(row, camera.world_height)
+            if len(chunk_cache) > CHUNK_CACHE_SIZE:
+                chunk_cache.popitem(last=False)
+        else:
+            chunk_cache.move_to_end(key)
+        for col in range(camera.x // size, (camera.x + WIDTH - 1) // size + 1):
+            blits.append((chunk, (col * size - camera.x, row * size - camera.y)))
+    screen.blits(blits, False)
+
+def draw_arena_snake(state, player, camera, alpha):
+    """Disegna i segmenti del serpente visibili nella finestra leggendo la griglia di occupazione, non tutto il corpo."""
+    snake, occupancy = state.snakes[player], state.occupancy
+    if not snake.body:
+        return
+    sprites = get_snake_sprites(BLOCK_SIZE, player + 1)
+    last = len(sprites) - 1
+    grid, cols = occupancy.grids[player], occupancy.cols
+    col_start, col_end, row_start, row_end = camera.visible_cells(cols, occupancy.rows)
+    # Solo gli ultimi segmenti verso la coda hanno il colore del gradiente; gli altri usano l'ultimo sprite
+    tail = snake.body.tail_indices(last)
+    head = snake.body.head()
+    special = set(tail)
+    special.add(head)
+    blits = []
+    for i, cell in enumerate(tail):
+        col, row = cell % cols, cell // cols
+        if cell != head and col_start <= col < col_end and row_start <= row < row_end:
+            blits.append((sprites[i], (col * BLOCK_SIZE - camera.x - 2, row * BLOCK_SIZE - camera.y - 2)))
+    sprite = sprites[last]
+    for row in range(row_start, row_end):
+        start = row * cols
+        segment = grid[start + col_start:start + col_end]
+        if segment.count(0) == len(segment):
+            continue
+        for col, count in enumerate(segment, col_start):
+            if count and start + col not in special:
+                blits.append((sprite, (col * BLOCK_SIZE - camera.x - 2, row * BLOCK_SIZE - camera.y - 2)))
+    head_x, head_y = interpolated_head(snake, alpha)
+    blits.append((sprites[min(len(snake.body) - 1, last)], (head_x - camera.x - 2, head_y - camera.y - 2)))
+    screen.blits(blits, False)
+
+def draw_food_marker(state, camera):
+    """Se il cibo è fuori dalla finestra, disegna un indicatore sul bordo nella sua direzione; restituisce le aree disegnate."""
+    if state.food is None:
+        return []
+    food_x = state.food[0] + BLOCK_SIZE / 2 - camera.x
+    food_y = state.food[1] + BLOCK_SIZE / 2 - camera.y
+    if 0 <= food_x < WIDTH and SCOREBOARD_HEIGHT <= food_y < HEIGHT:
+        return []
+    center_x, center_y = WIDTH / 2, (HEIGHT + SCOREBOARD_HEIGHT) / 2
+    dx, dy = food_x - center_x, food_y - center_y
+    scale = min((center_x - BLOCK_SIZE) / abs(dx) if dx else math.inf, (center_y - SCOREBOARD_HEIGHT - BLOCK_SIZE) / abs(dy) if dy else math.inf)
+    position = (round(center_x + dx * scale), round(center_y + dy * scale))
+    rect = pygame.draw.circle(screen, BLACK, position, BLOCK_SIZE // 2)
+    pygame.draw.circle(screen, WHITE, position, BLOCK_SIZE // 2 - 4)
+    return [rect]
+
+def draw_battle(state, camera, alphas):
+    """Disegna i cibi e i serpenti della battaglia visibili nella finestra leggendo la griglia dei proprietari delle celle."""
+    col_start, col_end, row_start, row_end = camera.visible_cells(state.cols, state.rows)
+    for food in state.foods:
+        col, row = food % state.cols, food // state.cols
+        if col_start <= col < col_end and row_start <= row < row_end:
+            center = (col * BLOCK_SIZE + BLOCK_SIZE // 2 - camera.x, row * BLOCK_SIZE + BLOCK_SIZE // 2 - camera.y)
+            pygame.draw.circle(screen, BLACK, center, BLOCK_SIZE // 2)
+            pygame.draw.circle(screen, WHITE, center, BLOCK_SIZE // 2 - 2)
+    heads = {snake.body.head(): snake for snake in state.snakes if snake.body}
+    # I corpi usano uno sprite per giocatore, la testa quello più chiaro del gradiente
+    body_sprites = {}
+    blits = []
+    owner, cols = state.owner, state.cols
+    for row in range(row_start, row_end):
+        start = row * cols
+        segment = owner[start + col_start:start + col_end]
+        if not any(segment):
+            continue
+        for col, player in enumerate(segment, col_start):
+            if player and start + col not in heads:
+                sprite = body_sprites.get(player)
+                if sprite is None:
+                    sprite = body_sprites[player] = get_snake_sprites(BLOCK_SIZE, player)[20]
+                blits.append((sprite, (col * BLOCK_SIZE - camera.x - 2, row * BLOCK_SIZE - camera.y - 2)))
+    for head, snake in heads.items():
+        col, row = head % cols, head // cols
+        if col_start <= col < col_end and row_start <= row < row_end:
+            head_x, head_y = interpolated_head(snake, alphas[snake.player])
+            blits.append((get_snake_sprites(BLOCK_SIZE, snake.player + 1)[0], (head_x - camera.x - 2, head_y - camera.y - 2)))
+    screen.blits(blits, False)
+
+def save_replay():
+    """Salva su file il replay della partita in corso, se non è già stato salvato."""
+    global replay_recorder
+    if replay_recorder is None:
+        return
+    os.makedirs(REPLAYS_DIR, exist_ok=True)
+    path = os.path.join(REPLAYS_DIR, current_game_id + replay.REPLAY_EXTENSION)
+    replay_recorder.save(path)
+    replay_recorder = None
+    print(f"Replay salvato in {path}")
+
+def playReplay(path, speed=1.0):
+    """Riproduce un replay a velocità reale (speed=1) o accelerata (es. speed=4); ESC o la chiusura della finestra per uscire."""
+    global game_state, screen, WIDTH, HEIGHT
+    recorded = replay.load(path)
+    # Un campo più grande dello schermo (modalità Arena) si guarda con la vista che segue il primo serpente
+    desktop_width, desktop_height = pygame.display.get_desktop_sizes()[0]
+    camera = Camera(recorded.width, recorded.height) if recorded.width > desktop_width or recorded.height > desktop_height else None
+    if camera is None and (WIDTH, HEIGHT) != (recorded.width, recorded.height):
+        WIDTH, HEIGHT = recorded.width, recorded.height
+        screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    game_state = recorded.new_state()
+    events = recorded.events()
+    accumulator = 0.0
+    finished = False
+    while True:
         for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                return False
-
-            selected_option, confirmed = handle_menu_input(options, selected_option, event)
-            if confirmed:
-                if selected_option == 0:
-                    gameLoop()
-                elif selected_option == 1:
-                    gameMenu()
-    return True
+            if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
+                return game_state
+
+        # Avanza di tanti tick quanti ne sarebbero trascorsi in partita, moltiplicati per speed
+        accumulator += min(clock.tick(RENDER_FPS) / 1000, MAX_FRAME_TIME) * speed
+        while not finished and accumulator >= 1 / max(snake.speed for snake in game_state.snakes):
+            event = next(events, None)
+            if event is None:
+                finished = True
+                print(f"Replay terminato dopo {game_state.tick} tick: " + ", ".join(f"punteggio {snake.score}" for snake in game_state.snakes))
+            elif event[0] == "step":
+                accumulator -= 1 / max(snake.speed for snake in game_state.snakes)
+                replay.apply_event(game_state, event)
+            else:
+                replay.apply_event(game_state, event)
+
+        if camera is not None:
+            camera.follow(game_state.snakes[0].x, game_state.snakes[0].y)
+        game_renderer.begin(camera)
+        game_renderer.mark(draw_food(game_state, camera))
+        for player, snake in enumerate(game_state.snakes, start=1):
+            if camera is None:
+                game_renderer.mark(our_snake(BLOCK_SIZE, snake.body, player=player, return_rects=True))
+            else:
+                draw_arena_snake(game_state, player - 1, camera, 1.0)
+        snake1, snake2 = game_state.snakes[0], (game_state.snakes[1] if len(game_state.snakes) > 1 else None)
+        game_renderer.mark([draw_score_bar(snake1.score, snake2.score if snake2 else None, snake1.speed, snake2.speed if snake2 else None,
+                                           snake1.length, snake2.length if snake2 else None, 0, recorded.difficulty)])
+        game_renderer.end()
 
-#Funzione Principale
 def gameLoop():
     """Gestisce il ciclo principale del gioco, inclusi movimento, collisioni e punteggio."""
-    global global_records, CURRENT_DIFFICULTY, SPEED, last_updated_score, last_score, Length_of_snake, food_points_multiplier, special_food_points_multiplier, current_game_id, snake_List
+    global global_records, CURRENT_DIFFICULTY, SPEED, last_score, Length_of_snake, current_game_id, snake_List, game_state, replay_recorder
     current_game_id = str(uuid.uuid4())
     game_over = False
-    game_close = False
-    x1, y1 = WIDTH / 2, HEIGHT / 2  
-    x1_change, y1_change = 0, 0
-    direction = None
-    snake_List = []
-    Length_of_snake = 1
-    foodx, foody = generate_food(snake_List)
-    special_food_timer = 0
-    special_foodx, special_foody = None, None
-    score = 1
-    last_updated_score = 0
-    global_records = read_records()
+    seed = random.randrange(2 ** 63)
+    # Nella modalità Arena il campo è più grande della finestra e la vista segue la testa del serpente
+    arena = game_mode == "arena"
+    width, height = (ARENA_CELLS[0] * BLOCK_SIZE, ARENA_CELLS[1] * BLOCK_SIZE) if arena else (WIDTH, HEIGHT)
+    camera = Camera(width, height) if arena else None
+    game_state = engine.GameState(width, height, CURRENT_DIFFICULTY, rng=random.Random(seed))
+    replay_recorder = replay.ReplayRecorder(seed, CURRENT_DIFFICULTY, width, height)
+    if spectators is not None:
+        spectators.refresh()
+    snake = game_state.snakes[0]
+    # In modalità autopilota le svolte arrivano dall'IA, non dalla tastiera
+    pilot = ai.Autopilot(game_state) if game_mode == "autopilot" else None
+    input_buffer = InputBuffer(stats=None if pilot else input_latency)
+    snake_List = snake.body
+    Length_of_snake = snake.length
+    get_records()
     mode_high_score = max((rec["score"] for rec in global_records[CURRENT_DIFFICULTY]), default=0)
     last_score = 0
-    food_points_multiplier = 1.0
-    special_food_points_multiplier = 1.0
-    if CURRENT_DIFFICULTY == "Relaxed":
-        initial_speed = 8 
-    elif CURRENT_DIFFICULTY == "Balanced":
-        initial_speed = 13 
-    elif CURRENT_DIFFICULTY == "Extreme":
-        initial_speed = 20
-    else:
-        initial_speed = 5  
-    SPEED = initial_speed
+    SPEED = snake.speed
+    scheduler = engine.TickScheduler(1)
     while not game_over:
-        while game_close:
+        if game_state.game_close:
             mode_high_score = max((rec["score"] for rec in global_records[CURRENT_DIFFICULTY]), default=0)
-            game_over = not gameOverMenu(score, mode_high_score)
-            if not game_over:
-                break  
+            print(pilot.timings.report() if pilot else input_latency.report())
+            if spectators is not None:
+                print(spectators.report())
+            save_replay()
+            return partial(gameOverMenu, snake.score, mode_high_score, "You Win" if game_state.won else "Game Over")
+        dt = min(clock.tick(RENDER_FPS) / 1000, MAX_FRAME_TIME)
+        frame_profiler.begin_frame()
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 game_over = True
+            toggle_profiler(event)
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
+                next_scene = pauseMenu(snake.score, mode_high_score, game_mode)
+                if next_scene != RESUME:
+                    save_replay()
+                    return next_scene
 
             # Gestione input per il movimento del serpente
-            direction, x1_change, y1_change = snake_input(event, direction, x1_change, y1_change,score,mode_high_score, player=1,game_mode=game_mode)
-
-        keys = pygame.key.get_pressed()
-        if (keys[pygame.K_LEFT] or keys[pygame.K_a]) and (keys[pygame.K_RIGHT] or keys[pygame.K_d]):
-            x1_change = 0
-            y1_change = 0
-        elif (keys[pygame.K_UP] or keys[pygame.K_w]) and (keys[pygame.K_DOWN] or keys[pygame.K_s]):
-            x1_change = 0
-            y1_change = 0
-
-        # Aggiornamento della posizione del serpente
-        x1 += x1_change
-        y1 += y1_change
-        if x1 < 0:
-            x1 = WIDTH - BLOCK_SIZE  
-        elif x1 >= WIDTH:
-            x1 = 0  
-        if y1 < SCOREBOARD_HEIGHT: 
-            y1 = HEIGHT - BLOCK_SIZE 
-        elif y1 >= HEIGHT:
-            y1 = SCOREBOARD_HEIGHT  
-        x1 = (x1 // BLOCK_SIZE) * BLOCK_SIZE
-        y1 = (y1 // BLOCK_SIZE) * BLOCK_SIZE
-
-        # Disegna la griglia
-        for x in range(0, WIDTH, BLOCK_SIZE):
-            pygame.draw.line(screen, (200, 200, 200), (x, SCOREBOARD_HEIGHT), (x, HEIGHT))
-        for y in range(SCOREBOARD_HEIGHT, HEIGHT, BLOCK_SIZE):
-            pygame.draw.line(screen, (200, 200, 200), (0, y), (WIDTH, y))
-        
-        # Disegna lo sfondo e il cibo
-        draw_background()
-        pygame.draw.circle(screen, BLACK, (foodx + BLOCK_SIZE // 2, foody + BLOCK_SIZE // 2), BLOCK_SIZE // 2)
-        pygame.draw.circle(screen, WHITE, (foodx + BLOCK_SIZE // 2, foody + BLOCK_SIZE // 2), BLOCK_SIZE // 2 - 2)
-
-        # Gestione del cibo speciale
-        if special_food_timer > 0:
-            pygame.draw.circle(screen, BLACK, (special_foodx + BLOCK_SIZE // 2, special_foody + BLOCK_SIZE // 2), BLOCK_SIZE // 2)
-            pygame.draw.circle(screen, DARK_GREY, (special_foodx + BLOCK_SIZE // 2, special_foody + BLOCK_SIZE // 2), BLOCK_SIZE // 2 -2)
-            special_food_timer -= 1
-        elif special_food_timer == 0 and random.randint(1, 100) == 1:
-            special_foodx = round(random.randrange(0, WIDTH - BLOCK_SIZE) / BLOCK_SIZE) * BLOCK_SIZE
-            special_foody = round(random.randrange(0, HEIGHT - BLOCK_SIZE) / BLOCK_SIZE) * BLOCK_SIZE
-            special_food_timer = 100
-        
-        # Aggiornamento della lista del serpente
-        snake_Head = [x1, y1]
-        snake_List.append(snake_Head)
-        if len(snake_List) > Length_of_snake:
-            del snake_List[0]
-        for block in snake_List[:-1]:
-            if block == snake_Head:
-                game_close = True
-
-        # Disegna il serpente
-        our_snake(BLOCK_SIZE, snake_List,player=1)
-
-        # Aggiorna la velocità e il punteggio
-        SPEED, last_updated_score = update_speed(score, CURRENT_DIFFICULTY, SPEED, last_updated_score)
-        #draw_score_bar(score, mode_high_score, CURRENT_DIFFICULTY)
-        draw_score_bar(score, None, SPEED, None, Length_of_snake, None, mode_high_score, CURRENT_DIFFICULTY)
-
-        # Controllo collisione con il cibo
-        if x1 == foodx and y1 == foody:
-            foodx, foody = generate_food(snake_List)
-            Length_of_snake += 1
-            score += 1 * food_points_multiplier
-            score = round(score, 1)
-        if special_food_timer > 0 and x1 == special_foodx and y1 == special_foody:
-            special_foodx, special_foody = None, None
-            special_food_timer = 0
-            Length_of_snake += 5
-            score += 5 * special_food_points_multiplier
-            score = round(score, 1)
-
-        # Aggiorna i record
-        global_records = update_records(global_records, CURRENT_DIFFICULTY, score, current_game_id)
-        write_records(global_records)
-        check_for_special_effect_activation(score,foodx,foody,mode_high_score)
+            if pilot is None:
+                snake_input(event, input_buffer)
+
+        if pilot is None and opposite_keys_pressed(pygame.key.get_pressed()):
+            input_buffer.push(engine.STOP, pygame.time.get_ticks())
+        frame_profiler.lap("input")
+
+        # Aggiornamento dello stato di gioco a passo fisso, in base alla velocità del serpente
+        for movers in scheduler.advance(dt, game_state.snakes):
+            # L'autopilota decide la svolta entro il suo budget di tempo e la accoda come un tasto
+            if pilot is not None:
+                action = pilot.decide(game_state)
+                if action:
+                    input_buffer.push(action, pygame.time.get_ticks())
+                frame_profiler.lap("ai")
+            # Ogni tick consuma al massimo una svolta dalla coda
+            actions = [input_buffer.pop(pygame.time.get_ticks())]
+            replay_recorder.record_step(actions, movers)
+            engine.step(game_state, actions, movers)
+            if spectators is not None:
+                spectators.publish(game_state, actions, movers)
+            SPEED, Length_of_snake = snake.speed, snake.length
+            frame_profiler.lap("update")
+
+            # Aggiorna i record e li salva solo se la classifica è cambiata (le partite dell'autopilota e dell'Arena non contano)
+            if pilot is None and camera is None:
+                previous_top = global_records.get(CURRENT_DIFFICULTY, [])
+                global_records = update_records(global_records, CURRENT_DIFFICULTY, snake.score, current_game_id)
+                if global_records[CURRENT_DIFFICULTY] != previous_top:
+                    record_writer.schedule(global_records)
+            frame_profiler.lap("records")
+            if game_state.game_close:
+                break
+            if pilot is None and camera is None and game_state.food is not None:
+                foodx, foody = game_state.food
+                if check_for_special_effect_activation(snake.score,foodx,foody,mode_high_score) is None:
+                    save_replay()
+                    return None
+            frame_profiler.lap("update")
+
+        # Disegna lo sfondo, il cibo e il serpente (nell'Arena solo ciò che cade nella finestra)
+        alpha = scheduler.alpha(0, snake)
+        if camera is not None:
+            camera.follow(*interpolated_head(snake, alpha))
+        game_renderer.begin(camera)
+        frame_profiler.lap("background")
+        game_renderer.mark(draw_food(game_state, camera))
+        if camera is not None:
+            game_renderer.mark(draw_food_marker(game_state, camera))
+        frame_profiler.lap("food")
+        if camera is None:
+            game_renderer.mark(our_snake(BLOCK_SIZE, interpolated_body(snake, alpha), player=1, return_rects=True))
+        else:
+            draw_arena_snake(game_state, 0, camera, alpha)
+        frame_profiler.lap("snake")
+        game_renderer.mark([draw_score_bar(snake.score, None, SPEED, None, Length_of_snake, None, mode_high_score, CURRENT_DIFFICULTY)])
+        frame_profiler.lap("score_bar")
+        if show_profiler:
+            game_renderer.mark([draw_profiler_hud(frame_profiler)])
+            frame_profiler.lap("hud")
 
         # Aggiorna lo schermo
-        pygame.display.update()
-        clock.tick(SPEED)
+        game_renderer.end()
+        frame_profiler.lap("display")
+        frame_profiler.end_frame()
 
-    pygame.quit()
-    quit()
+    save_replay()
+    return None
 
 def gameLoop1vs1():
     """Gestisce il ciclo principale del gioco in modalità 1 vs 1."""
-    global global_records, CURRENT_DIFFICULTY, SPEED1, SPEED2, last_updated_score, Length_of_snake1, Length_of_snake2, food_points_multiplier, special_food_points_multiplier, last_score1, last_score2, snake_List1, snake_List2
+    global global_records, CURRENT_DIFFICULTY, SPEED1, SPEED2, Length_of_snake1, Length_of_snake2, last_score1, last_score2, snake_List1, snake_List2, game_state, current_game_id, replay_recorder
+    current_game_id = str(uuid.uuid4())
     game_over = False
-    game_close = False
-    x1, y1 = WIDTH / 4, HEIGHT / 2  # Posizione del Giocatore 1
-    x2, y2 = 3 * WIDTH / 4, HEIGHT / 2  # Posizione del Giocatore 2
-    x1_change, y1_change = 0, 0
-    x2_change, y2_change = 0, 0
-    direction1, direction2 = None, None
-    snake_List1, snake_List2 = [], []
-    Length_of_snake1, Length_of_snake2 = 1, 1
-    foodx, foody = generate_food(snake_List1 + snake_List2)
-    special_food_timer = 0
-    special_foodx, special_foody = None, None
-    score1, score2 = 1, 1
-    last_updated_score1, last_updated_score2 = 0, 0
+    seed = random.randrange(2 ** 63)
+    game_state = engine.GameState(WIDTH, HEIGHT, CURRENT_DIFFICULTY, players=2, rng=random.Random(seed))
+    replay_recorder = replay.ReplayRecorder(seed, CURRENT_DIFFICULTY, WIDTH, HEIGHT, players=2)
+    if spectators is not None:
+        spectators.refresh()
+    snake1, snake2 = game_state.snakes
+    input_buffers = [InputBuffer(stats=input_latency), InputBuffer(stats=input_latency)]
+    snake_List1, snake_List2 = snake1.body, snake2.body
     last_score1, last_score2 = 0, 0
-    SPEED1, SPEED2 = 10, 10  # Velocità iniziale per entrambi i giocatori
-    food_points_multiplier1, food_points_multiplier2 = 1.0, 1.0
-    special_food_points_multiplier1, special_food_points_multiplier2 = 1.0, 1.0
-    if CURRENT_DIFFICULTY == "Relaxed":
-        initial_speed = 8 
-    elif CURRENT_DIFFICULTY == "Balanced":
-        initial_speed = 13 
-    elif CURRENT_DIFFICULTY == "Extreme":
-        initial_speed = 20
-    else:
-        initial_speed = 5
-    SPEED1 = initial_speed
-    SPEED2 = initial_speed
+    SPEED1, SPEED2 = snake1.speed, snake2.speed
+    Length_of_snake1, Length_of_snake2 = snake1.length, snake2.length
+    scheduler = engine.TickScheduler(2)
     while not game_over:
-        while game_close:
-            game_over = not gameOverMenu(score1, score2)
-            if not game_over:
-                break  
-
+        if game_state.game_close:
+            print(input_latency.report())
+            if spectators is not None:
+                print(spectators.report())
+            save_replay()
+            return partial(gameOverMenu, snake1.score, snake2.score, "You Win" if game_state.won else "Game Over")
+
+        dt = min(clock.tick(RENDER_FPS) / 1000, MAX_FRAME_TIME)
+        frame_profiler.begin_frame()
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 game_over = True
+            toggle_profiler(event)
 
-            # Gestione input per il Giocatore 1 (WASD)
+            # Gestione input per il Giocatore 1 (WASD) e per il Giocatore 2 (Frecce); ognuno ha il proprio tasto di pausa
             if event.type == pygame.KEYDOWN:
                 if event.key in [pygame.K_w, pygame.K_a, pygame.K_s, pygame.K_d]:
-                    direction1, x1_change, y1_change = snake_input(event, direction1, x1_change, y1_change, score1, None, player=1,game_mode="1vs1")
-                elif event.key == pygame.K_ESCAPE:  # Pause menu for Player 1
-                    pauseMenu(score1, None, game_mode="1vs1")
-
-            # Gestione input per il Giocatore 2 (Frecce)
-            if event.type == pygame.KEYDOWN:
-                if event.key in [pygame.K_UP, pygame.K_DOWN, pygame.K_LEFT, pygame.K_RIGHT]:
-                    direction2, x2_change, y2_change = snake_input(event, direction2, x2_change, y2_change, score2, None, player=2,game_mode="1vs1")
-                elif event.key == pygame.K_BACKSPACE:  # Pause menu for Player 2
-                    pauseMenu(score2, None, game_mode="1vs1")
-
-        keys = pygame.key.get_pressed()
-        if (keys[pygame.K_LEFT] or keys[pygame.K_a]) and (keys[pygame.K_RIGHT] or keys[pygame.K_d]):
-            x1_change = 0
-            y1_change = 0
-        elif (keys[pygame.K_UP] or keys[pygame.K_w]) and (keys[pygame.K_DOWN] or keys[pygame.K_s]):
-            x1_change = 0
-            y1_change = 0
-        if (keys[pygame.K_LEFT] or keys[pygame.K_a]) and (keys[pygame.K_RIGHT] or keys[pygame.K_d]):
-            x2_change = 0
-            y2_change = 0
-        elif (keys[pygame.K_UP] or keys[pygame.K_w]) and (keys[pygame.K_DOWN] or keys[pygame.K_s]):
-            x2_change = 0
-            y2_change = 0
-        
-        # Aggiornamento della posizione del serpente 1
-        x1 += x1_change
-        y1 += y1_change
-        if x1 < 0:
-            x1 = WIDTH - BLOCK_SIZE
-        elif x1 >= WIDTH:
-            x1 = 0
-        if y1 < SCOREBOARD_HEIGHT:
-            y1 = HEIGHT - BLOCK_SIZE
-        elif y1 >= HEIGHT:
-            y1 = SCOREBOARD_HEIGHT
-        x1 = (x1 // BLOCK_SIZE) * BLOCK_SIZE
-        y1 = (y1 // BLOCK_SIZE) * BLOCK_SIZE
-
-        # Aggiornamento della posizione del serpente 2
-        x2 += x2_change
-        y2 += y2_change
-        if x2 < 0:
-            x2 = WIDTH - BLOCK_SIZE
-        elif x2 >= WIDTH:
-            x2 = 0
-        if y2 < SCOREBOARD_HEIGHT:
-            y2 = HEIGHT - BLOCK_SIZE
-        elif y2 >= HEIGHT:
-            y2 = SCOREBOARD_HEIGHT
-        x2 = (x2 // BLOCK_SIZE) * BLOCK_SIZE
-        y2 = (y2 // BLOCK_SIZE) * BLOCK_SIZE
-
-        # Disegna la griglia
-        for x in range(0, WIDTH, BLOCK_SIZE):
-            pygame.draw.line(screen, (200, 200, 200), (x, SCOREBOARD_HEIGHT), (x, HEIGHT))
-        for y in range(SCOREBOARD_HEIGHT, HEIGHT, BLOCK_SIZE):
-            pygame.draw.line(screen, (200, 200, 200), (0, y), (WIDTH, y))
-        
-        # Disegna lo sfondo e il cibo
-        draw_background()
-        pygame.draw.circle(screen, BLACK, (foodx + BLOCK_SIZE // 2, foody + BLOCK_SIZE // 2), BLOCK_SIZE // 2)
-        pygame.draw.circle(screen, WHITE, (foodx + BLOCK_SIZE // 2, foody + BLOCK_SIZE // 2), BLOCK_SIZE // 2 - 2)
-
-        # Gestione del cibo speciale
-        if special_food_timer > 0:
-            pygame.draw.circle(screen, BLACK, (special_foodx + BLOCK_SIZE // 2, special_foody + BLOCK_SIZE // 2), BLOCK_SIZE // 2)
-            pygame.draw.circle(screen, DARK_GREY, (special_foodx + BLOCK_SIZE // 2, special_foody + BLOCK_SIZE // 2), BLOCK_SIZE // 2 -2)
-            special_food_timer -= 1
-        elif special_food_timer == 0 and random.randint(1, 100) == 1:
-            special_foodx = round(random.randrange(0, WIDTH - BLOCK_SIZE) / BLOCK_SIZE) * BLOCK_SIZE
-            special_foody = round(random.randrange(0, HEIGHT - BLOCK_SIZE) / BLOCK_SIZE) * BLOCK_SIZE
-            special_food_timer = 100
-        
-        # Disegna il serpente 1
-        snake_Head1 = [x1, y1]
-        snake_List1.append(snake_Head1)
-        if len(snake_List1) > Length_of_snake1:
-            del snake_List1[0]
-        for block in snake_List1[:-1]:
-            if block == snake_Head1:
-                game_close = True
-
-        our_snake(BLOCK_SIZE, snake_List1, player=1) 
-
-        # Disegna il serpente 2
-        snake_Head2 = [x2, y2]
-        snake_List2.append(snake_Head2)
-        if len(snake_List2) > Length_of_snake2:
-            del snake_List2[0]
-        for block in snake_List2[:-1]:
-            if block == snake_Head2 or block == snake_Head1:
-                game_close = True
-
-        our_snake(BLOCK_SIZE, snake_List2, player=2) 
-
-        # Aggiornamento della velocità e punteggio
-        SPEED1, last_updated_score1 = update_speed(score1, CURRENT_DIFFICULTY, SPEED1, last_updated_score1)
-        SPEED2, last_updated_score2 = update_speed(score2, CURRENT_DIFFICULTY, SPEED2, last_updated_score2)
-
-        #draw_score_bar(score1, score2, CURRENT_DIFFICULTY)
-        draw_score_bar(score1, score2, SPEED1, SPEED2, Length_of_snake1, Length_of_snake2, None, CURRENT_DIFFICULTY)
-
-        
-        # Controllo collisione con il cibo
-        if x1 == foodx and y1 == foody:
-            foodx, foody = generate_food(snake_List1 + snake_List2)
-            Length_of_snake1 += 1
-            score1 += 1 * food_points_multiplier1
-            score1 = round(score1, 1)
-        if x2 == foodx and y2 == foody:
-            foodx, foody = generate_food(snake_List1 + snake_List2)
-            Length_of_snake2 += 1
-            score2 += 1 * food_points_multiplier2
-            score2 = round(score2, 1)
-        if special_food_timer > 0 and x1 == special_foodx and y1 == special_foody:
-            special_foodx, special_foody = None, None
-            special_food_timer = 0
-            Length_of_snake1 += 5
-            score1 += 5 * special_food_points_multiplier1
-            score1 = round(score1, 1)
-        if special_food_timer > 0 and x2 == special_foodx and y2 == special_foody:
-            special_foodx, special_foody = None, None
-            special_food_timer = 0
-            Length_of_snake2 += 5
-            score2 += 5 * special_food_points_multiplier2
-            score2 = round(score1, 1)
-
+                    snake_input(event, input_buffers[0])
+                elif event.key in [pygame.K_UP, pygame.K_DOWN, pygame.K_LEFT, pygame.K_RIGHT]:
+                    snake_input(event, input_buffers[1])
+                elif event.key in [pygame.K_ESCAPE, pygame.K_BACKSPACE]:
+                    paused = snake1 if event.key == pygame.K_ESCAPE else snake2
+                    next_scene = pauseMenu(paused.score, None, game_mode="1vs1")
+                    if next_scene != RESUME:
+                        save_replay()
+                        return next_scene
+
+        if opposite_keys_pressed(pygame.key.get_pressed()):
+            for input_buffer in input_buffers:
+                input_buffer.push(engine.STOP, pygame.time.get_ticks())
+        frame_profiler.lap("input")
+
+        # Aggiornamento dello stato di gioco: ogni giocatore avanza con la propria velocità
+        for movers in scheduler.advance(dt, game_state.snakes):
+            now = pygame.time.get_ticks()
+            actions = [input_buffer.pop(now) if moves else None for input_buffer, moves in zip(input_buffers, movers)]
+            replay_recorder.record_step(actions, movers)
+            engine.step(game_state, actions, movers)
+            if spectators is not None:
+                spectators.publish(game_state, actions, movers)
+            SPEED1, SPEED2 = snake1.speed, snake2.speed
+            Length_of_snake1, Length_of_snake2 = snake1.length, snake2.length
+            if game_state.game_close:
+                break
+            if game_state.food is not None:
+                foodx, foody = game_state.food
+                if check_for_special_effect_activation(snake1.score,foodx,foody,player=1) is None or \
+                   check_for_special_effect_activation(snake2.score,foodx,foody,player=2) is None:
+                    save_replay()
+                    return None
+        frame_profiler.lap("update")
+
+        # Disegna lo sfondo, il cibo e i serpenti
+        game_renderer.begin()
+        frame_profiler.lap("background")
+        game_renderer.mark(draw_food(game_state))
+        frame_profiler.lap("food")
+        game_renderer.mark(our_snake(BLOCK_SIZE, interpolated_body(snake1, scheduler.alpha(0, snake1)), player=1, return_rects=True))
+        game_renderer.mark(our_snake(BLOCK_SIZE, interpolated_body(snake2, scheduler.alpha(1, snake2)), player=2, return_rects=True))
+        frame_profiler.lap("snake")
+        game_renderer.mark([draw_score_bar(snake1.score, snake2.score, SPEED1, SPEED2, Length_of_snake1, Length_of_snake2, None, CURRENT_DIFFICULTY)])
+        frame_profiler.lap("score_bar")
+        if show_profiler:
+            game_renderer.mark([draw_profiler_hud(frame_profiler)])
+            frame_profiler.lap("hud")
 
         # Aggiorna lo schermo
-        pygame.display.update()
-        clock.tick(min(SPEED1, SPEED2))  # Limita la velocità al più lento dei due giocatori
-        check_for_special_effect_activation(score1,foodx,foody,player=1)
-        check_for_special_effect_activation(score2,foodx,foody,player=2)
-    pygame.quit()
-    quit()
+        game_renderer.end()
+        frame_profiler.lap("display")
+        frame_profiler.end_frame()
+    save_replay()
+    return None
+
+def gameLoopBattle():
+    """Battaglia contro BATTLE_BOTS serpenti guidati dal computer (vedi battle.py); vince l'ultimo rimasto in gara."""
+    global game_state
+    game_over = False
+    game_state = battle.BattleState(*BATTLE_CELLS, BATTLE_BOTS + 1, CURRENT_DIFFICULTY)
+    snake = game_state.snakes[0]
+    bots = [battle.BattleBot(game_state, player, random.Random()) for player in range(1, BATTLE_BOTS + 1)]
+    input_buffers = [InputBuffer(stats=input_latency)] + [InputBuffer() for _ in bots]
+    scheduler = engine.TickScheduler(len(game_state.snakes))
+    camera = Camera(game_state.width, game_state.height)
+    followed = snake
+    while not game_over:
+        if game_state.game_close:
+            print(input_latency.report())
+            return partial(gameOverMenu, snake.score, None, "You Win" if game_state.winner == 0 else "Game Over")
+
+        dt = min(clock.tick(RENDER_FPS) / 1000, MAX_FRAME_TIME)
+        frame_profiler.begin_frame()
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                game_over = True
+            toggle_profiler(event)
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
+                next_scene = pauseMenu(snake.score, None, game_mode)
+                if next_scene != RESUME:
+                    return next_scene
+            snake_input(event, input_buffers[0])
+
+        if opposite_keys_pressed(pygame.key.get_pressed()):
+            input_buffers[0].push(engine.STOP, pygame.time.get_ticks())
+        frame_profiler.lap("input")
+
+        # Ogni serpente avanza con la propria velocità; i bot decidono solo quando tocca a loro muoversi
+        for movers in scheduler.advance(dt, game_state.snakes):
+            now = pygame.time.get_ticks()
+            for bot, input_buffer, moves in zip(bots, input_buffers[1:], movers[1:]):
+                if moves and not game_state.snakes[bot.player].crashed:
+                    action = bot.decide(game_state)
+                    if action is not None:
+                        input_buffer.push(action, now)
+            actions = [input_buffer.pop(now) if moves else None for input_buffer, moves in zip(input_buffers, movers)]
+            battle.step(game_state, actions, movers)
+            if game_state.game_close:
+                break
+        frame_profiler.lap("update")
+
+        # Dopo l'eliminazione la vista segue il serpente più lungo ancora in gara
+        if followed.crashed:
+            followed = max((other for other in game_state.snakes if not other.crashed), key=lambda other: other.length, default=followed)
+        alphas = [scheduler.alpha(i, other) for i, other in enumerate(game_state.snakes)]
+        camera.follow(*interpolated_head(followed, alphas[followed.player]))
+        game_renderer.begin(camera)
+        frame_profiler.lap("background")
+        draw_battle(game_state, camera, alphas)
+        frame_profiler.lap("snake")
+        # Il record mostrato è il punteggio migliore della battaglia in corso
+        best = max(other.score for other in game_state.snakes)
+        game_renderer.mark([draw_score_bar(snake.score, None, snake.speed, None, snake.length, None, best, CURRENT_DIFFICULTY)])
+        alive = render_text(f"Alive: {game_state.alive}/{len(game_state.snakes)}", font_style_small, WHITE, BLACK)
+        game_renderer.mark([screen.blit(alive, (WIDTH - alive.get_width() - 15, 40))])
+        frame_profiler.lap("score_bar")
+        if show_profiler:
+            game_renderer.mark([draw_profiler_hud(frame_profiler)])
+            frame_profiler.lap("hud")
+
+        game_renderer.end()
+        frame_profiler.lap("display")
+        frame_profiler.end_frame()
+    return None
+
+ONLINE_KEYS = {pygame.K_LEFT: "LEFT", pygame.K_a: "LEFT", pygame.K_RIGHT: "RIGHT", pygame.K_d: "RIGHT",
+               pygame.K_UP: "UP", pygame.K_w: "UP", pygame.K_DOWN: "DOWN", pygame.K_s: "DOWN"}
+
+def gameLoopOnline(address, watch=False):
+    """Partita 1 vs 1 in rete: si collega al server (host:porta) e mostra lo stato previsto dal client; ESC torna al menu.
+
+    Con watch=True si collega invece a una partita trasmessa agli spettatori e la mostra senza accettare input.
+    """
+    global screen, WIDTH, HEIGHT, game_state
+    # Servono solo alle partite in rete: importarli qui non rallenta l'avvio
+    import netplay
+    import spectator
+    host, _, port = address.rpartition(":")
+    client = netplay.NetClient(host or "127.0.0.1", int(port or (spectator.DEFAULT_PORT if watch else netplay.DEFAULT_PORT)))
+    state = None
+    while True:
+        dt = min(clock.tick(RENDER_FPS) / 1000, MAX_FRAME_TIME)
+        frame_profiler.begin_frame()
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                client.close()
+                return None
+            toggle_profiler(event)
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
+                client.close()
+                if not watch:
+                    print(client.input_latency.report())
+                return gameMenu
+            # Le svolte vanno al server; la previsione le applica subito senza attendere la conferma
+            if not watch and event.type == pygame.KEYDOWN and event.key in ONLINE_KEYS and state is not None and not state.game_close:
+                sent = client.pending[-1][1] if client.pending else state.snakes[client.player].direction
+                if ONLINE_KEYS[event.key] != sent:
+                    client.push(ONLINE_KEYS[event.key])
+        frame_profiler.lap("input")
+
+        if not client.update(dt) and state is None:
+            print(f"Impossibile collegarsi a {address}")
+            return None
+        state = game_state = client.predicted
+        frame_profiler.lap("update")
+        if state is None:
+            # In attesa del secondo giocatore (o dell'inizio della partita da guardare)
+            draw_background()
+            draw_text_with_options("Waiting for the game..." if watch else "Waiting for the other player...", font_style, WIDTH / 6, HEIGHT / 3, WHITE)
+            pygame.display.update()
+            continue
+        if (WIDTH, HEIGHT) != (state.width, state.height):
+            # Il campo è quello del server
+            WIDTH, HEIGHT = state.width, state.height
+            screen = pygame.display.set_mode((WIDTH, HEIGHT))
+
+        game_renderer.begin()
+        frame_profiler.lap("background")
+        game_renderer.mark(draw_food(state))
+        frame_profiler.lap("food")
+        for player, snake in enumerate(state.snakes):
+            game_renderer.mark(our_snake(BLOCK_SIZE, interpolated_body(snake, client.alpha(player)), player=player + 1, return_rects=True))
+        frame_profiler.lap("snake")
+        snake1, snake2 = state.snakes[0], (state.snakes[1] if len(state.snakes) > 1 else None)
+        game_renderer.mark([draw_score_bar(snake1.score, snake2.score if snake2 else None, snake1.speed, snake2.speed if snake2 else None,
+                                           snake1.length, snake2.length if snake2 else None, None if snake2 else 0, state.difficulty)])
+        frame_profiler.lap("score_bar")
+        if client.confirmed.game_close or client.closed:
+            if not client.confirmed.game_close:
+                title = "Disconnected"
+            elif watch:
+                title = "You Win" if client.confirmed.won else "Game Over"
+            else:
+                title = "Game Over" if client.confirmed.snakes[client.player].crashed else "You Win"
+            game_renderer.mark([screen.blit(render_text(f"{title} - ESC", font_style, RED, BLACK), (WIDTH / 3, HEIGHT / 3))])
+        if show_profiler:
+            game_renderer.mark([draw_profiler_hud(frame_profiler)])
+            frame_profiler.lap("hud")
+        game_renderer.end()
+        frame_profiler.lap("display")
+        frame_profiler.end_frame()
 
 # Avvio del gioco
-global_records = read_records()
-gameMenu()
\ No newline at end of file
+def main():
+    """Legge le opzioni da riga di comando, apre la finestra e mostra il menu principale."""
+    global ARENA_CELLS, BATTLE_BOTS, spectators, startup_probe
+    parser = argparse.ArgumentParser(description="Snake Game")
+    parser.add_argument("--replay", help="riproduce un file di replay invece di aprire il menu")
+    parser.add_argument("--speed", type=float, default=1.0, help="velocità di riproduzione del replay (es. 4 = quattro volte più veloce)")
+    parser.add_argument("--connect", metavar="HOST:PORTA", help="gioca una partita 1 vs 1 in rete collegandosi al server indicato")
+    parser.add_argument("--spectate", metavar="HOST:PORTA", help="trasmette le partite giocate agli spettatori che si collegano a questo indirizzo")
+    parser.add_argument("--watch", metavar="HOST:PORTA", help="guarda una partita trasmessa con --spectate")
+    parser.add_argument("--arena", metavar="COLONNExRIGHE", help=f"dimensioni in celle del campo della modalità Arena (default {ARENA_CELLS[0]}x{ARENA_CELLS[1]})")
+    parser.add_argument("--battle-bots", type=int, default=BATTLE_BOTS, help=f"serpenti guidati dal computer nella modalità Battle (default {BATTLE_BOTS})")
+    parser.add_argument("--startup-time", action="store_true", help="stampa il tempo dall'avvio al primo frame del menu ed esce")
+    args = parser.parse_args()
+    startup_probe = args.startup_time
+    if args.arena:
+        ARENA_CELLS = tuple(int(value) for value in args.arena.split("x"))
+    BATTLE_BOTS = args.battle_bots
+    init_display()
+    if args.replay:
+        playReplay(args.replay, args.speed)
+        run_scenes(None)  # Nessuna scena dopo il replay: il gioco si chiude
+    if args.spectate:
+        import spectator
+        host, _, port = args.spectate.rpartition(":")
+        spectators = spectator.SpectatorServer(host or "127.0.0.1", int(port or spectator.DEFAULT_PORT))
+    if args.connect:
+        run_scenes(partial(gameLoopOnline, args.connect))
+    elif args.watch:
+        run_scenes(partial(gameLoopOnline, args.watch, watch=True))
+    else:
+        run_scenes(gameMenu)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+"""Ambiente di apprendimento per rinforzo (stile gym) con le regole di engine, senza pygame.
+
+SnakeEnv espone reset() e step() con osservazioni compatte:
+- "planes": array uint8 (PLANES, righe, colonne) con corpo, testa, cibo e cibo speciale;
+- "features": vettore float32 di FEATURES valori (pericoli vicini, direzione, posizione del cibo, lunghezza).
+
+VectorEnv esegue molti ambienti in un pool di processi; osservazioni, ricompense e fine partita sono scritte dai
+processi in un buffer di memoria condivisa, quindi a ogni passo viaggiano sulle pipe solo le azioni.
+
+Uso da riga di comando (misura dei passi al secondo con azioni casuali):
+    python snake_env.py --envs 64 --workers 4 --steps 2000
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import engine
+
+ACTIONS = list(engine.DIRECTIONS)  # Azione i = direzione ACTIONS[i]
+PLANES = ["body", "head", "food", "special_food"]
+FEATURES = (["danger_" + direction.lower() for direction in ACTIONS] + ["moving_" + direction.lower() for direction in ACTIONS]
+            + ["food_" + direction.lower() for direction in ACTIONS] + ["special_food", "length"])
+REWARD_CRASH = -1.0  # Ricompensa quando il serpente si schianta; mangiando si ottengono i punti guadagnati
+
+
+class SnakeEnv:
+    """Una partita a giocatore singolo con interfaccia reset/step."""
+
+    def __init__(self, width=800, height=600, difficulty="Balanced", observation="planes", max_steps=None):
+        if observation not in ("planes", "features"):
+            raise ValueError(f"Osservazione non valida: {observation}")
+        self.width, self.height = width, height
+        self.difficulty = difficulty
+        self.observation = observation
+        self.max_steps = max_steps
+        self.state = None
+        self.rng = random.Random()
+        probe = engine.Occupancy(width, height, 0)
+        self.cols, self.rows = probe.cols, probe.rows
+        if observation == "planes":
+            self.observation_shape, self.observation_dtype = (len(PLANES), self.rows, self.cols), np.uint8
+        else:
+            self.observation_shape, self.observation_dtype = (len(FEATURES),), np.float32
+        self.action_count = len(ACTIONS)
+
+    def reset(self, seed=None, out=None):
+        """Inizia una nuova partita; restituisce (osservazione, info)."""
+        if seed is not None:
+            self.rng = random.Random(seed)
+        self.state = engine.GameState(self.width, self.height, self.difficulty, rng=self.rng)
+        return self.observe(out), self.info()
+
+    def step(self, action, out=None):
+        """Applica l'azione (indice in ACTIONS) per un tick; restituisce (osservazione, ricompensa, terminata, troncata, info).
+
+        Come per la tastiera, una svolta che invertirebbe la marcia viene ignorata.
+        """
+        snake = self.state.snakes[0]
+        direction = ACTIONS[action]
+        if snake.direction is not None and not engine.can_turn(snake.direction, direction):
+            direction = None
+        score = snake.score
+        engine.step(self.state, [direction])
+        reward = REWARD_CRASH if snake.crashed else snake.score - score
+        terminated = self.state.game_close
+        truncated = not terminated and self.max_steps is not None and self.state.tick >= self.max_steps
+        return self.observe(out), reward, terminated, truncated, self.info()
+
+    def info(self):
+        """Informazioni sulla partita in corso."""
+        snake = self.state.snakes[0]
+        return {"score": snake.score, "length": snake.length, "tick": self.state.tick, "won": self.state.won}
+
+    def observe(self, out=None):
+        """Scrive l'osservazione in out (o in un nuovo array) e la restituisce."""
+        if out is None:
+            out = np.empty(self.observation_shape, dtype=self.observation_dtype)
+        if self.observation == "planes":
+            self.observe_planes(out)
+        else:
+            self.observe_features(out)
+        return out
+
+    def observe_planes(self, out):
+        """Piani della griglia: corpo, testa, cibo e cibo speciale (1 nelle celle occupate)."""
+        state, occupancy = self.state, self.state.occupancy
+        snake = state.snakes[0]
+        out.fill(0)
+        np.minimum(np.frombuffer(occupancy.grids[0], dtype=np.uint8).reshape(self.rows, self.cols), 1, out=out[0])
+        out[1].flat[occupancy.index(snake.x, snake.y)] = 1
+        if state.food is not None:
+            out[2].flat[occupancy.index(*state.food)] = 1
+        if state.special_food_timer > 0 and state.special_food is not None:
+            out[3].flat[occupancy.index(*state.special_food)] = 1
+
+    def observe_features(self, out):
+        """Vettore di caratteristiche nell'ordine di FEATURES."""
+        state, occupancy = self.state, self.state.occupancy
+        snake = state.snakes[0]
+        out.fill(0)
+        # La coda libera la sua cella nel prossimo tick se il serpente non sta crescendo
+        tail = snake.body.tail() if snake.body and len(snake.body) >= snake.length else None
+        for i, direction in enumerate(ACTIONS):
+            x_change, y_change = engine.DIRECTIONS[direction]
+            cell = occupancy.index(*engine.next_position(self.width, self.height, snake.x, snake.y, x_change, y_change))
+            out[i] = occupancy.total[cell] > (1 if cell == tail else 0)
+        if snake.direction is not None and (snake.x_change or snake.y_change):
+            out[4 + ACTIONS.index(snake.direction)] = 1
+        if state.food is not None:
+            # Verso del cibo lungo il percorso più breve, tenendo conto dell'attraversamento dei bordi
+            cols = (state.food[0] - snake.x) // engine.BLOCK_SIZE
+            rows = (state.food[1] - snake.y) // engine.BLOCK_SIZE
+            if abs(cols) > self.cols // 2:
+                cols = -cols
+            if abs(rows) > self.rows // 2:
+                rows = -rows
+            out[8], out[9] = cols < 0, cols > 0
+            out[10], out[11] = rows < 0, rows > 0
+        out[12] = state.special_food_timer > 0
+        out[13] = snake.length / (self.cols * self.rows)
+
+
+def shared_buffers(memory, num_envs, shape, dtype):
+    """Restituisce le viste (osservazioni, ricompense, terminate, troncate) sul blocco di memoria condivisa."""
+    observations = np.ndarray((num_envs,) + shape, dtype=dtype, buffer=memory.buf)
+    offset = observations.nbytes
+    rewards = np.ndarray(num_envs, dtype=np.float32, buffer=memory.buf, offset=offset)
+    terminated = np.ndarray(num_envs, dtype=bool, buffer=memory.buf, offset=offset + rewards.nbytes)
+    truncated = np.ndarray(num_envs, dtype=bool, buffer=memory.buf, offset=offset + rewards.nbytes + num_envs)
+    return observations, rewards, terminated, truncated
+
+
+def shared_size(num_envs, shape, dtype):
+    """Dimensione in byte del blocco di memoria condivisa usato da shared_buffers."""
+    return num_envs * (int(np.prod(shape)) * np.dtype(dtype).itemsize + 4 + 2)
+
+
+def worker(connection, memory_name, num_envs, shape, dtype, first, count, env_kwargs):
+    """Processo che esegue gli ambienti [first, first + count) e scrive i risultati nella memoria condivisa."""
+    memory = shared_memory.SharedMemory(name=memory_name)
+    buffers = [buffer[first:first + count] for buffer in shared_buffers(memory, num_envs, shape, dtype)]
+    observations, rewards, terminated, truncated = buffers
+    envs = [SnakeEnv(**env_kwargs) for _ in range(count)]
+    try:
+        while True:
+            command, data = connection.recv()
+            if command == "reset":
+                connection.send([env.reset(seed, out=observations[i])[1] for i, (env, seed) in enumerate(zip(envs, data))])
+            elif command == "step":
+                finished = {}
+                for i, (env, action) in enumerate(zip(envs, data)):
+                    _, rewards[i], terminated[i], truncated[i], info = env.step(action, out=observations[i])
+                    if terminated[i] or truncated[i]:
+                        # Ricomincia subito: l'osservazione restituita è quella della nuova partita
+                        finished[first + i] = info
+                        env.reset(out=observations[i])
+                connection.send(finished)
+            elif command == "close":
+                break
+    finally:
+        del buffers, observations, rewards, terminated, truncated
+        memory.close()
+        connection.close()
+
+
+class VectorEnv:
+    """Più SnakeEnv eseguiti in parallelo da un pool di processi, con le osservazioni in memoria condivisa.
+
+    Le partite terminate ricominciano automaticamente e le loro info finali sono restituite da step(); gli array
+    restituiti sono viste sul buffer condiviso e vengono sovrascritti dal passo successivo.
+    """
+
+    def __init__(self, num_envs, workers=None, **env_kwargs):
+        self.num_envs = num_envs
+        probe = SnakeEnv(**env_kwargs)
+        self.observation_shape, self.observation_dtype = probe.observation_shape, probe.observation_dtype
+        self.action_count = probe.action_count
+        self.memory = shared_memory.SharedMemory(create=True, size=shared_size(num_envs, self.observation_shape, self.observation_dtype))
+        self.buffers = shared_buffers(self.memory, num_envs, self.observation_shape, self.observation_dtype)
+        self.observations = self.buffers[0]
+        workers = max(1, min(num_envs, workers or os.cpu_count() or 1))
+        bounds = [num_envs * i // workers for i in range(workers + 1)]
+        self.slices = list(zip(bounds, bounds[1:]))
+        self.connections, self.processes = [], []
+        for first, last in self.slices:
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=worker, args=(child, self.memory.name, num_envs, self.observation_shape,
+                                                                   self.observation_dtype, first, last - first, env_kwargs), daemon=True)
+            process.start()
+            child.close()
+            self.connections.append(parent)
+            self.processes.append(process)
+
+    def reset(self, seed=None):
+        """Ricomincia tutti gli ambienti (l'ambiente i usa il seme seed + i); restituisce (osservazioni, info)."""
+        for connection, (first, last) in zip(self.connections, self.slices):
+            connection.send(("reset", [None if seed is None else seed + i for i in range(first, last)]))
+        infos = [info for connection in self.connections for info in connection.recv()]
+        return self.observations, infos
+
+    def step_async(self, actions):
+        """Invia le azioni ai processi senza attendere il risultato."""
+        for connection, (first, last) in zip(self.connections, self.slices):
+            connection.send(("step", [int(action) for action in actions[first:last]]))
+
+    def step_wait(self):
+        """Attende il passo avviato da step_async; restituisce (osservazioni, ricompense, terminate, troncate, info).
+
+        info associa all'indice di ogni ambiente la cui partita è appena finita le info finali di quella partita.
+        """
+        finished = {}
+        for connection in self.connections:
+            finished.update(connection.recv())
+        return self.buffers + (finished,)
+
+    def step(self, actions):
+        """Applica un'azione per ambiente e restituisce il risultato del passo."""
+        self.step_async(actions)
+        return self.step_wait()
+
+    def close(self):
+        """Ferma i processi e libera la memoria condivisa."""
+        if self.memory is None:
+            return
+        for connection in self.connections:
+            connection.send(("close", None))
+            connection.close()
+        for process in self.processes:
+            process.join()
+        del self.buffers, self.observations
+        self.memory.close()
+        self.memory.unlink()
+        self.memory = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Misura i passi al secondo degli ambienti di Snake con azioni casuali.")
+    parser.add_argument("--envs", type=int, default=64, help="ambienti in parallelo (default 64)")
+    parser.add_argument("--workers", type=int, default=None, help="processi (default: numero di CPU)")
+    parser.add_argument("--steps", type=int, default=2000, help="passi per ambiente (default 2000)")
+    parser.add_argument("--observation", default="planes", choices=["planes", "features"])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    with VectorEnv(args.envs, args.workers, observation=args.observation) as envs:
+        envs.reset(seed=args.seed)
+        episodes = 0
+        start = time.perf_counter()
+        for _ in range(args.steps):
+            _, _, terminated, truncated, _ = envs.step(rng.integers(0, envs.action_count, args.envs))
+            episodes += int((terminated | truncated).sum())
+        elapsed = time.perf_counter() - start
+        print(f"{len(envs.processes)} processi, {args.envs} ambienti, osservazioni {args.observation} {envs.observation_shape}")
+    steps = args.envs * args.steps
+    print(f"{steps:,} passi e {episodes} partite in {elapsed:.2f} s ({steps / elapsed:,.0f} passi/s)")
+
+
+if __name__ == "__main__":
+    main()
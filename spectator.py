@@ -0,0 +1,269 @@
+"""Modalità spettatore: una partita in corso trasmette i suoi tick a un server asyncio che li inoltra a molti spettatori.
+
+Chi si collega riceve un KEYFRAME (stato completo) e poi, a ogni tick, lo stesso messaggio TICK delle partite in
+rete (vedi protocol.py): azioni dei giocatori e differenza del riepilogo. Lo spettatore è un netplay.NetClient senza
+giocatore: ricalcola la partita e, se il riepilogo non coincide, chiede un nuovo KEYFRAME. Il messaggio di ogni tick
+è codificato una sola volta e inviato identico a tutti gli spettatori.
+
+Il ciclo di gioco non aspetta mai la rete: publish() passa il messaggio al thread del server, che lo accoda a ogni
+spettatore senza attenderne lo svuotamento. Chi accumula più di MAX_BUFFERED byte non ancora inviati, o resta indietro
+di più di MAX_LAG tick secondo i suoi PING, viene scollegato.
+
+Uso da riga di comando:
+    python snake.py --spectate 0.0.0.0:5556          # gioca e trasmette la partita
+    python snake.py --watch 127.0.0.1:5556           # guarda la partita
+    python spectator.py serve --port 5556            # trasmette una partita tra bot a velocità reale
+    python spectator.py selftest --viewers 200       # partita tra bot con molti spettatori senza finestra
+"""
+import argparse
+import asyncio
+import random
+import socket
+import sys
+import threading
+import time
+
+import engine
+import netplay
+import protocol
+import replay
+from inputs import InputBuffer
+
+DEFAULT_PORT = 5556
+MAX_BUFFERED = 64 * 1024  # Byte in coda oltre i quali uno spettatore è considerato troppo lento
+MAX_LAG = 300  # Tick di ritardo (dai PING) oltre i quali uno spettatore è considerato troppo lento
+
+
+class Viewer:
+    """Spettatore collegato al server."""
+
+    def __init__(self, writer, tick):
+        self.writer = writer
+        self.address = writer.get_extra_info("peername")
+        self.synced = False  # Ha ricevuto il KEYFRAME e può applicare i TICK
+        self.tick = tick  # Ultimo tick applicato, comunicato dallo spettatore con i PING (all'inizio quello di arrivo)
+        self.sent = 0  # Byte inviati
+
+
+class SpectatorServer:
+    """Server degli spettatori: gira in un thread con il proprio ciclo asyncio, il gioco chiama solo publish()."""
+
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT):
+        self.loop = asyncio.new_event_loop()
+        self.viewers = set()  # Usato solo dal thread di rete
+        self.tick = 0  # Ultimo tick inoltrato
+        self.ticks = 0  # Tick inoltrati in totale, per la media dei byte per tick
+        self.dropped = 0  # Spettatori scollegati perché troppo lenti
+        self.keyframe_wanted = False  # Qualcuno attende un KEYFRAME
+        self.refresh_all = False  # Lo stato è cambiato fuori da engine.step: KEYFRAME per tutti
+        self.values = None  # Ultimo riepilogo trasmesso (solo thread del gioco)
+        self.listener = None
+        self.error = None
+        started = threading.Event()
+        self.thread = threading.Thread(target=self.serve, args=(host, port, started), daemon=True)
+        self.thread.start()
+        started.wait()
+        if self.error is not None:
+            raise self.error
+        self.port = self.listener.sockets[0].getsockname()[1]
+
+    def serve(self, host, port, started):
+        """Corpo del thread di rete."""
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.listener = self.loop.run_until_complete(asyncio.start_server(self.handle, host, port))
+        except OSError as error:
+            self.error = error
+        started.set()
+        if self.error is None:
+            self.loop.run_forever()
+
+    async def handle(self, reader, writer):
+        """Gestisce uno spettatore: i suoi PING (con l'ultimo tick applicato) e le richieste di KEYFRAME."""
+        netplay.set_nodelay(writer)
+        viewer = Viewer(writer, self.tick)
+        self.viewers.add(viewer)
+        self.keyframe_wanted = True
+        try:
+            while True:
+                kind, payload = await protocol.read_frame(reader)
+                if kind == protocol.PING:
+                    (_, viewer.tick), _ = protocol.read_varints(payload, 2)
+                    writer.write(protocol.frame(protocol.PONG, payload))
+                elif kind == protocol.RESYNC:
+                    viewer.synced = False
+                    self.keyframe_wanted = True
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.viewers.discard(viewer)
+            writer.close()
+
+    def publish(self, state, actions, movers=None):
+        """Trasmette il tick appena simulato; va chiamata dal ciclo di gioco dopo ogni engine.step."""
+        values = protocol.summary(state)
+        message = protocol.encode_tick(state.tick, replay.encode_step(actions, movers), 0, self.values or values, values)
+        keyframe, everyone = None, self.refresh_all
+        if self.keyframe_wanted or everyone:
+            # Una richiesta che arriva durante la codifica non va persa: fan_out la ripete per chi non è sincronizzato
+            self.keyframe_wanted = self.refresh_all = False
+            keyframe = protocol.encode_keyframe(state)
+        self.values = values
+        self.loop.call_soon_threadsafe(self.fan_out, state.tick, message, keyframe, everyone)
+
+    def refresh(self):
+        """Segnala che lo stato è cambiato fuori da engine.step (nuova partita, effetto speciale)."""
+        self.refresh_all = True
+
+    def fan_out(self, tick, message, keyframe, everyone):
+        """Accoda il messaggio a ogni spettatore senza attendere; scollega chi ha troppi byte in sospeso."""
+        self.tick = tick
+        self.ticks += 1
+        for viewer in list(self.viewers):
+            transport = viewer.writer.transport
+            if transport.is_closing():
+                continue
+            if transport.get_write_buffer_size() > MAX_BUFFERED or tick - viewer.tick > MAX_LAG:
+                self.dropped += 1
+                self.viewers.discard(viewer)
+                transport.abort()
+                continue
+            if keyframe is not None and (everyone or not viewer.synced):
+                data, viewer.synced = keyframe, True
+            elif viewer.synced:
+                data = message
+            else:
+                self.keyframe_wanted = True
+                continue
+            viewer.writer.write(data)
+            viewer.sent += len(data)
+
+    def stats(self):
+        """Restituisce per ogni spettatore indirizzo, tick di ritardo, byte in coda e byte inviati."""
+        async def collect():
+            return [{"address": viewer.address, "lag": self.tick - viewer.tick,
+                     "buffered": viewer.writer.transport.get_write_buffer_size(), "sent": viewer.sent}
+                    for viewer in self.viewers]
+        return asyncio.run_coroutine_threadsafe(collect(), self.loop).result()
+
+    def report(self):
+        """Riepilogo testuale: spettatori collegati, ritardo massimo, byte per tick e spettatori scollegati."""
+        viewers = self.stats()
+        lags = [viewer["lag"] for viewer in viewers]
+        per_tick = sum(viewer["sent"] for viewer in viewers) / max(len(viewers), 1) / max(self.ticks, 1)
+        return (f"Spettatori: {len(viewers)} collegati, ritardo massimo {max(lags, default=0)} tick, "
+                f"{per_tick:.1f} byte/tick ciascuno, {self.dropped} scollegati perché lenti")
+
+    def close(self):
+        """Chiude il server e le connessioni degli spettatori."""
+        async def shutdown():
+            self.listener.close()
+            for viewer in list(self.viewers):
+                viewer.writer.close()
+        asyncio.run_coroutine_threadsafe(shutdown(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+
+def play_bots(spectators, bots=("greedy", "random"), seed=0, difficulty="Balanced", seconds=None, speedup=1.0):
+    """Gioca una partita tra bot a velocità reale (moltiplicata per speedup) trasmettendola agli spettatori."""
+    import tournament
+    state = engine.GameState(800, 600, difficulty, players=len(bots), rng=random.Random(seed))
+    players = [tournament.load_bot(spec)(state, player, random.Random(seed * 2 + player)) for player, spec in enumerate(bots)]
+    input_buffers = [InputBuffer() for _ in bots]
+    scheduler = engine.TickScheduler(len(bots))
+    spectators.refresh()
+    start = last = time.perf_counter()
+    while not state.game_close and (seconds is None or last - start < seconds):
+        time.sleep(1 / netplay.SERVER_FPS)
+        now = time.perf_counter()
+        dt, last = min(now - last, netplay.MAX_FRAME_TIME) * speedup, now
+        for movers in scheduler.advance(dt, state.snakes):
+            for player, input_buffer, moves in zip(players, input_buffers, movers):
+                if moves:
+                    action = player.decide(state)
+                    if action is not None:
+                        input_buffer.push(action, state.tick)
+            actions = [input_buffer.pop(state.tick) if moves else None for input_buffer, moves in zip(input_buffers, movers)]
+            engine.step(state, actions, movers)
+            spectators.publish(state, actions, movers)
+            if state.game_close:
+                break
+    return state
+
+
+def selftest(viewers=100, slow=2, seconds=10.0, seed=1, speedup=4.0):
+    """Partita tra bot con molti spettatori e alcuni che non leggono mai; controlla sincronia e scollegamenti."""
+    spectators = SpectatorServer(port=0)
+    clients = [netplay.NetClient("127.0.0.1", spectators.port) for _ in range(viewers)]
+    # Gli spettatori lenti si collegano ma non leggono: il loro buffer di ricezione si riempie
+    stalled = []
+    for _ in range(slow):
+        sock = socket.create_connection(("127.0.0.1", spectators.port))
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        stalled.append(sock)
+    done = threading.Event()
+
+    def watch():
+        # Gli spettatori aggiornano il proprio stato come farebbe la finestra, a RENDER_FPS
+        last = time.perf_counter()
+        while not done.is_set():
+            now = time.perf_counter()
+            for client in clients:
+                client.update(now - last)
+            last = now
+            time.sleep(1 / netplay.SERVER_FPS)
+    watcher = threading.Thread(target=watch, daemon=True)
+    watcher.start()
+    # Una partita accelerata produce molti tick, così gli spettatori lenti superano presto MAX_LAG
+    start = time.perf_counter()
+    state = play_bots(spectators, seed=seed, difficulty="Extreme", seconds=seconds, speedup=speedup)
+    elapsed = time.perf_counter() - start
+    time.sleep(0.5)
+    done.set()
+    watcher.join()
+    for client in clients:
+        client.update(0)
+    print(spectators.report())
+    expected = protocol.summary(state)
+    synced = sum(client.confirmed is not None and client.confirmed.tick == state.tick and protocol.summary(client.confirmed) == expected
+                 for client in clients)
+    desyncs = sum(client.desyncs for client in clients)
+    print(f"Partita: {state.tick} tick in {elapsed:.2f} s; spettatori sincronizzati {synced}/{viewers}, "
+          f"desync {desyncs}, lenti scollegati {spectators.dropped}/{slow}")
+    for client in clients:
+        client.close()
+    for sock in stalled:
+        sock.close()
+    spectators.close()
+    return synced == viewers and spectators.dropped == slow
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Trasmissione delle partite di Snake agli spettatori.")
+    parser.add_argument("mode", choices=["serve", "selftest"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--bots", nargs=2, default=["greedy", "random"], help="bot della partita trasmessa (vedi tournament.py)")
+    parser.add_argument("--difficulty", default="Balanced", choices=list(engine.INITIAL_SPEEDS))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--viewers", type=int, default=100, help="spettatori del selftest")
+    parser.add_argument("--seconds", type=float, default=10, help="durata del selftest")
+    parser.add_argument("--speedup", type=float, default=4, help="accelerazione della partita del selftest")
+    args = parser.parse_args()
+
+    if args.mode == "selftest":
+        sys.exit(0 if selftest(args.viewers, seconds=args.seconds, seed=args.seed or 1, speedup=args.speedup) else 1)
+    spectators = SpectatorServer(args.host, args.port)
+    print(f"Trasmissione su {args.host}:{spectators.port}")
+    try:
+        while True:
+            state = play_bots(spectators, args.bots, args.seed, args.difficulty)
+            print(f"Partita finita dopo {state.tick} tick; {spectators.report()}")
+            args.seed += 1
+    except KeyboardInterrupt:
+        spectators.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""Torneo tra bot con le regole del 1 vs 1, senza grafica, con le partite distribuite su più processi.
+
+Ogni coppia di bot gioca `rounds` partite alternando i lati; ogni partita ha il proprio seme, quindi è
+riproducibile. Alla fine si stampano la classifica Elo e le partite giocate al secondo.
+
+I bot si indicano per nome (vedi BOTS) oppure come "modulo:Classe"; una classe bot riceve (stato, giocatore, rng)
+e il suo metodo decide(stato) restituisce la direzione da prendere (None per non cambiare).
+
+Uso da riga di comando:
+    python tournament.py random greedy autopilot --rounds 20 --workers 4 --seed 1
+"""
+import argparse
+import importlib
+import itertools
+import math
+import multiprocessing
+import random
+import time
+
+import ai
+import engine
+from inputs import InputBuffer
+
+TICK_TIME = 1 / 60  # Secondi simulati per frame, come RENDER_FPS nel gioco
+MAX_TICKS = 20000  # Oltre questo limite vince chi ha il punteggio più alto
+ELO_START = 1500
+ELO_K = 32
+
+
+def next_cells(state, snake):
+    """Restituisce le coppie (direzione, cella di arrivo) consentite (senza inversioni) e libere nel prossimo tick."""
+    occupancy = state.occupancy
+    moves = []
+    for direction, (x_change, y_change) in engine.DIRECTIONS.items():
+        if snake.direction is not None and not engine.can_turn(snake.direction, direction):
+            continue
+        cell = occupancy.index(*engine.next_position(state.width, state.height, snake.x, snake.y, x_change, y_change))
+        if not occupancy.total[cell]:
+            moves.append((direction, cell))
+    return moves
+
+
+class RandomBot:
+    """Gira a caso tra le celle libere."""
+
+    def __init__(self, state, player, rng):
+        self.player = player
+        self.rng = rng
+
+    def decide(self, state):
+        moves = next_cells(state, state.snakes[self.player])
+        return self.rng.choice(moves)[0] if moves else None
+
+
+class GreedyBot:
+    """Va verso il cibo lungo la distanza più breve (con l'attraversamento dei bordi), evitando le sacche più corte di sé."""
+
+    def __init__(self, state, player, rng):
+        self.player = player
+        self.rng = rng
+        self.moves = ai.build_moves(state.width, state.height)
+
+    def room(self, total, start, limit):
+        """Conta le celle libere raggiungibili da start, fermandosi a limit."""
+        seen = {start}
+        queue = [start]
+        for cell in queue:
+            if len(seen) >= limit:
+                break
+            for _, target in self.moves[cell]:
+                if target not in seen and not total[target]:
+                    seen.add(target)
+                    queue.append(target)
+        return min(len(seen), limit)
+
+    def decide(self, state):
+        if state.food is None:
+            return None
+        snake, occupancy = state.snakes[self.player], state.occupancy
+        food = occupancy.index(*state.food)
+        best, best_key = None, None
+        for direction, cell in next_cells(state, snake):
+            cols = abs(cell % occupancy.cols - food % occupancy.cols)
+            rows = abs(cell // occupancy.cols - food // occupancy.cols)
+            trapped = self.room(occupancy.total, cell, snake.length + 1) <= snake.length
+            key = (trapped, min(cols, occupancy.cols - cols) + min(rows, occupancy.rows - rows), self.rng.random())
+            if best_key is None or key < best_key:
+                best, best_key = direction, key
+        return best
+
+
+def autopilot(state, player, rng):
+    """L'autopilota senza limite di tempo, così le sue decisioni non dipendono dalla velocità della macchina."""
+    return ai.Autopilot(state, player, budget=math.inf)
+
+
+BOTS = {"random": RandomBot, "greedy": GreedyBot, "autopilot": autopilot}
+
+
+def load_bot(spec):
+    """Restituisce la classe (o funzione) che crea il bot indicato per nome o come "modulo:Classe"."""
+    if spec in BOTS:
+        return BOTS[spec]
+    module, _, name = spec.partition(":")
+    if not name:
+        raise ValueError(f"Bot sconosciuto: {spec}")
+    return getattr(importlib.import_module(module), name)
+
+
+def play_match(match):
+    """Gioca una partita 1 vs 1 tra due bot; restituisce il risultato con il vincitore (0, 1 o None per il pareggio)."""
+    bots, seed, width, height, difficulty = match
+    state = engine.GameState(width, height, difficulty, players=2, rng=random.Random(seed))
+    players = [load_bot(spec)(state, player, random.Random(seed * 2 + player)) for player, spec in enumerate(bots)]
+    # Le svolte passano dalla stessa coda della tastiera, che scarta le inversioni
+    input_buffers = [InputBuffer(), InputBuffer()]
+    scheduler = engine.TickScheduler(2)
+    while not state.game_close and state.tick < MAX_TICKS:
+        for movers in scheduler.advance(TICK_TIME, state.snakes):
+            now = state.tick
+            for player, input_buffer, moves in zip(players, input_buffers, movers):
+                if moves:
+                    action = player.decide(state)
+                    if action is not None:
+                        input_buffer.push(action, now)
+            actions = [input_buffer.pop(now) if moves else None for input_buffer, moves in zip(input_buffers, movers)]
+            engine.step(state, actions, movers)
+            if state.game_close or state.tick >= MAX_TICKS:
+                break
+    crashed = [snake.crashed for snake in state.snakes]
+    scores = [snake.score for snake in state.snakes]
+    if crashed[0] != crashed[1]:
+        winner = 1 if crashed[0] else 0
+    elif scores[0] != scores[1]:  # Entrambi schiantati o limite di tick: decide il punteggio
+        winner = 0 if scores[0] > scores[1] else 1
+    else:
+        winner = None
+    return {"bots": bots, "seed": seed, "winner": winner, "scores": scores, "crashed": crashed, "ticks": state.tick}
+
+
+def schedule(bots, rounds, seed):
+    """Restituisce le partite del torneo: ogni coppia gioca `rounds` volte alternando i lati, ognuna con il suo seme."""
+    rng = random.Random(seed)
+    matches = []
+    for first, second in itertools.combinations(bots, 2):
+        for round_ in range(rounds):
+            pair = (first, second) if round_ % 2 == 0 else (second, first)
+            matches.append(pair + (rng.getrandbits(63),))
+    return matches
+
+
+def elo_ratings(results, bots):
+    """Calcola le valutazioni Elo applicando i risultati nell'ordine del calendario."""
+    ratings = {bot: float(ELO_START) for bot in bots}
+    for result in results:
+        first, second = result["bots"]
+        expected = 1 / (1 + 10 ** ((ratings[second] - ratings[first]) / 400))
+        score = 0.5 if result["winner"] is None else 1.0 - result["winner"]
+        ratings[first] += ELO_K * (score - expected)
+        ratings[second] -= ELO_K * (score - expected)
+    return ratings
+
+
+def run_tournament(bots, rounds=10, seed=0, workers=None, width=800, height=600, difficulty="Balanced"):
+    """Gioca il torneo su un pool di processi; restituisce (risultati nell'ordine del calendario, secondi impiegati)."""
+    matches = [((first, second), match_seed, width, height, difficulty) for first, second, match_seed in schedule(bots, rounds, seed)]
+    start = time.perf_counter()
+    with multiprocessing.Pool(workers) as pool:
+        results = pool.map(play_match, matches, chunksize=max(1, len(matches) // (4 * (workers or multiprocessing.cpu_count()))))
+    return results, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Torneo 1 vs 1 tra bot di Snake.")
+    parser.add_argument("bots", nargs="+", help=f"bot in gara: {', '.join(BOTS)} oppure modulo:Classe")
+    parser.add_argument("--rounds", type=int, default=10, help="partite per ogni coppia di bot (default 10)")
+    parser.add_argument("--workers", type=int, default=None, help="processi (default: numero di CPU)")
+    parser.add_argument("--seed", type=int, default=0, help="seme del calendario, da cui derivano i semi delle partite")
+    parser.add_argument("--difficulty", default="Balanced", choices=list(engine.INITIAL_SPEEDS))
+    parser.add_argument("--resolution", default="800x600", help="risoluzione del campo, es. 1024x768")
+    args = parser.parse_args()
+    if len(set(args.bots)) < 2:
+        parser.error("servono almeno due bot diversi")
+    for spec in args.bots:
+        load_bot(spec)
+
+    width, height = (int(value) for value in args.resolution.split("x"))
+    results, elapsed = run_tournament(args.bots, args.rounds, args.seed, args.workers, width, height, args.difficulty)
+    ratings = elo_ratings(results, args.bots)
+    records = {bot: [0, 0, 0] for bot in args.bots}
+    for result in results:
+        for player, bot in enumerate(result["bots"]):
+            records[bot][0 if result["winner"] == player else 1 if result["winner"] is None else 2] += 1
+
+    print(f"{'bot':<20} {'Elo':>7} {'V':>5} {'P':>5} {'S':>5}")
+    for bot in sorted(args.bots, key=ratings.get, reverse=True):
+        wins, draws, losses = records[bot]
+        print(f"{bot:<20} {ratings[bot]:>7.0f} {wins:>5} {draws:>5} {losses:>5}")
+    ticks = sum(result["ticks"] for result in results)
+    print(f"{len(results)} partite ({ticks:,} tick) in {elapsed:.2f} s ({len(results) / elapsed:.1f} partite/s)")
+
+
+if __name__ == "__main__":
+    main()